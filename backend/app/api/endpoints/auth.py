@@ -1,21 +1,24 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.security import OAuth2PasswordBearer
 from typing import Any
-from ...core.models import UserCreate, UserLogin, Token, UserResponse, ResendConfirmation
-from ...core.db import get_supabase, get_user_by_token
-from postgrest.exceptions import APIError
+from ...core.models import AuthenticatedUser, UserCreate, UserLogin, Token, UserResponse, ResendConfirmation
+from ...core.db import get_async_supabase
+from supabase import AsyncClient
+from ...core.security import get_current_user, oauth2_scheme, token_validator
+from ...core.logs import sampled_logger
+from ...core.metrics import record_error, stage
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+
+# Sampled structured auth logging; never log credentials or Supabase sessions
+auth_log = sampled_logger("auth")
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(user: UserCreate) -> Any:
+async def signup(user: UserCreate, supabase: AsyncClient = Depends(get_async_supabase)) -> Any:
     """
     Register a new user.
     """
     try:
-        supabase = get_supabase()
-        response = supabase.auth.sign_up({
+        response = await supabase.auth.sign_up({
             "email": user.email,
             "password": user.password
         })
@@ -37,18 +40,18 @@ async def signup(user: UserCreate) -> Any:
         )
 
 @router.post("/login", response_model=Token)
-async def login(user: UserLogin) -> Any:
+async def login(user: UserLogin, supabase: AsyncClient = Depends(get_async_supabase)) -> Any:
     """
     Login for existing users.
     """
     try:
-        print(user)
-        supabase = get_supabase()
-        response = supabase.auth.sign_in_with_password({
-            "email": user.email,
-            "password": user.password
-        })
-        print(response)
+        with stage("supabase_auth"):
+            response = await supabase.auth.sign_in_with_password({
+                "email": user.email,
+                "password": user.password
+            })
+        if auth_log.sampled():
+            auth_log.event("login", email_domain=user.email.split("@")[-1], session=response.session is not None)
 
         if not response.session:
             if response.error and "email not confirmed" in response.error.message:
@@ -66,20 +69,29 @@ async def login(user: UserLogin) -> Any:
             token_type="bearer"
         )
     except Exception as e:
-        print(e)
+        record_error("login_failed")
+        if auth_log.sampled():
+            auth_log.event("login_failed", error=type(e).__name__)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
 
 @router.post("/logout")
-async def logout(token: str = Depends(oauth2_scheme)) -> Any:
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    user: AuthenticatedUser = Depends(get_current_user),
+    supabase: AsyncClient = Depends(get_async_supabase),
+) -> Any:
     """
     Logout user session.
     """
+    # The token validated (get_current_user answers 401 otherwise): drop it from the
+    # validation cache and refuse it locally until its verified expiry
+    token_validator.revoke(token, user)
     try:
-        supabase = get_supabase()
-        supabase.auth.sign_out()
+        # Revoke this user's session; the shared client holds no session of its own
+        await supabase.auth.admin.sign_out(token)
         return {"message": "Successfully logged out"}
     except Exception as e:
         raise HTTPException(
@@ -88,23 +100,22 @@ async def logout(token: str = Depends(oauth2_scheme)) -> Any:
         )
 
 @router.post("/resend-confirmation", response_model=dict)
-async def resend_confirmation(resend_data: ResendConfirmation) -> Any:
+async def resend_confirmation(resend_data: ResendConfirmation, supabase: AsyncClient = Depends(get_async_supabase)) -> Any:
     """
     Resend confirmation email to the user.
     """
     try:
-        supabase = get_supabase()
-        response = supabase.auth.api.send_verification_email(resend_data.email)
-        
-        if response.error:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to resend confirmation email"
-            )
-        
+        await supabase.auth.resend({"type": "signup", "email": resend_data.email})
         return {"message": "Confirmation email resent. Please check your inbox."}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+@router.get("/token-cache/stats")
+async def get_token_cache_stats() -> Any:
+    """
+    Report hit/miss counters of the access token validation cache.
+    """
+    return token_validator.stats()
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from ...core.db import get_supabase  # Ensure you have this import for Supabase
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from ...core.storage import IssuedCertificate, get_repository
+from ...core.revocation import get_revocation_registry, issued_certificate
+from ...core.ca_cache import ca_cache, load_ca_files
+from ...core.certificates import decode_csr, build_user_certificate, certificate_to_pem
+from ...core.signing_pool import signing_pool, PoolSaturated, server_timing
+from ...core.response_cache import marketplace_cache_from_env
+from ...core.pagination import encode_cursor, decode_cursor, parse_fields
+from ...core.metrics import observe_stage, record_error, stage
+from ...core.logs import sampled_logger
 from pydantic import BaseModel
-from typing import List
-import base64
+from typing import List, Optional, Tuple
+import asyncio
 import json
-from datetime import datetime, timedelta
-from cryptography import x509
-from cryptography.hazmat.primitives import serialization, hashes
-import subprocess
 
 router = APIRouter()
 
+# Sampled structured request logging (LOG_SAMPLE_RATE, off by default)
+request_log = sampled_logger("enclave")
+
 # Create a model for the request body
 class CSRRequest(BaseModel):
     enclaveid: str
@@ -30,74 +38,110 @@ class DatasetDetails(BaseModel):
 class RequestAccess(BaseModel):
     email: str
 
+def load_ca(enclaveid: str):
+    """Look up an enclave's CA paths in storage and load the key material from disk; runs on the signing pool"""
+    with stage("db_lookup"):
+        record = get_repository().get_ca_record(enclaveid)
+
+    if not record:
+        raise HTTPException(status_code=404, detail=f"No CA found for enclave {enclaveid}")
+
+    with stage("key_load"):
+        return load_ca_files(record.private_key_path, record.certificate_path)
+
+def sign_csr_job(enclaveid: str, csr_pem: str) -> Tuple[str, IssuedCertificate]:
+    """Decode a CSR and sign it with the enclave's CA, returning the PEM and its registry record; runs on the signing pool"""
+    with stage("csr_decode"):
+        csr = decode_csr(csr_pem)
+
+    # Load the CA private key and certificate for this enclave (cached per enclave)
+    ca_private_key, ca_cert = ca_cache.get_or_load(enclaveid, lambda: load_ca(enclaveid))
+
+    # Sign CSR with the enclave's CA
+    with stage("sign"):
+        cert = build_user_certificate(csr, ca_private_key, ca_cert)
+    with stage("serialize"):
+        return certificate_to_pem(cert), issued_certificate(enclaveid, cert)
+
 @router.post("/sign-csr/")
-async def sign_csr(request: CSRRequest):
+async def sign_csr(request: CSRRequest, response: Response):
     """Sign CSR with enclave's CA private key"""
+    if request_log.sampled():
+        request_log.event("sign_csr", enclaveid=request.enclaveid, csr_bytes=len(request.csr_pem))
     try:
-        enclaveid = request.enclaveid
-        supabase = get_supabase()
-
-        # Get CA paths from Supabase for this enclave
-        result = supabase.table('enclave_mapping').select('private_key_path, certificate_path').eq('enclave_id', enclaveid).execute()
-        
-        if not result.data:
-            raise HTTPException(status_code=404, detail=f"No CA found for enclave {enclaveid}")
-        
-        ca_private_key_path, ca_cert_path = result.data[0]['private_key_path'], result.data[0]['certificate_path']
-
-        # Decode the base64 encoded CSR
-        csr_pem_decoded = base64.b64decode(request.csr_pem).decode('utf-8')
-        csr = x509.load_pem_x509_csr(csr_pem_decoded.encode())
-
-        # Load the CA private key and certificate for this enclave
-        with open(ca_private_key_path, "rb") as key_file:
-            ca_private_key = serialization.load_pem_private_key(key_file.read(), password=None)
-
-        with open(ca_cert_path, "rb") as cert_file:
-            ca_cert = x509.load_pem_x509_certificate(cert_file.read())
-
-        # Sign CSR with the enclave's CA
-        cert = (
-            x509.CertificateBuilder()
-            .subject_name(csr.subject)
-            .issuer_name(ca_cert.subject)
-            .public_key(csr.public_key())
-            .serial_number(x509.random_serial_number())
-            .not_valid_before(datetime.utcnow())
-            .not_valid_after(datetime.utcnow() + timedelta(days=365))
-            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
-            .sign(ca_private_key, hashes.SHA256())
-        )
-
-        return {"signed_cert": cert.public_bytes(serialization.Encoding.PEM).decode()}
-
+        (signed_cert, record), timings = await signing_pool.run(sign_csr_job, request.enclaveid, request.csr_pem)
+        observe_stage("signing_queue_wait", timings["queue_wait_ms"] / 1000)
+        response.headers["Server-Timing"] = server_timing(timings)
+        # Registered before it is returned, so every issued certificate can be revoked
+        with stage("cert_registry"):
+            await asyncio.to_thread(get_revocation_registry().record_issued, [record])
+        return {"signed_cert": signed_cert}
+
+    except PoolSaturated as e:
+        record_error("signing_pool_saturated")
+        raise HTTPException(status_code=503, detail="Signing service is busy, please retry", headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
+        record_error("enclave_not_found" if isinstance(e, HTTPException) and e.status_code == 404 else "sign_failed")
         raise HTTPException(status_code=400, detail=f"Error signing CSR: {str(e)}")
 
-@router.get("/api/marketplace/", response_model=List[DatasetDetails])
-async def get_marketplace_items():
-    """Fetch marketplace items from Supabase"""
+# Page sizes for /api/marketplace/
+MARKETPLACE_DEFAULT_LIMIT = 100
+MARKETPLACE_MAX_LIMIT = 1000
+
+# Rendered marketplace pages, invalidated whenever a dataset is saved
+marketplace_cache = marketplace_cache_from_env()
+
+# Fields that may be requested through ``fields``
+MARKETPLACE_FIELDS = list(DatasetDetails.model_fields)
+
+def fetch_marketplace_page(after_id, limit, organization, is_public, name_prefix, fields):
+    """Read one keyset page of dataset_details rows from the configured storage backend"""
+    with stage("db_query"):
+        return get_repository().list_datasets(after_id, limit, organization, is_public, name_prefix, columns=fields)
+
+def row_to_item(row: dict, fields) -> dict:
+    """Apply the field projection to a dataset_details row"""
+    return {field: row[field] for field in (fields or MARKETPLACE_FIELDS)}
+
+@router.get("/api/marketplace/")
+async def get_marketplace_items(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MARKETPLACE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    organization: Optional[str] = None,
+    isPublic: Optional[bool] = None,
+    name_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Fetch a keyset-paginated page of marketplace items, or stream them as NDJSON"""
+    after_id = decode_cursor(cursor)
+    projection = parse_fields(fields, MARKETPLACE_FIELDS)
+    filters = {"organization": organization, "is_public": isPublic, "name_prefix": name_prefix}
+
     try:
-        supabase = get_supabase()
-        result = supabase.table('dataset_details').select('*').execute()
-
-        if not result.data:
-            return []
-
-        marketplace_items = []
-        for row in result.data:
-            item = DatasetDetails(
-                dataset_name=row['dataset_name'],
-                description=row['description'],
-                organization_name=row['organization_name'],
-                sample_queries=json.loads(row['sample_queries']),
-                rules=row['rules'],
-                isPublic=row['isPublic'],
-                whitelistEmails=json.loads(row['whitelistEmails'])
-            )
-            marketplace_items.append(item)
-
-        return marketplace_items
+        if format == "ndjson":
+            def stream():
+                batches = get_repository().iter_datasets(
+                    after_id, limit, columns=projection, batch_size=MARKETPLACE_MAX_LIMIT, **filters
+                )
+                for rows in batches:
+                    yield "".join(json.dumps(row_to_item(row, projection)) + "\n" for row in rows)
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+        cache_key = (limit, cursor, organization, isPublic, name_prefix, fields)
+        entry = marketplace_cache.get(cache_key)
+        if entry is None:
+            version = marketplace_cache.version
+            page_size = limit or MARKETPLACE_DEFAULT_LIMIT
+            rows = await asyncio.to_thread(fetch_marketplace_page, after_id, page_size + 1, fields=projection, **filters)
+            headers = {}
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                headers["X-Next-Cursor"] = encode_cursor(rows[-1]["id"])
+            body = json.dumps([row_to_item(row, projection) for row in rows]).encode()
+            entry = marketplace_cache.put(cache_key, body, headers=headers, version=version)
+        return marketplace_cache.respond(request, entry)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching marketplace items: {str(e)}")
@@ -106,28 +150,21 @@ async def get_marketplace_items():
 async def save_dataset(enclaveid: str, details: DatasetDetails):
     """Save dataset details for the given enclaveid"""
     try:
-        supabase = get_supabase()
-        data = {
-            "enclave_id": enclaveid,
-            "dataset_name": details.dataset_name,
-            "description": details.description,
-            "organization_name": details.organization_name,
-            "sample_queries": json.dumps(details.sample_queries),
-            "rules": details.rules,
-            "isPublic": details.isPublic,
-            "whitelistEmails": json.dumps(details.whitelistEmails)
-        }
-        supabase.table('dataset_details').insert(data).execute()
+        data = {"enclave_id": enclaveid, **details.model_dump()}
+        await asyncio.to_thread(get_repository().insert_dataset, data)
+        marketplace_cache.invalidate()
         return {"message": "Dataset details saved successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving dataset details: {str(e)}")
 
 @router.post("/request-access/{enclaveid}")
 async def request_access(enclaveid: str, request: RequestAccess):
-    """Handle access requests for a private enclave"""
+    """Store an access request for a private enclave; repeated requests are deduplicated"""
     try:
-        # Here you can implement logic to store the access request in Supabase
-        print(f"Access request for enclave {enclaveid} from {request.email}")
-        return {"message": "Access request received"}
+        with stage("db_query"):
+            stored = await asyncio.to_thread(get_repository().add_access_request, enclaveid, request.email)
+        if request_log.sampled():
+            request_log.event("access_request", enclaveid=enclaveid, request_id=stored["id"], request_count=stored["request_count"])
+        return {"message": "Access request received", "request_id": stored["id"], "status": stored["status"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing access request: {str(e)}")
@@ -0,0 +1,490 @@
+"""
+Admission control for the signing and enclave proxy endpoints.
+
+Two layers decide whether a request runs, and when:
+
+1. Token buckets. Every request takes tokens from its caller's bucket and
+   from the bucket of each enclave it targets. Rates are in tokens per
+   second and bursts are bucket sizes. A batch costs one token per item.
+   A request that would overdraw any bucket is rejected with 429 and takes
+   nothing from the others. A batch costing more than a bucket's burst is
+   admitted once that bucket is full and leaves it in debt, so it waits for
+   a refill instead of being rejected forever, and later requests wait until
+   the debt is paid off. The buckets live in a ``BucketStore``:
+   - ``MemoryBucketStore`` (default) keeps them per process.
+   - ``SQLiteBucketStore`` keeps them in one SQLite file. That is a local
+     stand-in for a distributed store: every uvicorn worker on the host
+     updates the same buckets atomically, so limits hold across workers.
+     A networked store only has to implement the same ``take``.
+2. Weighted fair queuing. At most ``capacity`` admitted requests run at
+   once per process. When demand exceeds that, waiting requests are
+   ordered by weighted-fair-queuing finish tags per caller: a caller with
+   many requests queued waits behind everyone else's single request
+   instead of ahead of it, and a caller with weight 2 gets twice the share
+   of one with weight 1. Requests that cannot be queued, or wait longer
+   than ``max_wait``, get 503.
+
+Callers are identified by the ``sub`` claim of a verified bearer token.
+Without one, or when tokens cannot be verified locally, they fall back to
+the client address. An unverified ``sub`` is never trusted, since anyone
+could then drain another user's bucket.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+
+from .metrics import registry
+from .sqlite_pool import SQLitePool
+from .tokens import InvalidToken, TokenCache, TokenValidator, TokenVerifier
+
+admission_rejections = registry.counter(
+    "admission_rejections_total", "Requests turned away by admission control, by reason.", ("reason",))
+admission_queue_depth = registry.gauge(
+    "admission_queue_depth", "Requests waiting for a fair-queue slot.")
+admission_queue_wait = registry.histogram(
+    "admission_queue_wait_seconds", "Time requests waited for a fair-queue slot.")
+
+
+class Limit(NamedTuple):
+    """Token bucket parameters: refill ``rate`` per second, holding at most ``burst`` tokens."""
+    rate: float
+    burst: float
+
+
+class BucketResult(NamedTuple):
+    """One bucket's state after a take; ``retry_after`` is 0 unless it lacked tokens."""
+    key: str
+    limit: Limit
+    remaining: float
+    retry_after: float
+
+    @property
+    def reset_after(self) -> float:
+        """Seconds until the bucket is full again."""
+        return (self.limit.burst - self.remaining) / self.limit.rate if self.limit.rate > 0 else 0.0
+
+
+# A take request: bucket key, its limit and the tokens wanted
+Take = Tuple[str, Limit, float]
+
+# Stored bucket state: tokens at ``updated`` (wall-clock seconds, shared across processes)
+BucketState = Tuple[float, float]
+
+
+def apply_takes(states: Mapping[str, BucketState], takes: Sequence[Take], now: float) -> Tuple[bool, List[BucketResult], Dict[str, BucketState]]:
+    """
+    Refill each bucket to ``now`` and take from all of them, or from none.
+
+    Returns whether the take succeeded, the per-bucket results and the new
+    states to store (empty when it failed, so nothing is written). A cost
+    above a bucket's burst only needs a full bucket and leaves it negative.
+    """
+    available = []
+    for key, limit, cost in takes:
+        tokens, updated = states.get(key, (limit.burst, now))
+        available.append(min(limit.burst, tokens + max(0.0, now - updated) * limit.rate))
+    needed = [min(cost, limit.burst) for _, limit, cost in takes]
+    if all(tokens >= need for tokens, need in zip(available, needed)):
+        results = [BucketResult(key, limit, tokens - cost, 0.0) for tokens, (key, limit, cost) in zip(available, takes)]
+        return True, results, {r.key: (r.remaining, now) for r in results}
+
+    # Report the buckets as they are, untouched by this request
+    results = []
+    for tokens, need, (key, limit, _) in zip(available, needed, takes):
+        wait = (need - tokens) / limit.rate if tokens < need else 0.0
+        results.append(BucketResult(key, limit, tokens, wait))
+    return False, results, {}
+
+
+class BucketStore(ABC):
+    """Where bucket state lives; ``take`` must be atomic for everyone sharing the store."""
+
+    # True if ``take`` does blocking I/O and should run off the event loop
+    blocking = False
+
+    @abstractmethod
+    def take(self, takes: Sequence[Take]) -> Tuple[bool, List[BucketResult]]:
+        """Apply ``apply_takes`` to the stored buckets atomically; returns whether it succeeded and the results."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Backend name and number of stored buckets."""
+
+    def close(self) -> None:
+        """Release connections held by the store."""
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets in a dict, private to this process; full buckets are dropped once there are more than ``max_keys``."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, BucketState] = {}
+        # Wall-clock time each bucket is full again, for pruning
+        self._full_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def take(self, takes: Sequence[Take]) -> Tuple[bool, List[BucketResult]]:
+        now = time.time()
+        with self._lock:
+            allowed, results, states = apply_takes(self._buckets, takes, now)
+            self._buckets.update(states)
+            for result in results if allowed else ():
+                self._full_at[result.key] = now + result.reset_after
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, results
+
+    def _prune(self, now: float) -> None:
+        for key in [key for key, full_at in self._full_at.items() if full_at <= now]:
+            del self._buckets[key], self._full_at[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "buckets": len(self._buckets)}
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a SQLite table shared by every process that opens the same file.
+
+    Each take runs in one ``BEGIN IMMEDIATE`` transaction, so concurrent
+    workers serialize on the write lock and never both spend the last token.
+    """
+
+    blocking = True
+
+    # Delete full buckets every this many takes
+    PRUNE_EVERY = 1000
+
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+        self._takes = itertools.count(1)
+        with self.pool.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_buckets_full_at ON rate_buckets (full_at)")
+            conn.commit()
+
+    def take(self, takes: Sequence[Take]) -> Tuple[bool, List[BucketResult]]:
+        keys = [key for key, _, _ in takes]
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            rows = conn.execute(
+                f"SELECT key, tokens, updated FROM rate_buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            allowed, results, states = apply_takes({key: (tokens, updated) for key, tokens, updated in rows}, takes, now)
+            if allowed:
+                conn.executemany(
+                    "INSERT INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, full_at = excluded.full_at",
+                    [(r.key, r.remaining, now, now + r.reset_after) for r in results],
+                )
+            if next(self._takes) % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,))
+            conn.commit()
+        return allowed, results
+
+    def stats(self) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            buckets = conn.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+        return {"backend": "sqlite", "path": self.pool.path, "buckets": buckets}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class QueueRejected(Exception):
+    """Raised when the fair queue is full or a request waited longer than ``max_wait``."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class FairQueue:
+    """
+    Weighted fair queuing in front of ``capacity`` concurrent slots.
+
+    A waiting request is tagged with virtual finish time
+    ``max(virtual time, flow's last finish) + cost / weight`` and freed
+    slots go to the smallest tag. Each flow (caller) thus gets a share of
+    the slots proportional to its weight however many requests it queues.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 64,
+        max_queue: int = 256,
+        max_wait: float = 5.0,
+        weights: Optional[Mapping[str, float]] = None,
+    ):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.weights = dict(weights or {})
+        self.in_use = 0
+        self.waiting = 0
+        self.virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        # (finish tag, sequence, future); futures of requests that gave up stay until popped
+        self._heap: List[Tuple[float, int, "asyncio.Future[None]"]] = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.timed_out = 0
+
+    async def acquire(self, flow: str, cost: float = 1.0) -> None:
+        """Wait for a slot, in fair order among waiting flows; raises ``QueueRejected``."""
+        if self.in_use < self.capacity and not self.waiting:
+            self.in_use += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise QueueRejected("queue_full", self.max_wait)
+
+        weight = self.weights.get(flow, 1.0)
+        finish = max(self.virtual_time, self._last_finish.get(flow, 0.0)) + cost / weight
+        self._last_finish[flow] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._sequence), future))
+        self.waiting += 1
+        self.queued += 1
+        admission_queue_depth.inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except BaseException as e:
+            if future.done():
+                # Granted a slot just as it gave up: pass the slot on
+                self.release()
+            else:
+                future.cancel()
+                self.waiting -= 1
+                admission_queue_depth.dec()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise QueueRejected("queue_timeout", self.max_wait)
+            raise
+        finally:
+            admission_queue_wait.observe(time.perf_counter() - started)
+
+    def release(self) -> None:
+        """Free a slot and hand it to the waiting request with the smallest finish tag."""
+        self.in_use -= 1
+        while self._heap and self.in_use < self.capacity:
+            finish, _, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            self.virtual_time = max(self.virtual_time, finish)
+            self.in_use += 1
+            self.waiting -= 1
+            self.admitted += 1
+            admission_queue_depth.dec()
+            future.set_result(None)
+        if len(self._last_finish) > 10 * self.max_queue:
+            self._last_finish = {flow: f for flow, f in self._last_finish.items() if f > self.virtual_time}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "timed_out": self.timed_out,
+        }
+
+
+class RateLimited(Exception):
+    """Raised when a request would overdraw its caller's or an enclave's bucket."""
+
+    def __init__(self, key: str, retry_after: float, headers: Dict[str, str]):
+        super().__init__(f"Rate limit exceeded for {key.split(':', 1)[0]}, retry in {retry_after:.1f}s")
+        self.key = key
+        self.retry_after = retry_after
+        self.headers = headers
+
+
+def rate_limit_headers(results: Sequence[BucketResult]) -> Dict[str, str]:
+    """RateLimit-Limit/-Remaining/-Reset for the most constrained bucket, plus Retry-After if one ran dry."""
+    if not results:
+        return {}
+    tightest = min(results, key=lambda r: (r.retry_after == 0, r.remaining / r.limit.burst))
+    headers = {
+        "RateLimit-Limit": str(int(tightest.limit.burst)),
+        "RateLimit-Remaining": str(max(0, int(tightest.remaining))),
+        "RateLimit-Reset": str(math.ceil(tightest.reset_after)),
+    }
+    if tightest.retry_after:
+        headers["Retry-After"] = str(math.ceil(tightest.retry_after))
+    return headers
+
+
+class Admission(NamedTuple):
+    """An admitted request: the rate-limit headers to send and whether it holds a fair-queue slot."""
+    headers: Dict[str, str]
+    holds_slot: bool
+
+
+class AdmissionController:
+    """Token buckets per caller and enclave, then a fair queue; see the module docstring."""
+
+    def __init__(
+        self,
+        store: BucketStore,
+        caller_limit: Optional[Limit] = None,
+        enclave_limit: Optional[Limit] = None,
+        queue: Optional[FairQueue] = None,
+        validator: Optional[TokenValidator] = None,
+        enabled: bool = True,
+    ):
+        self.store = store
+        self.caller_limit = caller_limit
+        self.enclave_limit = enclave_limit
+        self.queue = queue
+        self.validator = validator
+        self.enabled = enabled
+        self.admitted = 0
+        self.rate_limited = 0
+
+    async def identify(self, request: Request) -> str:
+        """``user:<sub>`` for a verified bearer token, otherwise ``addr:<client address>``."""
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if self.validator is not None and scheme.lower() == "bearer" and token:
+            try:
+                return f"user:{(await self.validator.validate_async(token.strip())).id}"
+            except InvalidToken:
+                pass
+        return f"addr:{request.client.host if request.client else 'unknown'}"
+
+    async def _take(self, caller: str, enclaves: Mapping[str, float]) -> Dict[str, str]:
+        takes: List[Take] = []
+        if self.caller_limit is not None:
+            takes.append((f"caller:{caller}", self.caller_limit, float(sum(enclaves.values()) or 1)))
+        if self.enclave_limit is not None:
+            takes.extend((f"enclave:{enclaveid}", self.enclave_limit, float(cost)) for enclaveid, cost in enclaves.items())
+        if not takes:
+            return {}
+        if self.store.blocking:
+            allowed, results = await asyncio.to_thread(self.store.take, takes)
+        else:
+            allowed, results = self.store.take(takes)
+        headers = rate_limit_headers(results)
+        if not allowed:
+            self.rate_limited += 1
+            blocked = max(results, key=lambda r: r.retry_after)
+            admission_rejections.inc(reason=f"rate_limited_{blocked.key.split(':', 1)[0]}")
+            raise RateLimited(blocked.key, blocked.retry_after, headers)
+        return headers
+
+    async def acquire(self, caller: str, enclaves: Mapping[str, float]) -> Admission:
+        """
+        Admit one request from ``caller`` costing ``enclaves[id]`` tokens per targeted enclave.
+
+        Waits for a fair-queue slot if all are taken; pass the result to
+        ``release`` when the request is done. Raises ``RateLimited`` or
+        ``QueueRejected``.
+        """
+        if not self.enabled:
+            return Admission({}, False)
+        headers = await self._take(caller, enclaves)
+        if self.queue is not None:
+            try:
+                await self.queue.acquire(caller, float(sum(enclaves.values()) or 1))
+            except QueueRejected as e:
+                admission_rejections.inc(reason=e.reason)
+                raise
+        self.admitted += 1
+        return Admission(headers, self.queue is not None)
+
+    def release(self, admission: Admission) -> None:
+        """Give back the fair-queue slot held by an admitted request."""
+        if admission.holds_slot:
+            self.queue.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "caller_limit": self.caller_limit._asdict() if self.caller_limit else None,
+            "enclave_limit": self.enclave_limit._asdict() if self.enclave_limit else None,
+            "store": self.store.stats(),
+            "queue": self.queue.stats() if self.queue is not None else None,
+        }
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parse ``"alice=2,bob=0.5"`` into caller weights keyed ``user:alice``, ``user:bob``."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, weight = item.partition("=")
+        weights[name if ":" in name else f"user:{name}"] = float(weight)
+    return weights
+
+
+def create_bucket_store(backend: str) -> BucketStore:
+    """Bucket store for ``backend``: memory (per process) or sqlite (ADMISSION_DB_PATH, shared by all workers)."""
+    if backend == "memory":
+        return MemoryBucketStore(max_keys=int(os.getenv("ADMISSION_MAX_KEYS", "100000")))
+    if backend == "sqlite":
+        return SQLiteBucketStore(SQLitePool(
+            os.getenv("ADMISSION_DB_PATH", "Backend/rate_limits.db"),
+            size=int(os.getenv("ADMISSION_DB_POOL_SIZE", "4")),
+        ))
+    raise ValueError(f"Unknown admission backend: {backend}")
+
+
+def _limit_from_env(prefix: str, rate: str, burst: str) -> Optional[Limit]:
+    """Limit from ``<prefix>_RATE``/``<prefix>_BURST``; a rate of 0 disables the bucket."""
+    limit = Limit(float(os.getenv(f"{prefix}_RATE", rate)), float(os.getenv(f"{prefix}_BURST", burst)))
+    return limit if limit.rate > 0 else None
+
+
+def admission_from_env() -> AdmissionController:
+    """
+    Admission controller configured from environment variables.
+
+    ADMISSION_ENABLED, ADMISSION_BACKEND (memory or sqlite),
+    RATE_LIMIT_CALLER_RATE/_BURST, RATE_LIMIT_ENCLAVE_RATE/_BURST,
+    ADMISSION_MAX_CONCURRENCY (0 disables the fair queue), ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_WAIT, ADMISSION_WEIGHTS, and SUPABASE_JWT_SECRET /
+    SUPABASE_JWT_AUDIENCE for identifying callers by their bearer token.
+    """
+    capacity = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    validator = None
+    if secret:
+        validator = TokenValidator(
+            TokenVerifier(secret=secret, audience=os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")),
+            TokenCache(max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))),
+        )
+    return AdmissionController(
+        create_bucket_store(os.getenv("ADMISSION_BACKEND", "memory")),
+        caller_limit=_limit_from_env("RATE_LIMIT_CALLER", "20", "40"),
+        enclave_limit=_limit_from_env("RATE_LIMIT_ENCLAVE", "200", "400"),
+        queue=FairQueue(
+            capacity=capacity,
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "5")),
+            weights=parse_weights(os.getenv("ADMISSION_WEIGHTS", "")),
+        ) if capacity > 0 else None,
+        validator=validator,
+        enabled=os.getenv("ADMISSION_ENABLED", "1") == "1",
+    )
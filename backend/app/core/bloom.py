@@ -0,0 +1,59 @@
+import hashlib
+import math
+import threading
+from typing import Any, Dict
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over byte strings.
+
+    Sized for ``capacity`` items at a false-positive rate of ``error_rate``;
+    adding more items keeps it correct (no false negatives) but raises the
+    false-positive rate, which ``stats`` reports. Bit positions come from one
+    BLAKE2b digest split into two halves (Kirsch–Mitzenmacher double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: bytes) -> None:
+        """Insert an item; re-adding one that is (probably) present does not change ``count``."""
+        positions = self._positions(item)
+        with self._lock:
+            new = False
+            for position in positions:
+                mask = 1 << (position & 7)
+                if not self._bits[position >> 3] & mask:
+                    self._bits[position >> 3] |= mask
+                    new = True
+            self.count += new
+
+    def __contains__(self, item: bytes) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, fill and the expected false-positive rate at the current count."""
+        expected = (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "bytes": len(self._bits),
+            "hashes": self.num_hashes,
+            "expected_false_positive_rate": expected,
+        }
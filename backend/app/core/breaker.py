@@ -0,0 +1,281 @@
+"""
+Per-enclave circuit breakers for calls proxied to enclaves.
+
+Without a breaker, every call to a slow or dead enclave waits out the full
+connect/read timeout and holds a worker and a connection slot while doing
+so. A breaker watches the outcomes of recent calls to one enclave and, once
+too many of them failed or were slow, opens: further calls are rejected at
+once with ``BreakerOpenError`` until ``open_seconds`` have passed. It then
+lets a few trial calls through (half-open); if they succeed it closes again,
+if one fails it reopens.
+
+Breaker state is exported on ``/metrics`` as ``enclave_breaker_state``
+(0 closed, 1 half-open, 2 open) together with transition and rejection
+counters. Closed breakers not used for ``idle_seconds`` are dropped along
+with their series, so ids that are called once do not accumulate.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .metrics import registry
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = registry.gauge(
+    "enclave_breaker_state", "Circuit breaker state per enclave: 0 closed, 1 half-open, 2 open.", ("enclave",))
+breaker_transitions = registry.counter(
+    "enclave_breaker_transitions_total", "Circuit breaker state changes per enclave, by new state.", ("enclave", "state"))
+breaker_rejections = registry.counter(
+    "enclave_breaker_rejections_total", "Calls rejected without contacting the enclave because its breaker was open.", ("enclave",))
+
+
+class BreakerOpenError(Exception):
+    """Raised instead of calling an enclave whose breaker is open."""
+
+    def __init__(self, enclaveid: str, retry_after: float):
+        super().__init__(f"Enclave {enclaveid} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.enclaveid = enclaveid
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Breaker for one enclave, driven by a sliding time window of call outcomes.
+
+    It opens once at least ``min_calls`` calls finished in the last
+    ``window_seconds`` and either ``failure_rate`` of them failed or
+    ``slow_rate`` of them took longer than ``slow_call_seconds``. Callers
+    ask ``allow()`` before each call and report the outcome with ``record()``,
+    or ``abandon()`` if the call was cancelled before it finished.
+    """
+
+    def __init__(
+        self,
+        enclaveid: str,
+        failure_rate: float = 0.5,
+        slow_rate: float = 0.8,
+        slow_call_seconds: float = 10.0,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        open_seconds: float = 15.0,
+        half_open_calls: int = 3,
+    ):
+        self.enclaveid = enclaveid
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.last_used = time.monotonic()
+        self.open_reason: Optional[str] = None
+        # (finished at, failed, slow) per call in the window
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+        breaker_state.inc(0, enclave=enclaveid)
+
+    def _transition(self, state: str, reason: Optional[str] = None) -> None:
+        breaker_state.inc(STATE_VALUES[state] - STATE_VALUES[self.state], enclave=self.enclaveid)
+        breaker_transitions.inc(enclave=self.enclaveid, state=state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.open_reason = reason
+            self.times_opened += 1
+        elif state == HALF_OPEN:
+            self._trials_in_flight = 0
+            self._trial_successes = 0
+        else:
+            self.open_reason = None
+            self._window.clear()
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets trial calls through."""
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Admit one call or raise ``BreakerOpenError``.
+
+        Returns True if the call is a half-open trial; pass that on to
+        ``record``/``abandon``.
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._trials_in_flight < self.half_open_calls:
+                self._trials_in_flight += 1
+                return True
+            self.rejected += 1
+        breaker_rejections.inc(enclave=self.enclaveid)
+        raise BreakerOpenError(self.enclaveid, self.retry_after() if self.state == OPEN else self.open_seconds)
+
+    def record(self, trial: bool, failed: bool, seconds: float) -> None:
+        """Report how an admitted call went."""
+        slow = seconds >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if trial:
+                self._trials_in_flight -= 1
+                if self.state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._transition(OPEN, "trial call failed" if failed else "trial call slow")
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+            self._window.append((now, failed, slow))
+            self._evaluate(now)
+
+    def abandon(self, trial: bool) -> None:
+        """Report that an admitted call was cancelled before it finished."""
+        if trial:
+            with self._lock:
+                self._trials_in_flight -= 1
+
+    def _prune(self, now: float) -> None:
+        while self._window and self._window[0][0] < now - self.window_seconds:
+            self._window.popleft()
+
+    def _evaluate(self, now: float) -> None:
+        self._prune(now)
+        calls = len(self._window)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for _, failed, _ in self._window if failed)
+        slow = sum(1 for _, _, is_slow in self._window if is_slow)
+        if failures >= self.failure_rate * calls:
+            self._transition(OPEN, f"{failures} of {calls} calls failed")
+        elif slow >= self.slow_rate * calls:
+            self._transition(OPEN, f"{slow} of {calls} calls slower than {self.slow_call_seconds:g}s")
+
+    def force_open(self, reason: str) -> None:
+        """Open the breaker regardless of call outcomes, e.g. after repeated failed health checks."""
+        with self._lock:
+            if self.state != OPEN:
+                self._transition(OPEN, reason)
+
+    def probe_succeeded(self) -> None:
+        """Let trial calls through straight away after a successful health check of an open breaker."""
+        with self._lock:
+            if self.state == OPEN:
+                self._transition(HALF_OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current state and window counts."""
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._window)
+            return {
+                "state": self.state,
+                "reason": self.open_reason,
+                "retry_after": round(self.retry_after(), 3) if self.state == OPEN else 0.0,
+                "window_calls": calls,
+                "window_failures": sum(1 for _, failed, _ in self._window if failed),
+                "window_slow": sum(1 for _, _, slow in self._window if slow),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class BreakerRegistry:
+    """
+    Creates and holds one ``CircuitBreaker`` per enclave, all with the same settings.
+
+    Closed breakers idle for ``idle_seconds`` (at least the breakers'
+    ``window_seconds``, so no recorded outcome is lost) are evicted, checked
+    at most once per ``window_seconds`` when a breaker is created.
+    """
+
+    def __init__(self, enabled: bool = True, idle_seconds: float = 300.0, **settings: Any):
+        self.enabled = enabled
+        self.settings = settings
+        window_seconds = settings.get("window_seconds", 30.0)
+        self.idle_seconds = max(idle_seconds, window_seconds)
+        self._evict_every = window_seconds
+        self._last_eviction = time.monotonic()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, enclaveid: str) -> Optional[CircuitBreaker]:
+        """The enclave's breaker, created on first use; None when breakers are disabled."""
+        if not self.enabled:
+            return None
+        breaker = self._breakers.get(enclaveid)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(enclaveid)
+                if breaker is None:
+                    self._evict_idle(time.monotonic())
+                    breaker = self._breakers[enclaveid] = CircuitBreaker(enclaveid, **self.settings)
+        return breaker
+
+    def _evict_idle(self, now: float) -> None:
+        """Drop closed breakers idle for ``idle_seconds`` and their metric series; call with the lock held."""
+        if now - self._last_eviction < self._evict_every:
+            return
+        self._last_eviction = now
+        cutoff = now - self.idle_seconds
+        for enclaveid in [e for e, b in self._breakers.items() if b.state == CLOSED and b.last_used < cutoff]:
+            del self._breakers[enclaveid]
+            for metric in (breaker_state, breaker_transitions, breaker_rejections):
+                metric.remove(enclave=enclaveid)
+            self.evicted += 1
+
+    def find(self, enclaveid: str) -> Optional[CircuitBreaker]:
+        """The enclave's breaker if it has one already; never creates one."""
+        return self._breakers.get(enclaveid) if self.enabled else None
+
+    def active(self, idle_seconds: float) -> Dict[str, CircuitBreaker]:
+        """Breakers of enclaves called in the last ``idle_seconds``, plus every breaker not closed."""
+        cutoff = time.monotonic() - idle_seconds
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {enclaveid: b for enclaveid, b in breakers if b.last_used >= cutoff or b.state != CLOSED}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-enclave breaker state and a count of breakers per state."""
+        with self._lock:
+            breakers = list(self._breakers.items())
+        enclaves = {enclaveid: breaker.stats() for enclaveid, breaker in breakers}
+        counts = {state: 0 for state in STATE_VALUES}
+        for stats in enclaves.values():
+            counts[stats["state"]] += 1
+        return {"enabled": self.enabled, "states": counts, "evicted": self.evicted, "enclaves": enclaves}
+
+
+def breakers_from_env() -> BreakerRegistry:
+    """Breaker registry configured from ``ENCLAVE_BREAKER_*`` environment variables."""
+    return BreakerRegistry(
+        enabled=os.getenv("ENCLAVE_BREAKER_ENABLED", "1") == "1",
+        idle_seconds=float(os.getenv("ENCLAVE_BREAKER_IDLE_SECONDS", "300")),
+        failure_rate=float(os.getenv("ENCLAVE_BREAKER_FAILURE_RATE", "0.5")),
+        slow_rate=float(os.getenv("ENCLAVE_BREAKER_SLOW_RATE", "0.8")),
+        slow_call_seconds=float(os.getenv("ENCLAVE_BREAKER_SLOW_SECONDS", "10")),
+        min_calls=int(os.getenv("ENCLAVE_BREAKER_MIN_CALLS", "10")),
+        window_seconds=float(os.getenv("ENCLAVE_BREAKER_WINDOW_SECONDS", "30")),
+        open_seconds=float(os.getenv("ENCLAVE_BREAKER_OPEN_SECONDS", "15")),
+        half_open_calls=int(os.getenv("ENCLAVE_BREAKER_HALF_OPEN_CALLS", "3")),
+    )
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+# Loaded CA material: (private key object, CA certificate)
+CAMaterial = Tuple[Any, x509.Certificate]
+
+# (inode, mtime in ns, size) of each file CA material was read from
+FileFingerprint = Tuple[Tuple[int, int, int], ...]
+
+
+class LoadedCA(NamedTuple):
+    """CA material together with the files it was read from, so the cache can notice when they change."""
+    material: CAMaterial
+    files: Tuple[str, ...] = ()
+    fingerprint: Optional[FileFingerprint] = None
+
+
+def fingerprint(paths: Tuple[str, ...]) -> Optional[FileFingerprint]:
+    """Identity of each file's current contents, or None if one is missing."""
+    try:
+        return tuple((st.st_ino, st.st_mtime_ns, st.st_size) for st in map(os.stat, paths))
+    except OSError:
+        return None
+
+
+def load_ca_from_paths(private_key_path: str, certificate_path: str) -> CAMaterial:
+    """Read and PEM-parse a CA private key and certificate from disk."""
+    with open(private_key_path, "rb") as key_file:
+        ca_private_key = serialization.load_pem_private_key(
+            key_file.read(),
+            password=None
+        )
+
+    with open(certificate_path, "rb") as cert_file:
+        ca_cert = x509.load_pem_x509_certificate(cert_file.read())
+
+    return ca_private_key, ca_cert
+
+
+def load_ca_files(private_key_path: str, certificate_path: str) -> LoadedCA:
+    """``load_ca_from_paths`` for ``CACache.get_or_load``, remembering which files were read."""
+    files = (private_key_path, certificate_path)
+    # Fingerprint before reading: a file replaced mid-read then looks changed on the next lookup
+    before = fingerprint(files)
+    return LoadedCA(load_ca_from_paths(private_key_path, certificate_path), files, before)
+
+
+class CACache:
+    """
+    Size-bounded LRU cache of loaded CA key material keyed by enclave id.
+
+    Entries expire ``ttl_seconds`` after they were loaded. Every hit also
+    re-stats the key and certificate files the entry was read from and drops
+    it if their inode, mtime or size changed. ``invalidate`` only reaches
+    this process's copy of the cache, so this is what makes process-pool
+    signing workers and other uvicorn workers pick up a regenerated CA on
+    their next signature rather than after the TTL. Loaders run outside the lock, so two
+    concurrent misses for the same enclave may both load it.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # enclave id -> (loaded at, material, files, their fingerprint when loaded)
+        self._entries: "OrderedDict[str, Tuple[float, CAMaterial, Tuple[str, ...], Optional[FileFingerprint]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def get(self, enclave_id: str):
+        """Return the cached CA material for an enclave, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(enclave_id)
+            if entry is not None:
+                loaded_at, material, files, loaded_fingerprint = entry
+                if now - loaded_at >= self.ttl_seconds:
+                    self.expirations += 1
+                elif files and fingerprint(files) != loaded_fingerprint:
+                    # The key or certificate file was replaced since loading: the CA was rotated
+                    self.stale += 1
+                else:
+                    self._entries.move_to_end(enclave_id)
+                    self.hits += 1
+                    return material
+                del self._entries[enclave_id]
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        enclave_id: str,
+        material: CAMaterial,
+        files: Tuple[str, ...] = (),
+        loaded_fingerprint: Optional[FileFingerprint] = None,
+    ) -> None:
+        """Store CA material read from ``files`` (as of ``loaded_fingerprint``) for an enclave, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[enclave_id] = (time.monotonic(), material, files, loaded_fingerprint)
+            self._entries.move_to_end(enclave_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, enclave_id: str, loader: Callable[[], LoadedCA]) -> CAMaterial:
+        """Return cached CA material, calling ``loader`` and caching its result on a miss."""
+        material = self.get(enclave_id)
+        if material is None:
+            loaded = loader()
+            material = loaded.material
+            self.put(enclave_id, material, loaded.files, loaded.fingerprint)
+        return material
+
+    def invalidate(self, enclave_id: str) -> None:
+        """Drop the cached entry for an enclave, e.g. after its CA was regenerated."""
+        with self._lock:
+            if self._entries.pop(enclave_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by the SQLite and Supabase signing endpoints
+ca_cache = CACache(
+    max_entries=int(os.getenv("CA_CACHE_MAX_ENTRIES", "128")),
+    ttl_seconds=float(os.getenv("CA_CACHE_TTL_SECONDS", "300")),
+)
@@ -0,0 +1,129 @@
+import base64
+import os
+import tempfile
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Optional
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+# Validity period of certificates issued to users by an enclave CA
+USER_CERT_VALIDITY = timedelta(days=365)
+
+# Validity period of an enclave's self-signed CA certificate
+CA_CERT_VALIDITY = timedelta(days=3650)
+
+
+class KeyAlgorithm(str, Enum):
+    """Key algorithms an enclave CA can be created with."""
+    RSA_2048 = "rsa-2048"
+    ECDSA_P256 = "ecdsa-p256"
+    ED25519 = "ed25519"
+
+
+def generate_ca_key(algorithm: KeyAlgorithm) -> Any:
+    """Generate a fresh CA private key for the given algorithm."""
+    if algorithm == KeyAlgorithm.RSA_2048:
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == KeyAlgorithm.ECDSA_P256:
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == KeyAlgorithm.ED25519:
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported key algorithm: {algorithm}")
+
+
+def signature_hash(private_key: Any) -> Optional[hashes.HashAlgorithm]:
+    """
+    Hash to sign with for a CA key: SHA-256 for RSA and ECDSA, None for Ed25519,
+    which hashes internally and must not be given one.
+    """
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return None
+    return hashes.SHA256()
+
+
+def decode_csr(csr_pem_b64: str) -> x509.CertificateSigningRequest:
+    """Decode a base64 encoded PEM CSR as sent by the frontend."""
+    csr_pem_decoded = base64.b64decode(csr_pem_b64).decode('utf-8')
+    return x509.load_pem_x509_csr(csr_pem_decoded.encode())
+
+
+def build_user_certificate(
+    csr: x509.CertificateSigningRequest,
+    ca_private_key: Any,
+    ca_cert: x509.Certificate,
+) -> x509.Certificate:
+    """Issue a leaf certificate for the CSR's subject and key, signed by the enclave CA."""
+    now = datetime.utcnow()
+    return (
+        x509.CertificateBuilder()
+        .subject_name(csr.subject)
+        .issuer_name(ca_cert.subject)
+        .public_key(csr.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + USER_CERT_VALIDITY)
+        .add_extension(
+            x509.BasicConstraints(ca=False, path_length=None),
+            critical=True
+        )
+        .sign(ca_private_key, signature_hash(ca_private_key))
+    )
+
+
+def certificate_to_pem(cert: x509.Certificate) -> str:
+    """Serialize a certificate to a PEM string."""
+    return cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def build_ca_certificate(private_key: Any, common_name: str) -> x509.Certificate:
+    """Create the self-signed CA certificate of an enclave, like ``openssl req -x509 -subj /CN=...``."""
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    public_key = private_key.public_key()
+    now = datetime.utcnow()
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + CA_CERT_VALIDITY)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False)
+        .sign(private_key, signature_hash(private_key))
+    )
+
+
+def write_file_atomic(path: str, data: bytes, mode: int = 0o644) -> None:
+    """
+    Replace ``path`` with ``data`` in one step.
+
+    The bytes go to a temporary file in the same directory which is then
+    renamed over ``path``, so concurrent readers see the old file or the new
+    one, never a partially written one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_ca_files(private_key: Any, ca_cert: x509.Certificate, private_key_path: str, certificate_path: str) -> None:
+    """Atomically write a CA private key (PKCS#8, owner-only permissions) and certificate as PEM files."""
+    key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    write_file_atomic(private_key_path, key_pem, 0o600)
+    write_file_atomic(certificate_path, ca_cert.public_bytes(serialization.Encoding.PEM))
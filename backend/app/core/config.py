@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -12,6 +13,16 @@ class Settings(BaseSettings):
     
     # JWT Settings
     JWT_TOKEN_PREFIX: str = "Bearer"
+
+    # Local access token verification: HS256 tokens need the project's JWT secret,
+    # asymmetric tokens are checked against the project's JWKS
+    SUPABASE_JWT_SECRET: Optional[str] = None
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    JWKS_CACHE_TTL_SECONDS: float = 600.0
+
+    # Validated token cache
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0
     
     class Config:
         env_file = ".env"
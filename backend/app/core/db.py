@@ -1,4 +1,7 @@
-from supabase import create_client, Client
+import asyncio
+from typing import Optional
+
+from supabase import create_client, acreate_client, AsyncClient, AsyncClientOptions, Client
 from .config import settings
 from functools import lru_cache
 
@@ -7,6 +10,9 @@ def get_supabase() -> Client:
     """
     Create and cache Supabase client instance.
     Uses environment variables for configuration.
+
+    The client is synchronous; only call it from worker threads (signing
+    pool jobs, ``asyncio.to_thread``), never directly from a coroutine.
     """
     supabase: Client = create_client(
         settings.SUPABASE_URL,
@@ -14,12 +20,38 @@ def get_supabase() -> Client:
     )
     return supabase
 
+_async_supabase: Optional[AsyncClient] = None
+_async_supabase_lock = asyncio.Lock()
+
+async def get_async_supabase() -> AsyncClient:
+    """
+    FastAPI dependency returning the shared async Supabase client.
+
+    Created on first use and reused afterwards, so requests share its
+    connection pools and overlap their PostgREST/GoTrue I/O on the event loop.
+    Sessions are not persisted or refreshed: this is a server-side client.
+    """
+    global _async_supabase
+    if _async_supabase is None:
+        async with _async_supabase_lock:
+            if _async_supabase is None:
+                _async_supabase = await acreate_client(
+                    settings.SUPABASE_URL,
+                    settings.SUPABASE_KEY,
+                    options=AsyncClientOptions(persist_session=False, auto_refresh_token=False),
+                )
+    return _async_supabase
+
 def get_user_by_token(token: str):
     """
-    Get user details from Supabase using JWT token.
+    Get the user a JWT token belongs to, verified locally and cached.
+    Returns None if the token is invalid.
     """
+    # Imported here because the validator itself falls back to get_supabase
+    from .security import token_validator
+    from .tokens import InvalidToken
+
     try:
-        supabase = get_supabase()
-        return supabase.auth.get_user(token)
-    except Exception as e:
+        return token_validator.validate(token)
+    except InvalidToken:
         return None
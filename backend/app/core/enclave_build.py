@@ -0,0 +1,253 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from .certificates import write_file_atomic
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+# Read size when hashing build context files
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def sha256_hex(data: bytes) -> str:
+    """Hex SHA-256 of a byte string."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """Hex SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CompiledTemplate:
+    """
+    A ``{{name}}`` template parsed once into literal text and placeholder names.
+
+    Rendering joins the pre-split literals with the substituted values in one
+    pass, instead of scanning the whole template once per placeholder.
+    """
+
+    def __init__(self, name: str, source: str):
+        parts = PLACEHOLDER.split(source)
+        self.name = name
+        self.digest = sha256_hex(source.encode())
+        self._literals = parts[0::2]
+        self._fields = parts[1::2]
+        self.fields = frozenset(self._fields)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        """Substitute every placeholder; raises ValueError if a value is missing."""
+        missing = self.fields.difference(values)
+        if missing:
+            raise ValueError(f"Template {self.name} needs values for {sorted(missing)}")
+        out = [self._literals[0]]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return "".join(out)
+
+
+class TemplateSet:
+    """Compiled templates keyed by the name of the file each one renders to."""
+
+    def __init__(self, templates: Mapping[str, CompiledTemplate]):
+        self.templates = dict(templates)
+        self.renders = 0
+
+    @classmethod
+    def from_files(cls, directory: str, outputs: Mapping[str, str]) -> "TemplateSet":
+        """Read and compile ``{output name: template file name}`` from ``directory``."""
+        templates = {}
+        for output_name, template_name in outputs.items():
+            with open(os.path.join(directory, template_name), "r") as template_file:
+                templates[output_name] = CompiledTemplate(template_name, template_file.read())
+        return cls(templates)
+
+    def render(self, values: Mapping[str, str]) -> Dict[str, bytes]:
+        """Render every template; returns ``{output name: content}``."""
+        self.renders += 1
+        return {name: template.render(values).encode() for name, template in self.templates.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the compiled templates, their placeholders and the render count."""
+        return {
+            "renders": self.renders,
+            "templates": {
+                name: {"source": template.name, "digest": template.digest, "fields": sorted(template.fields)}
+                for name, template in self.templates.items()
+            },
+        }
+
+
+class ArtifactStore:
+    """
+    Write-once, content-addressed store of rendered files.
+
+    Each distinct content is kept once under ``root/<first 2 hex>/<sha256>``
+    (read-only) and hard-linked into job workspaces, falling back to a copy
+    where linking is not possible. The digests name a rendered enclave
+    exactly, which is what the build cache keys on.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def path(self, digest: str) -> str:
+        """Location of an artifact in the store."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` unless an identical artifact exists; returns its digest."""
+        digest = sha256_hex(data)
+        path = self.path(digest)
+        if os.path.exists(path):
+            with self._lock:
+                self.deduplicated += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic(path, data, 0o444)
+        with self._lock:
+            self.stored += 1
+        return digest
+
+    def materialize(self, digest: str, destination: str) -> None:
+        """Place an artifact at ``destination``, replacing whatever is there."""
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(self.path(digest), destination)
+        except OSError:
+            shutil.copyfile(self.path(digest), destination)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many artifacts were written and how many renders reused one."""
+        with self._lock:
+            return {"root": self.root, "stored": self.stored, "deduplicated": self.deduplicated}
+
+
+def build_context_key(workdir: str, command: Iterable[str], exclude: Iterable[str] = ()) -> Tuple[str, int]:
+    """
+    Content hash of a build: the command plus every file under ``workdir``.
+
+    Files are hashed by relative path and contents in a stable order, so the
+    key changes exactly when something that goes into the image does. Names
+    in ``exclude`` (matched against the path relative to ``workdir``) are
+    skipped. Returns the key and the number of files hashed.
+    """
+    excluded = set(exclude)
+    entries: List[Tuple[str, str]] = []
+    for directory, subdirectories, files in os.walk(workdir):
+        subdirectories.sort()
+        for name in files:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, workdir).replace(os.sep, "/")
+            if relative not in excluded:
+                entries.append((relative, file_digest(path)))
+    entries.sort()
+
+    digest = hashlib.sha256()
+    digest.update("\0".join(command).encode())
+    for relative, file_hash in entries:
+        digest.update(b"\n" + relative.encode() + b"\0" + file_hash.encode())
+    return digest.hexdigest(), len(entries)
+
+
+class BuildCache:
+    """
+    Enclave images (EIFs) keyed by the content hash of their build context.
+
+    A hit copies the cached image into the workspace instead of running the
+    build. At most ``max_entries`` images are kept; the least recently used
+    one is evicted when a new image is stored.
+    """
+
+    def __init__(self, root: str, max_entries: int = 32):
+        self.root = os.path.abspath(root)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.eif")
+
+    def fetch(self, key: str, destination: str) -> bool:
+        """Copy the image cached under ``key`` to ``destination``; False on a miss."""
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, destination)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, source: str) -> None:
+        """Cache the image at ``source`` under ``key`` and evict the oldest beyond ``max_entries``."""
+        if self.max_entries <= 0:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(source, "rb") as image:
+            write_file_atomic(self._path(key), image.read())
+        self._evict()
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else ():
+            if name.endswith(".eif"):
+                path = os.path.join(self.root, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, path, info.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries())
+        for _, path, _ in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the cached images' count and size."""
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "root": self.root,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(size for _, _, size in entries),
+            }
+
+
+def build_cache_from_env() -> BuildCache:
+    """Build cache configured by BUILD_CACHE_DIR and BUILD_CACHE_MAX_ENTRIES (0 disables storing)."""
+    return BuildCache(
+        os.getenv("BUILD_CACHE_DIR", "Backend/build-cache"),
+        max_entries=int(os.getenv("BUILD_CACHE_MAX_ENTRIES", "32")),
+    )
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+from urllib.parse import urlsplit
+
+import httpx
+
+from .breaker import BreakerRegistry, CircuitBreaker, breakers_from_env
+
+# Enclave URL; override with e.g. "http://127.0.0.1:8008" to run against a local stub enclave
+ENCLAVE_URL_TEMPLATE = os.getenv(
+    "ENCLAVE_URL_TEMPLATE",
+    "https://{enclaveid}.app-73f7d14326e6.enclave.evervault.com"
+)
+
+# Upstream statuses worth retrying for idempotent calls
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Failures where the request never reached the enclave, so a retry is always safe
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _http2_available() -> bool:
+    """Return True if the optional ``h2`` package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class EnclaveClient:
+    """
+    Long-lived, pooled HTTP client for calls proxied to enclaves.
+
+    One ``httpx.AsyncClient`` is shared by every request so TCP/TLS connections
+    are kept alive and reused. Concurrency per enclave host is capped with a
+    semaphore, and failed calls are retried with full-jitter exponential
+    backoff: connection failures always, read failures and 502/503/504 only
+    for idempotent calls. Batches fanned out with ``post_many`` are further
+    capped at ``batch_concurrency`` in-flight calls per enclave, so they
+    leave connections free for single requests.
+
+    Timeouts are set per phase: ``connect_timeout`` (default 5s) to open a
+    connection, ``write_timeout`` (5s) to send a request body,
+    ``pool_timeout`` (5s) to wait for a free connection, and ``read_timeout``
+    (30s) between bytes of the response. The read timeout is longer than
+    httpx's 5s default because an enclave runs the whole query before it
+    answers. Each phase can be changed with the matching ``ENCLAVE_*_TIMEOUT``
+    variable.
+
+    Every attempt goes through the enclave's circuit breaker (see
+    ``app.core.breaker``), so calls to an enclave that keeps failing or
+    timing out are rejected at once instead of each waiting out the
+    timeout. With ``hedge_delay`` set, an idempotent call that has not
+    answered within that many seconds is sent a second time and the first
+    good response wins; ``hedge_max_ratio`` caps hedges at that fraction
+    of all requests so a slow enclave does not get double the load.
+    """
+
+    def __init__(
+        self,
+        url_template: str = ENCLAVE_URL_TEMPLATE,
+        max_connections_per_host: int = 20,
+        max_connections: int = 200,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        write_timeout: float = 5.0,
+        pool_timeout: float = 5.0,
+        retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        http2: bool = True,
+        batch_concurrency: int = 16,
+        breakers: Optional[BreakerRegistry] = None,
+        hedge_delay: float = 0.0,
+        hedge_max_ratio: float = 0.1,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url_template = url_template
+        self.max_connections_per_host = max_connections_per_host
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.http2 = http2 and _http2_available()
+        self.batch_concurrency = batch_concurrency
+        self.breakers = breakers if breakers is not None else BreakerRegistry()
+        self.hedge_delay = hedge_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._batch_limits: Dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.streamed = 0
+        self.batches = 0
+        self.batch_items = 0
+        self.connections_opened = 0
+        self.retries_performed = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def start(self) -> None:
+        """Create the shared client if it does not exist yet."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                transport=self.transport,
+            )
+
+    async def close(self) -> None:
+        """Close the shared client and all pooled connections."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def url(self, enclaveid: str, path: str) -> str:
+        """Build the URL of ``path`` on the given enclave."""
+        return self.url_template.format(enclaveid=enclaveid).rstrip("/") + path
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Return the semaphore capping concurrent requests to the URL's host."""
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return limit
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook used to count newly opened connections."""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _send(
+        self, breaker: Optional[CircuitBreaker], method: str, url: str, stream: bool, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        """Make one attempt, admitted by the enclave's breaker and reported back to it."""
+        trial = breaker.allow() if breaker is not None else False
+        started = time.perf_counter()
+        try:
+            async with self._host_limit(url):
+                self.requests += 1
+                self.streamed += stream
+                started = time.perf_counter()
+                request = self._client.build_request(method, url, **kwargs)
+                response = await self._client.send(request, stream=stream)
+        except httpx.TransportError:
+            if breaker is not None:
+                breaker.record(trial, True, time.perf_counter() - started)
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.abandon(trial)
+            raise
+        if breaker is not None:
+            breaker.record(trial, response.status_code in RETRYABLE_STATUS_CODES, time.perf_counter() - started)
+        return response
+
+    def _can_hedge(self) -> bool:
+        """True while hedges stay within ``hedge_max_ratio`` of all requests."""
+        return self.hedges < self.hedge_max_ratio * self.requests
+
+    async def _send_hedged(
+        self, breaker: Optional[CircuitBreaker], method: str, url: str, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        """
+        Make one attempt of an idempotent call, hedged after ``hedge_delay`` seconds.
+
+        The first response that is not a retryable error wins and the other
+        copy is cancelled. If both fail, the outcome that finished last is
+        returned or raised, for ``request`` to retry.
+        """
+        primary = asyncio.ensure_future(self._send(breaker, method, url, False, kwargs))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done or not self._can_hedge():
+                return await primary
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._send(breaker, method, url, False, kwargs))
+            pending.add(hedge)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                good = [task for task in done if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS_CODES]
+                if good:
+                    self.hedges_won += good[0] is hedge
+                    return good[0].result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(
+        self, method: str, enclaveid: str, path: str, idempotent: bool = False, stream: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Send a request to an enclave, retrying transient failures as configured.
+
+        With ``stream=True`` only the status and headers are read; the caller
+        consumes the body and must ``aclose()`` the response. Retries then only
+        happen before the response is handed over. Raises ``BreakerOpenError``
+        without contacting the enclave while its breaker is open, including
+        between retries.
+        """
+        self.start()
+        url = self.url(enclaveid, path)
+        kwargs["extensions"] = {**kwargs.get("extensions", {}), "trace": self._trace}
+        breaker = self.breakers.get(enclaveid)
+        hedged = idempotent and not stream and self.hedge_delay > 0
+
+        attempt = 0
+        while True:
+            try:
+                if hedged:
+                    response = await self._send_hedged(breaker, method, url, kwargs)
+                else:
+                    response = await self._send(breaker, method, url, stream, kwargs)
+                if not (idempotent and response.status_code in RETRYABLE_STATUS_CODES and attempt < self.retries):
+                    return response
+                await response.aclose()
+            except httpx.TransportError as e:
+                retryable = isinstance(e, NOT_SENT_ERRORS) or idempotent
+                if not retryable or attempt >= self.retries:
+                    self.failures += 1
+                    raise
+            attempt += 1
+            self.retries_performed += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def post(self, enclaveid: str, path: str, idempotent: bool = False, **kwargs: Any) -> httpx.Response:
+        """POST to an enclave; see ``request``."""
+        return await self.request("POST", enclaveid, path, idempotent=idempotent, **kwargs)
+
+    async def probe(self, enclaveid: str, path: str, timeout: float) -> httpx.Response:
+        """GET ``path`` once with its own timeout, bypassing breaker, retries and hedging; for health checks."""
+        self.start()
+        return await self._client.get(self.url(enclaveid, path), timeout=timeout)
+
+    async def post_many(
+        self, enclaveid: str, path: str, bodies: Sequence[Any], idempotent: bool = False
+    ) -> List[Union[httpx.Response, Exception]]:
+        """
+        POST each JSON body to one enclave concurrently and return the outcomes in input order.
+
+        At most ``batch_concurrency`` calls per enclave are in flight across all
+        batches. A call that fails is returned as its exception instead of
+        failing the others.
+        """
+        limit = self._batch_limits.get(enclaveid)
+        if limit is None:
+            limit = self._batch_limits[enclaveid] = asyncio.Semaphore(self.batch_concurrency)
+        self.batches += 1
+        self.batch_items += len(bodies)
+
+        async def post_one(body: Any) -> httpx.Response:
+            async with limit:
+                return await self.post(enclaveid, path, idempotent=idempotent, json=body)
+
+        return await asyncio.gather(*(post_one(body) for body in bodies), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request, retry, batch, hedging and connection-reuse counters and breaker states."""
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "http2": self.http2,
+            "requests": self.requests,
+            "streamed": self.streamed,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_rate": reused / self.requests if self.requests else 0.0,
+            "retries": self.retries_performed,
+            "failures": self.failures,
+            "batches": self.batches,
+            "batch_items": self.batch_items,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "breakers": self.breakers.stats()["states"],
+            "hosts": len(self._host_limits),
+        }
+
+
+# Process-wide client shared by the enclave proxy endpoints
+enclave_client = EnclaveClient(
+    max_connections_per_host=int(os.getenv("ENCLAVE_MAX_CONNECTIONS_PER_HOST", "20")),
+    max_connections=int(os.getenv("ENCLAVE_MAX_CONNECTIONS", "200")),
+    keepalive_expiry=float(os.getenv("ENCLAVE_KEEPALIVE_EXPIRY", "30")),
+    connect_timeout=float(os.getenv("ENCLAVE_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("ENCLAVE_READ_TIMEOUT", "30")),
+    write_timeout=float(os.getenv("ENCLAVE_WRITE_TIMEOUT", "5")),
+    pool_timeout=float(os.getenv("ENCLAVE_POOL_TIMEOUT", "5")),
+    retries=int(os.getenv("ENCLAVE_RETRIES", "2")),
+    http2=os.getenv("ENCLAVE_HTTP2", "1") == "1",
+    batch_concurrency=int(os.getenv("ENCLAVE_BATCH_CONCURRENCY", "16")),
+    breakers=breakers_from_env(),
+    hedge_delay=float(os.getenv("ENCLAVE_HEDGE_DELAY", "0")),
+    hedge_max_ratio=float(os.getenv("ENCLAVE_HEDGE_MAX_RATIO", "0.1")),
+)
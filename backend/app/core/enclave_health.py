@@ -0,0 +1,161 @@
+"""
+Background health checks of enclaves, with cached results.
+
+Every ``interval`` seconds the monitor calls the ``/health`` route of each
+enclave the backend talked to in the last ``idle_seconds`` (and of every
+enclave whose breaker is not closed), with a short ``probe_timeout``
+instead of the proxy's read timeout. Results are cached per enclave and
+fed to the enclave's circuit breaker: ``failures_to_open`` failed probes in
+a row open it before user calls pile up behind a dead enclave (a single
+lost probe does not), and a successful probe of an open breaker lets trial
+calls through without waiting out ``open_seconds``. Results of enclaves
+neither called nor checked for ``idle_seconds`` are forgotten.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .enclave_client import EnclaveClient
+from .metrics import registry
+
+enclave_up = registry.gauge(
+    "enclave_health_up", "1 if the enclave's last health check passed, 0 if it failed.", ("enclave",))
+
+
+class EnclaveHealthMonitor:
+    """Probes enclave /health routes in the background and caches the results."""
+
+    def __init__(
+        self,
+        client: EnclaveClient,
+        interval: float = 10.0,
+        probe_timeout: float = 2.0,
+        idle_seconds: float = 300.0,
+        failures_to_open: int = 3,
+    ):
+        self.client = client
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.idle_seconds = idle_seconds
+        self.failures_to_open = failures_to_open
+        # Failed probes in a row per enclave, reset by a successful one
+        self._consecutive_failures: Dict[str, int] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._probing: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.probes = 0
+        self.probe_failures = 0
+
+    def start(self) -> None:
+        """Start the background loop on the running event loop; a no-op if ``interval`` is 0."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the background loop."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            enclaves = self.client.breakers.active(self.idle_seconds)
+            await asyncio.gather(*(self.check(enclaveid) for enclaveid in enclaves), return_exceptions=True)
+            self._forget_idle(enclaves)
+
+    def _forget_idle(self, active) -> None:
+        """Drop cached results and series of enclaves neither active nor checked within ``idle_seconds``."""
+        cutoff = time.time() - self.idle_seconds
+        for enclaveid in [e for e, r in self._results.items() if e not in active and r["checked_at"] < cutoff]:
+            del self._results[enclaveid]
+            self._consecutive_failures.pop(enclaveid, None)
+            enclave_up.remove(enclave=enclaveid)
+
+    async def _probe(self, enclaveid: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error = None
+        status_code = None
+        try:
+            response = await self.client.probe(enclaveid, "/health", self.probe_timeout)
+            status_code = response.status_code
+            healthy = response.is_success
+        except httpx.HTTPError as e:
+            healthy = False
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        self.probes += 1
+        self.probe_failures += not healthy
+        failures = 0 if healthy else self._consecutive_failures.get(enclaveid, 0) + 1
+        self._consecutive_failures[enclaveid] = failures
+
+        breaker = self.client.breakers.find(enclaveid)
+        if breaker is not None:
+            if healthy:
+                breaker.probe_succeeded()
+            elif failures >= self.failures_to_open:
+                breaker.force_open(f"{failures} health checks failed in a row")
+        enclave_up.inc((1 if healthy else 0) - enclave_up.value(enclave=enclaveid), enclave=enclaveid)
+        result = {
+            "healthy": healthy,
+            "status_code": status_code,
+            "error": error,
+            "consecutive_failures": failures,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "checked_at": time.time(),
+        }
+        self._results[enclaveid] = result
+        return result
+
+    async def check(self, enclaveid: str) -> Dict[str, Any]:
+        """Probe the enclave now; concurrent checks of one enclave share a single probe."""
+        pending = self._probing.get(enclaveid)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._probing[enclaveid] = future
+        try:
+            result = await self._probe(enclaveid)
+            future.set_result(result)
+            return result
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._probing[enclaveid]
+
+    def known(self, enclaveid: str) -> bool:
+        """Whether the enclave was called through the client or checked before, so probing it adds no new state."""
+        return enclaveid in self._results or self.client.breakers.find(enclaveid) is not None
+
+    async def status(self, enclaveid: str, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Cached health of the enclave, probing it first if the result is older than ``max_age`` (default ``interval``)."""
+        max_age = self.interval if max_age is None else max_age
+        cached = self._results.get(enclaveid)
+        if cached is None or time.time() - cached["checked_at"] > max_age:
+            cached = await self.check(enclaveid)
+        return {**cached, "age_seconds": round(time.time() - cached["checked_at"], 3)}
+
+    def stats(self) -> Dict[str, Any]:
+        """Probe counters and the last cached result per enclave."""
+        return {
+            "interval": self.interval,
+            "running": self._task is not None,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "enclaves": dict(self._results),
+        }
+
+
+def enclave_health_from_env(client: EnclaveClient) -> EnclaveHealthMonitor:
+    """Health monitor configured from ``ENCLAVE_HEALTH_*`` environment variables."""
+    return EnclaveHealthMonitor(
+        client,
+        interval=float(os.getenv("ENCLAVE_HEALTH_INTERVAL", "10")),
+        probe_timeout=float(os.getenv("ENCLAVE_HEALTH_TIMEOUT", "2")),
+        idle_seconds=float(os.getenv("ENCLAVE_HEALTH_IDLE_SECONDS", "300")),
+        failures_to_open=int(os.getenv("ENCLAVE_HEALTH_FAILURES_TO_OPEN", "3")),
+    )
@@ -0,0 +1,264 @@
+"""
+Envelope encryption for enclave queries and results.
+
+Protocol version 1 encrypts a message directly with RSA-OAEP (SHA-256),
+which caps it at 190 bytes for a 2048-bit key. Version 2 encrypts it with a
+fresh AES-256-GCM key and wraps only that key with RSA-OAEP, so a message of
+any size costs one RSA operation. A version 2 envelope is a single
+URL-safe string:
+
+    v2.<wrapped key>.<nonce prefix>.<chunk size>.<chunk 0>.<chunk 1>...
+
+Every part is unpadded base64url. The plaintext is split into chunks of
+``chunk size`` bytes, each sealed separately with nonce = 8-byte random
+prefix || 4-byte big-endian chunk index. Each chunk's associated data is the
+header (the first four parts), its index and whether it is the last chunk,
+so chunks cannot be reordered, moved between envelopes or dropped from the
+end. That layout lets ``seal_stream`` and ``open_stream`` work on payloads
+that never fit in memory at once. ``app/template_index.js`` implements the
+same format inside the enclave.
+
+Signatures are RSASSA-PKCS1-v1_5 with SHA-256 over the encrypted query,
+base64url encoded, as in version 1.
+"""
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa, utils
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+ENVELOPE_VERSION = 2
+ENVELOPE_PREFIX = "v2"
+
+# Plaintext bytes per AES-GCM chunk
+CHUNK_BYTES = 64 * 1024
+
+KEY_BYTES = 32
+NONCE_PREFIX_BYTES = 8
+MAX_CHUNKS = 2 ** 32
+
+OAEP = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+Data = Union[bytes, str]
+
+
+def b64url_encode(data: bytes) -> str:
+    """Unpadded base64url, as produced by the enclave's ``base64url`` package."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_decode(data: str) -> bytes:
+    """Decode unpadded (or padded) base64url."""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _to_bytes(data: Data) -> bytes:
+    return data.encode() if isinstance(data, str) else data
+
+
+def _nonce(prefix: bytes, index: int) -> bytes:
+    if index >= MAX_CHUNKS:
+        raise ValueError("Envelope has too many chunks")
+    return prefix + index.to_bytes(4, "big")
+
+
+def _aad(header: str, index: int, last: bool) -> bytes:
+    return f"{header}.{index}.{int(last)}".encode()
+
+
+class EnvelopeSealer:
+    """Seals one message chunk by chunk; ``header`` is the envelope's first four parts."""
+
+    def __init__(self, public_key: rsa.RSAPublicKey, chunk_size: int = CHUNK_BYTES):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        key = AESGCM.generate_key(bit_length=KEY_BYTES * 8)
+        self._aead = AESGCM(key)
+        self._prefix = os.urandom(NONCE_PREFIX_BYTES)
+        self._index = 0
+        self.chunk_size = chunk_size
+        self.header = ".".join([
+            ENVELOPE_PREFIX,
+            b64url_encode(public_key.encrypt(key, OAEP)),
+            b64url_encode(self._prefix),
+            str(chunk_size),
+        ])
+
+    def seal(self, chunk: bytes, last: bool) -> str:
+        """Encrypt the next chunk (at most ``chunk_size`` bytes) and return its encoded part."""
+        index = self._index
+        self._index += 1
+        return b64url_encode(self._aead.encrypt(_nonce(self._prefix, index), chunk, _aad(self.header, index, last)))
+
+
+class EnvelopeOpener:
+    """Opens one message chunk by chunk, given the envelope's header."""
+
+    def __init__(self, private_key: rsa.RSAPrivateKey, header: str):
+        parts = header.split(".")
+        if len(parts) != 4 or parts[0] != ENVELOPE_PREFIX:
+            raise ValueError("Not a version 2 envelope")
+        try:
+            key = private_key.decrypt(b64url_decode(parts[1]), OAEP)
+        except ValueError:
+            raise ValueError("Envelope key could not be unwrapped")
+        self._aead = AESGCM(key)
+        self._prefix = b64url_decode(parts[2])
+        if len(key) != KEY_BYTES or len(self._prefix) != NONCE_PREFIX_BYTES:
+            raise ValueError("Malformed envelope header")
+        self._index = 0
+        self.header = header
+        self.chunk_size = int(parts[3])
+
+    def open(self, part: str, last: bool) -> bytes:
+        """Decrypt and authenticate the next encoded chunk; raises ValueError if it was tampered with."""
+        index = self._index
+        self._index += 1
+        try:
+            return self._aead.decrypt(_nonce(self._prefix, index), b64url_decode(part), _aad(self.header, index, last))
+        except Exception:
+            raise ValueError(f"Envelope chunk {index} failed authentication")
+
+
+def seal(public_key: rsa.RSAPublicKey, plaintext: Data, chunk_size: int = CHUNK_BYTES) -> str:
+    """Encrypt a message into a version 2 envelope."""
+    return "".join(seal_stream(public_key, [_to_bytes(plaintext)], chunk_size))
+
+
+def seal_stream(public_key: rsa.RSAPublicKey, pieces: Iterable[bytes], chunk_size: int = CHUNK_BYTES) -> Iterator[str]:
+    """
+    Encrypt a stream of plaintext pieces of any size into a version 2 envelope.
+
+    Yields the envelope as consecutive text fragments (the header, then
+    ".<part>" per chunk) that concatenate to what ``seal`` returns. Only the
+    current piece and less than one chunk of leftover are held in memory.
+    """
+    sealer = EnvelopeSealer(public_key, chunk_size)
+    yield sealer.header
+
+    pending = bytearray()
+    for piece in pieces:
+        pending += piece
+        # A chunk is sealed as "not last" only while more plaintext is known to follow it
+        offset = 0
+        while len(pending) - offset > chunk_size:
+            yield "." + sealer.seal(bytes(pending[offset:offset + chunk_size]), last=False)
+            offset += chunk_size
+        del pending[:offset]
+    yield "." + sealer.seal(bytes(pending), last=True)
+
+
+def _envelope_parts(fragments: Iterable[Data]) -> Iterator[str]:
+    """Dot-separated parts of an envelope arriving in fragments, optionally inside a JSON string."""
+    buffer = ""
+    started = False
+    for fragment in fragments:
+        buffer += fragment.decode("latin-1") if isinstance(fragment, bytes) else fragment
+        if not started:
+            start = buffer.find(ENVELOPE_PREFIX + ".")
+            if start < 0:
+                # Keep enough to match a prefix split across fragments
+                buffer = buffer[-len(ENVELOPE_PREFIX):]
+                continue
+            buffer, started = buffer[start:], True
+        quote = buffer.find('"')
+        if quote >= 0:
+            yield from buffer[:quote].split(".")
+            return
+        *complete, buffer = buffer.split(".")
+        yield from complete
+    if started:
+        yield buffer
+
+
+def open_envelope(private_key: rsa.RSAPrivateKey, envelope: str) -> bytes:
+    """Decrypt a version 2 envelope; raises ValueError if it is malformed or was tampered with."""
+    return b"".join(open_stream(private_key, [envelope]))
+
+
+def open_stream(private_key: rsa.RSAPrivateKey, fragments: Iterable[Data]) -> Iterator[bytes]:
+    """
+    Decrypt a version 2 envelope arriving in fragments of any size.
+
+    Yields each chunk's plaintext once the chunk is authenticated, so a large
+    result can be processed while it downloads. The fragments may also be a
+    JSON body carrying the envelope as a string (as the enclave returns it):
+    anything before "v2." and from the closing quote on is ignored.
+    Raises ValueError if the envelope is malformed, was tampered with or is
+    cut short (the final chunk must be the one sealed as last).
+    """
+    parts = _envelope_parts(fragments)
+    header = [part for _, part in zip(range(4), parts)]
+    held = next(parts, None)
+    if len(header) < 4 or held is None:
+        raise ValueError("Envelope is truncated")
+    opener = EnvelopeOpener(private_key, ".".join(header))
+    for part in parts:
+        yield opener.open(held, last=False)
+        held = part
+    yield opener.open(held, last=True)
+
+
+def seal_v1(public_key: rsa.RSAPublicKey, plaintext: Data) -> str:
+    """Encrypt a message the version 1 way: one RSA-OAEP block, at most 190 bytes for RSA-2048."""
+    return b64url_encode(public_key.encrypt(_to_bytes(plaintext), OAEP))
+
+
+def open_v1(private_key: rsa.RSAPrivateKey, ciphertext: str) -> bytes:
+    """Decrypt a version 1 message."""
+    return private_key.decrypt(b64url_decode(ciphertext), OAEP)
+
+
+def sign(private_key: rsa.RSAPrivateKey, data: Union[Data, Iterable[bytes]]) -> str:
+    """Sign data (or a stream of byte chunks, hashed incrementally) the way the enclave verifies it."""
+    if isinstance(data, (bytes, str)):
+        return b64url_encode(private_key.sign(_to_bytes(data), padding.PKCS1v15(), hashes.SHA256()))
+    digest = hashlib.sha256()
+    for chunk in data:
+        digest.update(chunk)
+    prehashed = utils.Prehashed(hashes.SHA256())
+    return b64url_encode(private_key.sign(digest.digest(), padding.PKCS1v15(), prehashed))
+
+
+def verify(public_key: rsa.RSAPublicKey, signature: str, data: Data) -> bool:
+    """Check a signature made by ``sign``."""
+    try:
+        public_key.verify(b64url_decode(signature), _to_bytes(data), padding.PKCS1v15(), hashes.SHA256())
+    except Exception:
+        return False
+    return True
+
+
+def build_query(
+    enclave_public_key: rsa.RSAPublicKey,
+    user_private_key: rsa.RSAPrivateKey,
+    query: Data,
+    version: int = ENVELOPE_VERSION,
+) -> Dict[str, Any]:
+    """
+    Encrypt a query for the enclave and sign it with the user's key.
+
+    Returns the /process-query/ parameters: ``encrypted_query``,
+    ``signed_query`` and ``version``.
+    """
+    if version == 1:
+        encrypted = seal_v1(enclave_public_key, query)
+    elif version == ENVELOPE_VERSION:
+        encrypted = seal(enclave_public_key, query)
+    else:
+        raise ValueError(f"Unsupported envelope version: {version}")
+    return {"encrypted_query": encrypted, "signed_query": sign(user_private_key, encrypted), "version": version}
+
+
+def read_response(user_private_key: rsa.RSAPrivateKey, body: Union[Dict[str, Any], Data]) -> bytes:
+    """Decrypt an enclave /process-query response (the JSON body, parsed or raw) of either version."""
+    if not isinstance(body, dict):
+        body = json.loads(body)
+    encrypted = body["encrypted_response"]
+    if body.get("version", 1) == ENVELOPE_VERSION:
+        return open_envelope(user_private_key, encrypted)
+    return open_v1(user_private_key, encrypted)
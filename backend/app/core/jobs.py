@@ -0,0 +1,233 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class CommandError(Exception):
+    """Raised when an external command exits with a non-zero status."""
+
+    def __init__(self, args: List[str], returncode: int, output: str):
+        tail = output.strip()[-500:]
+        super().__init__(f"{' '.join(args)} exited with status {returncode}: {tail}")
+        self.returncode = returncode
+        self.output = output
+
+
+async def run_command(args: List[str], cwd: Optional[str] = None) -> str:
+    """Run a command without blocking the event loop and return its combined output."""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await process.communicate()
+    output = output.decode(errors="replace")
+    if process.returncode != 0:
+        raise CommandError(args, process.returncode, output)
+    return output
+
+
+class JobConflict(ValueError):
+    """Raised when a job is submitted for a key that already has an unfinished job."""
+
+    def __init__(self, key: str, job_id: str):
+        super().__init__(f"Job {job_id} is already in progress for {key}")
+        self.key = key
+        self.job_id = job_id
+
+
+class Stage:
+    """One step of a job and the outcome of its latest attempt."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "pending"
+        self.attempts = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the stage for status responses."""
+        return {
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_ms": (self.finished_at - self.started_at) * 1000 if self.started_at and self.finished_at else None,
+            "error": self.error,
+        }
+
+
+class Job:
+    """A queued unit of staged work with its own working directory."""
+
+    def __init__(self, job_id: str, params: Dict[str, Any], stage_names: List[str], workdir: str, key: Optional[str] = None):
+        self.id = job_id
+        self.key = key
+        self.params = params
+        self.stages = [Stage(name) for name in stage_names]
+        self.workdir = workdir
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Outputs stages want to report (artifact digests, cache outcomes, ...)
+        self.result: Dict[str, Any] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the job for status responses."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+
+# A stage receives its job and raises to signal failure
+StageFn = Callable[[Job], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    In-memory background job runner with bounded concurrency.
+
+    Each job runs its stages in order inside a private working directory
+    (an absolute path under ``workspace_root``); stages get it as ``job.workdir``
+    and must never change the process-wide cwd. Jobs submitted with the same
+    ``key`` (e.g. an enclave id) are mutually exclusive: while one is queued or
+    running, another is rejected with ``JobConflict``. A failed job stops at
+    the failing stage; ``retry`` resumes it from there without re-running
+    stages that already succeeded. A job's workspace is deleted once it
+    succeeds; a failed job keeps it for ``retry`` until the job is forgotten
+    (the oldest finished jobs beyond ``max_jobs_kept``). Job state lives in
+    this process only and is lost on restart.
+    """
+
+    def __init__(self, stages: List[Tuple[str, StageFn]], workspace_root: str, max_concurrency: int = 2, max_jobs_kept: int = 1000):
+        self.stages = stages
+        self.workspace_root = os.path.abspath(workspace_root)
+        self.max_concurrency = max_concurrency
+        self.max_jobs_kept = max_jobs_kept
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # key -> id of its queued or running job
+        self._active: Dict[str, str] = {}
+
+    def _claim(self, job: Job) -> None:
+        """Mark a job as the unfinished one for its key, or raise JobConflict."""
+        if job.key is None:
+            return
+        active = self._active.get(job.key)
+        if active is not None and active != job.id:
+            raise JobConflict(job.key, active)
+        self._active[job.key] = job.id
+
+    def _release(self, job: Job) -> None:
+        """Free a finished job's key."""
+        if job.key is not None and self._active.get(job.key) == job.id:
+            del self._active[job.key]
+
+    def submit(self, key: Optional[str] = None, **params: Any) -> Job:
+        """Queue a new job and return it immediately; raises JobConflict if ``key`` is busy."""
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, params, [name for name, _ in self.stages], os.path.join(self.workspace_root, job_id), key)
+        self._claim(job)
+        self._jobs[job.id] = job
+        self._forget_old_jobs()
+        self._schedule(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id, or None if it is unknown."""
+        return self._jobs.get(job_id)
+
+    def retry(self, job_id: str) -> Job:
+        """Re-queue a failed job from its first unfinished stage."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.status != "failed":
+            raise ValueError(f"Only failed jobs can be retried, job is {job.status}")
+        self._claim(job)
+        job.status = "queued"
+        job.finished_at = None
+        self._schedule(job)
+        return job
+
+    def _schedule(self, job: Job) -> None:
+        """Start the background task running a job."""
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    def _forget_old_jobs(self) -> None:
+        """Drop the oldest finished jobs once more than ``max_jobs_kept`` are tracked."""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs_kept:
+                break
+            job = self._jobs[job_id]
+            if job.status in ("succeeded", "failed"):
+                del self._jobs[job_id]
+                if job.status == "failed":
+                    # Kept until now for a retry; deleted off the event loop
+                    asyncio.get_running_loop().run_in_executor(None, shutil.rmtree, job.workdir, True)
+
+    async def _run(self, job: Job) -> None:
+        """Run a job's unfinished stages once a concurrency slot is free."""
+        try:
+            async with self._slots:
+                await self._run_stages(job)
+        finally:
+            self._release(job)
+
+    async def _run_stages(self, job: Job) -> None:
+        """Run a job's unfinished stages in order, stopping at the first failure."""
+        job.status = "running"
+        os.makedirs(job.workdir, exist_ok=True)
+        for (_, fn), stage in zip(self.stages, job.stages):
+            if stage.status == "succeeded":
+                continue
+            stage.status = "running"
+            stage.attempts += 1
+            stage.started_at = time.time()
+            stage.finished_at = None
+            stage.error = None
+            try:
+                await fn(job)
+            except Exception as e:
+                stage.status = "failed"
+                stage.error = str(e)
+                stage.finished_at = time.time()
+                job.status = "failed"
+                job.finished_at = stage.finished_at
+                return
+            stage.status = "succeeded"
+            stage.finished_at = time.time()
+        await asyncio.to_thread(shutil.rmtree, job.workdir, True)
+        job.status = "succeeded"
+        job.finished_at = time.time()
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs; they can be resubmitted after a restart."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return job counts by status."""
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_concurrency": self.max_concurrency, "active_keys": len(self._active), "jobs": counts}
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class RSAKeyPool:
+    """
+    Pool of pre-generated RSA private keys filled by a background thread.
+
+    RSA key generation is a slow prime search; keeping ``size`` keys ready
+    moves it off the provisioning path. When the pool drains to
+    ``refill_threshold`` the refill thread tops it back up to ``size``.
+    ``take`` never blocks on the refill thread: an empty pool generates a key
+    inline and counts a miss.
+    """
+
+    def __init__(self, size: int = 4, refill_threshold: int = 2, key_size: int = 2048, public_exponent: int = 65537):
+        self.size = size
+        self.refill_threshold = min(refill_threshold, size)
+        self.key_size = key_size
+        self.public_exponent = public_exponent
+        self._keys: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.refills = 0
+        self.generation_seconds = 0.0
+
+    def _generate(self) -> rsa.RSAPrivateKey:
+        """Generate one key and account for the time spent."""
+        started = time.perf_counter()
+        key = rsa.generate_private_key(public_exponent=self.public_exponent, key_size=self.key_size)
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self.generated += 1
+            self.generation_seconds += elapsed
+        return key
+
+    def start(self) -> None:
+        """Start the refill thread; a pool of size 0 is disabled."""
+        if self.size <= 0 or self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._refill_loop, name="rsa-key-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the refill thread after the key it is generating, if any."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refill_loop(self) -> None:
+        """Wait for the pool to drain to the threshold, then fill it back up."""
+        while True:
+            with self._cond:
+                while not self._stopping and (len(self._keys) > self.refill_threshold or len(self._keys) >= self.size):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                self.refills += 1
+            while True:
+                with self._cond:
+                    if self._stopping or len(self._keys) >= self.size:
+                        break
+                key = self._generate()
+                with self._cond:
+                    self._keys.append(key)
+
+    def take(self) -> rsa.RSAPrivateKey:
+        """Return a ready key, or generate one inline if the pool is empty."""
+        with self._cond:
+            if self._keys:
+                key = self._keys.popleft()
+                self.hits += 1
+                if len(self._keys) <= self.refill_threshold:
+                    self._cond.notify_all()
+                return key
+            self.misses += 1
+            self._cond.notify_all()
+        return self._generate()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool depth, hit/miss counts and key generation rate."""
+        with self._cond:
+            return {
+                "depth": len(self._keys),
+                "size": self.size,
+                "refill_threshold": self.refill_threshold,
+                "key_size": self.key_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refills": self.refills,
+                "generated": self.generated,
+                "refill_rate_keys_per_sec": self.generated / self.generation_seconds if self.generation_seconds else 0.0,
+                "avg_generation_ms": (self.generation_seconds / self.generated) * 1000 if self.generated else 0.0,
+            }
+
+
+# Process-wide pool of CA keys for /generate-ca
+rsa_key_pool = RSAKeyPool(
+    size=int(os.getenv("RSA_KEY_POOL_SIZE", "4")),
+    refill_threshold=int(os.getenv("RSA_KEY_POOL_REFILL_THRESHOLD", "2")),
+)
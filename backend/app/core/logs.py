@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import random
+import time
+from typing import Any
+
+
+class SampledLogger:
+    """
+    Structured (one JSON object per line) logger that emits a fraction of events.
+
+    Hot paths guard each call with ``sampled()``, so with ``sample_rate`` 0 the
+    cost is one attribute check and no log record or payload is ever built::
+
+        if request_log.sampled():
+            request_log.event("sign_csr", enclaveid=request.enclaveid)
+
+    Only pass identifiers and sizes as fields, never request bodies, keys,
+    tokens or passwords.
+    """
+
+    def __init__(self, name: str, sample_rate: float = 0.0, level: int = logging.INFO):
+        self.logger = logging.getLogger(name)
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.level = level
+
+    def sampled(self) -> bool:
+        """Decide whether the next event should be logged."""
+        rate = self.sample_rate
+        return rate > 0.0 and (rate >= 1.0 or random.random() < rate)
+
+    def event(self, event: str, **fields: Any) -> None:
+        """Emit ``event`` with ``fields`` as a JSON line."""
+        payload = {"ts": round(time.time(), 3), "event": event, "sample_rate": self.sample_rate, **fields}
+        self.logger.log(self.level, json.dumps(payload, default=str))
+
+
+def sampled_logger(name: str) -> SampledLogger:
+    """
+    Build a logger sampled at ``LOG_SAMPLE_RATE`` (0 disables it, 1 logs every event).
+
+    A per-logger override can be given as ``LOG_SAMPLE_RATE_<NAME>``, e.g.
+    ``LOG_SAMPLE_RATE_AUTH=1``.
+    """
+    default = os.getenv("LOG_SAMPLE_RATE", "0")
+    rate = float(os.getenv(f"LOG_SAMPLE_RATE_{name.upper().replace('.', '_')}", default))
+    logger = SampledLogger(name, rate)
+
+    # Events are already JSON; write them as-is to stderr unless the app configured logging itself
+    if not logger.logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.logger.addHandler(handler)
+        logger.logger.setLevel(logger.level)
+        logger.logger.propagate = False
+    return logger
@@ -0,0 +1,288 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow enclave calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render ``{name="value",...}``, or an empty string when there are no labels."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Shared bookkeeping for a labelled metric family."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        """Turn keyword labels into a tuple ordered like ``labelnames``."""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels: str) -> None:
+        """Drop every series whose labels include these, e.g. all series of an enclave that is no longer tracked."""
+        match = [(self.labelnames.index(name), str(value)) for name, value in labels.items()]
+        with self._lock:
+            for key in [key for key in self._values if all(key[i] == value for i, value in match)]:
+                del self._values[key]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the family in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add ``amount`` to the counter for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for these labels."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down per label set, such as requests in flight."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Raise the gauge for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Lower the gauge for these labels."""
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        """Current value for these labels."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation for these labels."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels: str) -> int:
+        """Number of observations recorded for these labels."""
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together on ``/metrics``."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create, or return the already registered, counter ``name``."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Create, or return the already registered, gauge ``name``."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create, or return the already registered, histogram ``name``."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render every registered family in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# Process-wide registry exposed on /metrics
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests handled, by route template and status code.", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled.")
+stage_duration = registry.histogram(
+    "stage_duration_seconds", "Time spent in a named stage inside a request handler.", ("stage",))
+stages_in_flight = registry.gauge(
+    "stages_in_flight", "Handler stages currently running.", ("stage",))
+errors = registry.counter(
+    "errors_total", "Errors by cause, from handler failures and unhandled exceptions.", ("cause",))
+
+# Set METRICS_ENABLED=0 to skip per-request instrumentation entirely
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as handler stage ``name`` and count it in flight while it runs."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    stages_in_flight.inc(stage=name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - started, stage=name)
+        stages_in_flight.dec(stage=name)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere, e.g. inside a worker process."""
+    if METRICS_ENABLED:
+        stage_duration.observe(seconds, stage=name)
+
+
+def record_error(cause: str) -> None:
+    """Count one error attributed to ``cause``."""
+    if METRICS_ENABLED:
+        errors.inc(cause=cause)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, status counts and in-flight requests.
+
+    Requests are labelled with the matched route template (``/provisioning-jobs/{job_id}``)
+    rather than the raw path so label cardinality stays bounded; unmatched paths share
+    the ``<unmatched>`` label.
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status: Optional[int] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            status = 500
+            record_error(type(e).__name__)
+            raise
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", "<unmatched>")
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - started, method=method, route=template)
+            http_requests.inc(method=method, route=template, status=str(status or 500))
+
+
+def metrics_response() -> Response:
+    """Render the registry as a ``/metrics`` response."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 class UserCreate(BaseModel):
@@ -20,6 +21,13 @@ class UserResponse(BaseModel):
     id: str
     email: EmailStr
 
+class AuthenticatedUser(BaseModel):
+    """User a validated access token belongs to."""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    expires_at: int
+
 class ResendConfirmation(BaseModel):
     """Schema for resending confirmation email."""
     email: EmailStr
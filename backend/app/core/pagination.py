@@ -0,0 +1,44 @@
+import base64
+import json
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the last returned row id as an opaque keyset cursor."""
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decode a cursor produced by ``encode_cursor``; raise 400 if it is malformed or its id is not an integer."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Parse a comma separated field projection; None means every field."""
+    if not fields:
+        return None
+    allowed = list(allowed)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return requested
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with ``prefix``, for index range scans."""
+    return prefix + "\U0010ffff"
@@ -0,0 +1,57 @@
+from typing import AsyncIterator, Callable, Mapping, Optional
+
+import httpx
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .metrics import record_error
+
+# Upstream headers passed through unchanged; the body is relayed as raw bytes,
+# so its encoding and length are still exactly what the enclave sent
+RELAYED_HEADERS = ("content-type", "content-encoding", "content-length")
+
+
+class RelayResponse(StreamingResponse):
+    """
+    Relays an open, streamed upstream response to the client chunk by chunk.
+
+    The body is never decoded or buffered: each chunk read from the enclave is
+    sent on before the next one is read, so memory stays flat whatever the
+    size of the result. Backpressure follows from that: while the client is
+    slow to read, the server's ``send`` blocks, no more is read upstream and
+    TCP flow control holds the enclave back. When the client disconnects the
+    stream is cancelled and the upstream response is closed, which drops the
+    connection to the enclave instead of draining the rest of the body.
+
+    ``release`` is called once the body has been relayed or the client went
+    away, e.g. to give back an admission slot held for the whole relay.
+    """
+
+    def __init__(
+        self,
+        upstream: httpx.Response,
+        headers: Optional[Mapping[str, str]] = None,
+        release: Optional[Callable[[], None]] = None,
+    ):
+        self.upstream = upstream
+        self.release = release
+        self.completed = False
+        headers = {**(headers or {}), **{name: upstream.headers[name] for name in RELAYED_HEADERS if name in upstream.headers}}
+        super().__init__(self._relay(), status_code=upstream.status_code, headers=headers)
+
+    async def _relay(self) -> AsyncIterator[bytes]:
+        async for chunk in self.upstream.aiter_raw():
+            yield chunk
+        self.completed = True
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if not self.completed:
+                record_error("client_disconnect")
+            try:
+                await self.upstream.aclose()
+            finally:
+                if self.release is not None:
+                    self.release()
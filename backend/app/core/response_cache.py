@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+class CachedResponse:
+    """A rendered response body with its strong ETag and pre-compressed variants."""
+
+    def __init__(self, body: bytes, media_type: str, headers: Dict[str, str], compress: bool):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.created_at = time.monotonic()
+        self.encoded: Dict[str, bytes] = {}
+        if compress and len(body) >= MIN_COMPRESS_SIZE:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag, as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Content codings the client accepts, ignoring those with q=0."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class VersionedResponseCache:
+    """
+    LRU cache of rendered responses tagged with a data version.
+
+    Writers call ``invalidate`` to bump the version, which makes every cached
+    entry stale at once. The version is process-local, so ``ttl_seconds``
+    bounds how long a worker can serve a listing changed by another worker.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 30.0, compress: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.compress = compress
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Return the cached response for ``key`` at the current version, if still fresh."""
+        with self._lock:
+            entry = self._entries.get((self.version, key))
+            if entry is not None and time.monotonic() - entry.created_at < self.ttl_seconds:
+                self._entries.move_to_end((self.version, key))
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, body: bytes, media_type: str = "application/json", headers: Optional[Dict[str, str]] = None, version: Optional[int] = None) -> CachedResponse:
+        """
+        Cache a rendered body for ``key``.
+
+        ``version`` should be the value of ``self.version`` read before the data
+        was fetched, so a write racing with the fetch is not cached as current.
+        """
+        entry = CachedResponse(body, media_type, headers or {}, self.compress)
+        with self._lock:
+            if version is None or version == self.version:
+                self._entries[(self.version, key)] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        """Bump the data version, dropping every cached response."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        """Build a 304 or a (possibly pre-compressed) 200 for a cached entry."""
+        headers = {**entry.headers, "ETag": entry.etag, "Vary": "Accept-Encoding"}
+
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self.not_modified += 1
+                self.bytes_saved += len(entry.body)
+            return Response(status_code=304, headers=headers)
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+        for coding in ("br", "gzip"):
+            if coding in accepted and coding in entry.encoded:
+                encoded = entry.encoded[coding]
+                with self._lock:
+                    self.bytes_saved += len(entry.body) - len(encoded)
+                headers["Content-Encoding"] = coding
+                return Response(content=encoded, media_type=entry.media_type, headers=headers)
+
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate, 304 count and bytes saved by conditional and compressed responses."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "bytes_saved": self.bytes_saved,
+                "brotli": brotli is not None,
+            }
+
+
+def marketplace_cache_from_env() -> VersionedResponseCache:
+    """Create a marketplace listing cache configured from MARKETPLACE_CACHE_* variables."""
+    return VersionedResponseCache(
+        max_entries=int(os.getenv("MARKETPLACE_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("MARKETPLACE_CACHE_TTL_SECONDS", "30")),
+        compress=os.getenv("MARKETPLACE_CACHE_COMPRESS", "1") == "1",
+    )
@@ -0,0 +1,247 @@
+import os
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from cryptography import x509
+
+from .bloom import BloomFilter
+from .certificates import signature_hash
+from .storage import IssuedCertificate, Repository, get_repository
+
+# Refreshes re-read this far behind the previous one, so rows committed late by
+# another process (slow transaction, clock skew) are still picked up
+REFRESH_OVERLAP_SECONDS = 10.0
+
+
+def parse_serial(value: str) -> str:
+    """Normalize a hex serial ("1A:2B", "0x1a2b", ...) to the registry's lower-case form."""
+    cleaned = value.strip().lower().replace(":", "")
+    if cleaned.startswith("0x"):
+        cleaned = cleaned[2:]
+    if not cleaned or any(char not in string.hexdigits for char in cleaned):
+        raise ValueError(f"Invalid certificate serial: {value!r}")
+    return format(int(cleaned, 16), "x")
+
+
+def issued_certificate(enclave_id: str, cert: x509.Certificate) -> IssuedCertificate:
+    """Registry record of a certificate issued by an enclave CA."""
+    return IssuedCertificate(
+        serial=format(cert.serial_number, "x"),
+        enclave_id=enclave_id,
+        subject=cert.subject.rfc4514_string(),
+        not_before=cert.not_valid_before_utc.timestamp(),
+        not_after=cert.not_valid_after_utc.timestamp(),
+    )
+
+
+class CertificateStatus(NamedTuple):
+    """OCSP-style status of a serial: good, revoked or unknown."""
+    status: str
+    revoked_at: Optional[float] = None
+    reason: Optional[str] = None
+
+
+def revoked_entry(certificate: IssuedCertificate) -> x509.RevokedCertificate:
+    """CRL entry for a revoked certificate, with its reason code if one was given."""
+    builder = (
+        x509.RevokedCertificateBuilder()
+        .serial_number(int(certificate.serial, 16))
+        .revocation_date(datetime.fromtimestamp(certificate.revoked_at, timezone.utc))
+    )
+    reason = certificate.revocation_reason
+    if reason and reason != x509.ReasonFlags.unspecified.value:
+        builder = builder.add_extension(x509.CRLReason(x509.ReasonFlags(reason)), critical=False)
+    return builder.build()
+
+
+class RevocationRegistry:
+    """
+    In-memory view of the issued-certificate registry for status checks and CRLs.
+
+    Revoked serials are held exactly in a dict; issued serials in a Bloom
+    filter, so a status check is a dict lookup plus a few bit tests and never
+    touches the database. A serial the filter has not seen is reported
+    ``unknown``; one it (probably) has is ``good`` unless revoked.
+
+    Writes go through the repository first. A background thread pulls rows
+    written by other processes every ``refresh_interval`` seconds, so their
+    issuances and revocations show up here after at most that long.
+
+    CRLs are built per enclave from CRL entries kept since each revocation was
+    first seen, and cached until the enclave gets a new revocation, its CA
+    certificate changes, or half of ``crl_validity`` has passed. Entries of
+    certificates that have expired are left out.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        bloom_capacity: int = 1_000_000,
+        bloom_error_rate: float = 0.001,
+        crl_validity: timedelta = timedelta(hours=24),
+        refresh_interval: float = 5.0,
+    ):
+        self.repository = repository
+        self.crl_validity = crl_validity
+        self.refresh_interval = refresh_interval
+        self._issued = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._revoked: Dict[str, IssuedCertificate] = {}
+        # enclave id -> serial -> (not_after, CRL entry)
+        self._crl_entries: Dict[str, Dict[str, Tuple[float, x509.RevokedCertificate]]] = {}
+        # enclave id -> (entry count, CA serial, regenerate at, CRL)
+        self._crls: Dict[str, Tuple[int, int, float, x509.CertificateRevocationList]] = {}
+        self._issued_watermark: Optional[float] = None
+        self._revoked_watermark: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.status_checks = 0
+        self.crl_hits = 0
+        self.crl_builds = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _add_revoked(self, certificates: Sequence[IssuedCertificate]) -> None:
+        """Index newly seen revocations; the caller holds the lock."""
+        for certificate in certificates:
+            if certificate.serial in self._revoked:
+                continue
+            self._revoked[certificate.serial] = certificate
+            entries = self._crl_entries.setdefault(certificate.enclave_id, {})
+            entries[certificate.serial] = (certificate.not_after, revoked_entry(certificate))
+
+    def refresh(self) -> None:
+        """Pull issuances and revocations recorded since the last refresh (everything on the first call)."""
+        with self._refresh_lock:
+            started = time.time()
+            issued_after = None if self._issued_watermark is None else self._issued_watermark - REFRESH_OVERLAP_SECONDS
+            revoked_after = None if self._revoked_watermark is None else self._revoked_watermark - REFRESH_OVERLAP_SECONDS
+
+            for serials in self.repository.iter_certificate_serials(issued_after):
+                for serial in serials:
+                    self._issued.add(serial.encode())
+            revoked = self.repository.list_revoked_certificates(revoked_after=revoked_after)
+            with self._lock:
+                self._add_revoked(revoked)
+                self._issued_watermark = self._revoked_watermark = started
+                self.refreshes += 1
+
+    def load(self) -> None:
+        """Load the whole registry; called once at startup."""
+        self.refresh()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                self.refresh_failures += 1
+
+    def start(self) -> None:
+        """Start the background refresh thread."""
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="revocation-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def record_issued(self, certificates: Sequence[IssuedCertificate]) -> None:
+        """Store newly issued certificates and make them visible to status checks."""
+        if not certificates:
+            return
+        self.repository.record_certificates(certificates)
+        for certificate in certificates:
+            self._issued.add(certificate.serial.encode())
+
+    def revoke(self, serials: Sequence[str], reason: Optional[str] = None) -> List[IssuedCertificate]:
+        """Revoke certificates; returns the ones this call revoked (unknown or already revoked serials are skipped)."""
+        revoked = self.repository.revoke_certificates(serials, reason)
+        with self._lock:
+            self._add_revoked(revoked)
+        return revoked
+
+    def status(self, serial: str) -> CertificateStatus:
+        """Status of a normalized serial (see ``parse_serial``), answered from memory."""
+        self.status_checks += 1
+        revoked = self._revoked.get(serial)
+        if revoked is not None:
+            return CertificateStatus("revoked", revoked.revoked_at, revoked.revocation_reason)
+        if serial.encode() in self._issued:
+            return CertificateStatus("good")
+        return CertificateStatus("unknown")
+
+    def crl(self, enclave_id: str, ca_private_key: Any, ca_cert: x509.Certificate) -> x509.CertificateRevocationList:
+        """Current CRL of an enclave CA, rebuilt and re-signed only when it changed or is getting old."""
+        now = time.time()
+        with self._lock:
+            entries = list(self._crl_entries.get(enclave_id, {}).values())
+            cached = self._crls.get(enclave_id)
+            if cached is not None:
+                count, ca_serial, regenerate_at, crl = cached
+                if count == len(entries) and ca_serial == ca_cert.serial_number and now < regenerate_at:
+                    self.crl_hits += 1
+                    return crl
+
+        issued_at = datetime.fromtimestamp(now, timezone.utc)
+        builder = (
+            x509.CertificateRevocationListBuilder()
+            .issuer_name(ca_cert.subject)
+            .last_update(issued_at)
+            .next_update(issued_at + self.crl_validity)
+            # Millisecond timestamps keep CRL numbers increasing across processes and restarts
+            .add_extension(x509.CRLNumber(int(now * 1000)), critical=False)
+            .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_cert.public_key()), critical=False)
+        )
+        for not_after, entry in entries:
+            if not_after > now:
+                builder = builder.add_revoked_certificate(entry)
+        crl = builder.sign(ca_private_key, signature_hash(ca_private_key))
+
+        with self._lock:
+            regenerate_at = now + self.crl_validity.total_seconds() / 2
+            self._crls[enclave_id] = (len(entries), ca_cert.serial_number, regenerate_at, crl)
+            self.crl_builds += 1
+        return crl
+
+    def stats(self) -> Dict[str, Any]:
+        """Return registry sizes, Bloom filter fill and CRL cache counters."""
+        with self._lock:
+            return {
+                "revoked": len(self._revoked),
+                "issued_filter": self._issued.stats(),
+                "cached_crls": len(self._crls),
+                "status_checks": self.status_checks,
+                "crl_hits": self.crl_hits,
+                "crl_builds": self.crl_builds,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+            }
+
+
+@lru_cache()
+def get_revocation_registry() -> RevocationRegistry:
+    """
+    Process-wide registry over ``get_repository()``.
+
+    Configured by REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE,
+    CRL_VALIDITY_HOURS and REVOCATION_REFRESH_SECONDS (0 disables the refresh thread).
+    """
+    return RevocationRegistry(
+        get_repository(),
+        bloom_capacity=int(os.getenv("REVOCATION_BLOOM_CAPACITY", "1000000")),
+        bloom_error_rate=float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001")),
+        crl_validity=timedelta(hours=float(os.getenv("CRL_VALIDITY_HOURS", "24"))),
+        refresh_interval=float(os.getenv("REVOCATION_REFRESH_SECONDS", "5")),
+    )
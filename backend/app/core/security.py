@@ -0,0 +1,63 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt
+
+from .config import settings
+from .db import get_supabase
+from .models import AuthenticatedUser
+from .tokens import InvalidToken, JWKSCache, TokenCache, TokenValidator, TokenVerifier, http_jwks_fetcher
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+
+
+def get_user_from_supabase(token: str) -> Optional[AuthenticatedUser]:
+    """
+    Validate a token with a Supabase round trip; used only for tokens that
+    cannot be verified locally.
+    """
+    try:
+        response = get_supabase().auth.get_user(token)
+    except Exception:
+        return None
+    if not response or not response.user:
+        return None
+    claims = jwt.get_unverified_claims(token)
+    return AuthenticatedUser(
+        id=response.user.id,
+        email=response.user.email,
+        role=response.user.role,
+        expires_at=int(claims["exp"]),
+    )
+
+
+token_validator = TokenValidator(
+    TokenVerifier(
+        secret=settings.SUPABASE_JWT_SECRET,
+        jwks=JWKSCache(
+            http_jwks_fetcher(f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"),
+            ttl_seconds=settings.JWKS_CACHE_TTL_SECONDS,
+        ),
+        audience=settings.SUPABASE_JWT_AUDIENCE,
+    ),
+    TokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES, ttl_seconds=settings.TOKEN_CACHE_TTL_SECONDS),
+    remote=get_user_from_supabase,
+)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthenticatedUser:
+    """
+    FastAPI dependency resolving the bearer token to its user.
+
+    Cached tokens are answered without leaving the event loop; others are
+    verified locally (or, failing that, by Supabase) in a worker thread.
+    """
+    try:
+        return await token_validator.validate_async(token)
+    except InvalidToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
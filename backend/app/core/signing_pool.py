@@ -0,0 +1,166 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class PoolSaturated(Exception):
+    """Raised when the signing pool's queue is full and new work must be rejected."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Signing pool is saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+    """Run ``fn`` in a worker and report wall-clock start and end times alongside its result."""
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at, time.time()
+
+
+def _timed_call_isolated(fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+    """
+    Process-pool variant of ``_timed_call``.
+
+    Exceptions such as ``HTTPException`` do not survive a pickle round trip, so
+    they are re-raised as ``RuntimeError`` carrying the same message.
+    """
+    try:
+        return _timed_call(fn, args)
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
+
+
+class _Timer:
+    """Running count/total/max of a duration in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one duration."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the aggregate in milliseconds."""
+        return {
+            "count": self.count,
+            "avg_ms": (self.total / self.count) * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class SigningPool:
+    """
+    Bounded thread or process pool for CPU-bound signing work.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+    wait; anything beyond that is rejected with ``PoolSaturated`` so callers
+    can answer 503 instead of piling work onto the event loop.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue: int = 64, retry_after: int = 1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown signing pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait = _Timer()
+        self.sign_time = _Timer()
+
+    def start(self) -> None:
+        """Create the underlying executor if it is not running yet."""
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="signing")
+
+    def shutdown(self) -> None:
+        """Stop the executor, waiting for running jobs to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, float]]:
+        """
+        Run ``fn(*args)`` on the pool and return ``(result, timings)``.
+
+        ``timings`` holds the job's queue wait and execution time in
+        milliseconds. Raises ``PoolSaturated`` when the queue is full.
+        """
+        self.start()
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(self.retry_after)
+            self._pending += 1
+            self.submitted += 1
+
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            call = _timed_call_isolated if self.kind == "process" else _timed_call
+            result, started_at, finished_at = await loop.run_in_executor(self._executor, call, fn, args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        wait = max(started_at - submitted_at, 0.0)
+        duration = finished_at - started_at
+        with self._lock:
+            self.completed += 1
+            self.queue_wait.observe(wait)
+            self.sign_time.observe(duration)
+        return result, {"queue_wait_ms": wait * 1000, "sign_ms": duration * 1000}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool configuration, occupancy and timing aggregates."""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_wait": self.queue_wait.as_dict(),
+                "sign_time": self.sign_time.as_dict(),
+            }
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format pool timings as a ``Server-Timing`` header value."""
+    return ", ".join(f"{name.replace('_ms', '')};dur={value:.2f}" for name, value in timings.items())
+
+
+# Process-wide pool used by the CSR signing endpoints
+signing_pool = SigningPool(
+    kind=os.getenv("SIGNING_POOL_KIND", "thread"),
+    max_workers=int(os.getenv("SIGNING_POOL_WORKERS", str(os.cpu_count() or 4))),
+    max_queue=int(os.getenv("SIGNING_POOL_QUEUE", "64")),
+    retry_after=int(os.getenv("SIGNING_POOL_RETRY_AFTER", "1")),
+)
@@ -0,0 +1,129 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """
+    Raised when no pooled connection became free within ``acquire_timeout``.
+
+    The Postgres repository raises it too. It is a ``sqlite3.OperationalError``
+    so database error handlers catch it, but it means the database is busy
+    rather than broken: answer 503 with ``Retry-After`` instead of 500.
+    """
+
+    def __init__(self, timeout: float, retry_after: int = 1):
+        super().__init__(f"No database connection became free within {timeout:g}s")
+        self.retry_after = retry_after
+
+
+class SQLitePool:
+    """
+    Fixed-size pool of long-lived SQLite connections in WAL mode.
+
+    WAL journaling lets readers proceed while a writer holds the database, and
+    keeping connections open means each one's prepared-statement cache
+    (``cached_statements``) is reused across requests instead of being thrown
+    away with the connection.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int = 8,
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 16384,
+        busy_timeout_ms: int = 5000,
+        cached_statements: int = 256,
+        acquire_timeout: float = 30.0,
+    ):
+        self.path = os.path.abspath(path)
+        self.size = size
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.acquire_timeout = acquire_timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the journaling and cache pragmas."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kib}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while the pool is below its size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+            self.waits += 1
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(self.acquire_timeout) from None
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool in a clean state."""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection for the duration of the ``with`` block."""
+        conn = self._acquire()
+        with self._lock:
+            self.acquired += 1
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self) -> None:
+        """Close every connection owned by the pool."""
+        with self._lock:
+            connections, self._all = self._all, []
+            self._idle = queue.LifoQueue()
+        for conn in connections:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool occupancy and usage counters."""
+        with self._lock:
+            return {
+                "path": self.path,
+                "size": self.size,
+                "open": len(self._all),
+                "idle": self._idle.qsize(),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+            }
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+from functools import lru_cache
+
+from ..sqlite_pool import SQLitePool
+from .base import (
+    DATASET_COLUMNS, AccessDecision, AccessRequest, AccessStatus, CARecord, Dataset, IssuedCertificate, Repository,
+)
+from .memory import InMemoryRepository
+from .postgres import PostgresRepository, psycopg2
+from .sqlite import SQLiteRepository
+
+__all__ = [
+    "DATABASE_ERRORS",
+    "DATASET_COLUMNS",
+    "AccessDecision",
+    "AccessRequest",
+    "AccessStatus",
+    "CARecord",
+    "Dataset",
+    "IssuedCertificate",
+    "Repository",
+    "InMemoryRepository",
+    "PostgresRepository",
+    "SQLiteRepository",
+    "create_repository",
+    "get_repository",
+]
+
+# Driver exceptions any backend may raise, for handlers reporting database errors
+DATABASE_ERRORS = (sqlite3.Error,) + ((psycopg2.Error,) if psycopg2 is not None else ())
+
+
+def create_repository(backend: str) -> Repository:
+    """
+    Build the repository for ``backend`` (sqlite, postgres or memory) from environment settings.
+
+    sqlite:   DB_PATH, DB_POOL_SIZE, DB_SYNCHRONOUS, DB_CACHE_SIZE_KIB
+    postgres: DATABASE_URL, PG_POOL_MIN, PG_POOL_MAX, PG_PREPARED_STATEMENTS
+    """
+    if backend == "sqlite":
+        return SQLiteRepository(SQLitePool(
+            os.getenv("DB_PATH", "Backend/enclave_mapping.db"),
+            size=int(os.getenv("DB_POOL_SIZE", "8")),
+            synchronous=os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+            cache_size_kib=int(os.getenv("DB_CACHE_SIZE_KIB", "16384")),
+        ))
+    if backend == "postgres":
+        dsn = os.getenv("DATABASE_URL")
+        if not dsn:
+            raise RuntimeError("STORAGE_BACKEND=postgres requires DATABASE_URL")
+        return PostgresRepository(
+            dsn,
+            min_connections=int(os.getenv("PG_POOL_MIN", "1")),
+            max_connections=int(os.getenv("PG_POOL_MAX", "10")),
+            max_prepared_per_connection=int(os.getenv("PG_PREPARED_STATEMENTS", "256")),
+        )
+    if backend == "memory":
+        return InMemoryRepository()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+@lru_cache()
+def get_repository() -> Repository:
+    """Process-wide repository selected by STORAGE_BACKEND (default: sqlite)."""
+    return create_repository(os.getenv("STORAGE_BACKEND", "sqlite"))
@@ -0,0 +1,379 @@
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..pagination import prefix_upper_bound
+
+# Dataset fields in storage order; ``id`` is assigned by the backend
+DATASET_COLUMNS = [
+    "id",
+    "enclave_id",
+    "dataset_name",
+    "description",
+    "organization_name",
+    "sample_queries",
+    "rules",
+    "isPublic",
+    "whitelistEmails",
+]
+
+# List fields, stored one row per element in child tables of dataset_details:
+# sample_queries in dataset_sample_queries, whitelistEmails in dataset_whitelist
+LIST_COLUMNS = ("sample_queries", "whitelistEmails")
+
+# Fields stored as dataset_details columns
+SCALAR_COLUMNS = [column for column in DATASET_COLUMNS if column not in LIST_COLUMNS]
+
+# A dataset row: DATASET_COLUMNS keys with list fields as lists and isPublic as a bool
+Dataset = Dict[str, Any]
+
+# Per list column, dataset id -> elements in order
+ChildLists = Dict[str, Dict[int, List[str]]]
+
+# access_requests columns in storage order
+ACCESS_REQUEST_COLUMNS = ["id", "enclave_id", "email", "status", "request_count", "created_at", "updated_at"]
+
+# An access request row; created_at/updated_at are Unix timestamps
+AccessRequest = Dict[str, Any]
+
+
+class IssuedCertificate(NamedTuple):
+    """
+    A user certificate issued by an enclave CA.
+
+    ``serial`` is the lower-case hex serial number (159-bit serials do not fit
+    an SQL integer); times are Unix timestamps.
+    """
+    serial: str
+    enclave_id: str
+    subject: str
+    not_before: float
+    not_after: float
+    revoked_at: Optional[float] = None
+    revocation_reason: Optional[str] = None
+
+
+# issued_certificates columns in storage order
+CERTIFICATE_COLUMNS = list(IssuedCertificate._fields)
+
+
+class AccessStatus(str, Enum):
+    """Lifecycle of an access request: pending until a data owner approves or denies it."""
+    PENDING = "pending"
+    APPROVED = "approved"
+    DENIED = "denied"
+
+
+class AccessDecision(NamedTuple):
+    """Outcome of a bulk decision: ids updated per status, and ids not found in the enclave."""
+    approved: List[int]
+    denied: List[int]
+    not_found: List[int]
+
+
+class CARecord(NamedTuple):
+    """Where an enclave's CA key and certificate live, and the key's algorithm."""
+    private_key_path: str
+    certificate_path: str
+    key_algorithm: str
+
+
+def select_columns(columns: Optional[Sequence[str]]) -> List[str]:
+    """Columns to read for a projection; ``id`` is always included for keyset paging."""
+    if columns is None:
+        return list(DATASET_COLUMNS)
+    unknown = [column for column in columns if column not in DATASET_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown dataset columns: {', '.join(unknown)}")
+    return ["id"] + [column for column in columns if column != "id"]
+
+
+def split_columns(columns: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """Split selected fields into dataset_details columns and child-table list fields."""
+    return (
+        [column for column in columns if column not in LIST_COLUMNS],
+        [column for column in columns if column in LIST_COLUMNS],
+    )
+
+
+def normalize_email(email: str) -> str:
+    """Whitelist entries and access checks compare emails trimmed and lower-cased."""
+    return email.strip().lower()
+
+
+def encode_dataset(dataset: Dataset) -> tuple:
+    """Values of a new dataset's dataset_details columns in SCALAR_COLUMNS order (without id)."""
+    return tuple(dataset[column] for column in SCALAR_COLUMNS[1:])
+
+
+def dataset_children(dataset_id: int, dataset: Dataset) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Child rows of a new dataset.
+
+    Returns ``(dataset_id, position, query)`` rows for dataset_sample_queries and
+    ``(dataset_id, enclave_id, email)`` rows for dataset_whitelist, with
+    duplicate emails dropped.
+    """
+    queries = [(dataset_id, position, query) for position, query in enumerate(dataset["sample_queries"])]
+    emails = dict.fromkeys(normalize_email(email) for email in dataset["whitelistEmails"])
+    whitelist = [(dataset_id, dataset["enclave_id"], email) for email in emails]
+    return queries, whitelist
+
+
+def decode_dataset(columns: Sequence[str], values: Sequence[Any], children: Optional[ChildLists] = None) -> Dataset:
+    """Build a dataset row from SQL values and the list fields read from the child tables."""
+    row = dict(zip(columns, values))
+    if "isPublic" in row:
+        row["isPublic"] = bool(row["isPublic"])
+    for column, lists in (children or {}).items():
+        row[column] = lists.get(row["id"], [])
+    return row
+
+
+def group_children(rows: Sequence[Tuple[int, str]]) -> Dict[int, List[str]]:
+    """Group ``(dataset_id, value)`` rows, already in element order, into lists per dataset."""
+    grouped: Dict[int, List[str]] = {}
+    for dataset_id, value in rows:
+        grouped.setdefault(dataset_id, []).append(value)
+    return grouped
+
+
+class Repository(ABC):
+    """
+    Storage interface for enclave CA mappings and marketplace datasets.
+
+    Implementations are synchronous and thread-safe; async handlers call them
+    through ``asyncio.to_thread``. Dataset listings are keyset-paginated by
+    ``id`` and filtered by organization, visibility and name prefix.
+    """
+
+    backend = ""
+
+    @abstractmethod
+    def init_schema(self) -> None:
+        """Create tables and indexes if they do not exist."""
+
+    @abstractmethod
+    def get_ca_record(self, enclave_id: str) -> Optional[CARecord]:
+        """Return the CA mapping of an enclave, or None if it has none."""
+
+    @abstractmethod
+    def upsert_ca_record(self, enclave_id: str, record: CARecord) -> None:
+        """Create or replace the CA mapping of an enclave."""
+
+    @abstractmethod
+    def insert_datasets(self, datasets: Sequence[Dataset]) -> int:
+        """Insert datasets in one batch and transaction; returns the number inserted."""
+
+    def insert_dataset(self, dataset: Dataset) -> None:
+        """Insert a single dataset."""
+        self.insert_datasets([dataset])
+
+    @abstractmethod
+    def list_datasets(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        organization: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dataset]:
+        """Return datasets with ``id > after_id`` matching the filters, ordered by id."""
+
+    def iter_datasets(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        organization: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        batch_size: int = 500,
+    ) -> Iterator[List[Dataset]]:
+        """
+        Yield matching datasets in batches of ``batch_size`` while they are read.
+
+        Each batch is its own keyset-paged ``list_datasets`` call, so no
+        connection or cursor is held between batches: a client reading a
+        long stream slowly does not pin a pooled connection.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            rows = self.list_datasets(after_id, size, organization, is_public, name_prefix, columns)
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1]["id"]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                return
+
+    @abstractmethod
+    def can_access(self, dataset_id: int, email: str) -> Optional[bool]:
+        """
+        Whether ``email`` may use a dataset: it is public or the email is whitelisted.
+
+        Answered from the primary key and whitelist index without reading any
+        list fields; returns None if the dataset does not exist.
+        """
+
+    @abstractmethod
+    def can_access_enclave(self, enclave_id: str, email: str) -> bool:
+        """Whether ``email`` may use at least one dataset of an enclave."""
+
+    @abstractmethod
+    def add_access_request(self, enclave_id: str, email: str) -> AccessRequest:
+        """
+        Record that ``email`` asks for access to an enclave's datasets.
+
+        Requests are unique per (enclave, email): repeating one bumps its
+        ``request_count`` and ``updated_at``, so a client retrying in a loop
+        cannot grow the table. A denied request asked again goes back to
+        pending for the data owner to decide anew; a pending or approved one
+        keeps its status. Returns the stored request.
+        """
+
+    @abstractmethod
+    def list_access_requests(
+        self,
+        enclave_id: Optional[str] = None,
+        email: Optional[str] = None,
+        status: Optional[AccessStatus] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[AccessRequest]:
+        """Return access requests with ``id > after_id`` matching the filters, ordered by id."""
+
+    @abstractmethod
+    def decide_access_requests(self, enclave_id: str, approve: Sequence[int], deny: Sequence[int]) -> AccessDecision:
+        """
+        Approve and deny requests of one enclave in a single transaction.
+
+        Approving whitelists the email on every current dataset of the
+        enclave; denying removes it from them again. Ids that do not belong to
+        the enclave are reported in ``not_found`` and left untouched; an id in
+        both lists raises ValueError.
+        """
+
+    @abstractmethod
+    def record_certificates(self, certificates: Sequence[IssuedCertificate]) -> int:
+        """Add issued certificates to the registry in one batch; returns the number recorded."""
+
+    @abstractmethod
+    def get_certificate(self, serial: str) -> Optional[IssuedCertificate]:
+        """Return a registered certificate by serial, or None if it was never recorded."""
+
+    @abstractmethod
+    def revoke_certificates(self, serials: Sequence[str], reason: Optional[str] = None) -> List[IssuedCertificate]:
+        """
+        Mark certificates revoked now, in one transaction.
+
+        Returns the certificates this call revoked; unknown and already revoked
+        serials are left unchanged and not returned.
+        """
+
+    @abstractmethod
+    def list_revoked_certificates(
+        self, enclave_id: Optional[str] = None, revoked_after: Optional[float] = None
+    ) -> List[IssuedCertificate]:
+        """Return revoked certificates, optionally of one enclave and revoked after a time, oldest first."""
+
+    @abstractmethod
+    def iter_certificate_serials(self, issued_after: Optional[float] = None, batch_size: int = 10000) -> Iterator[List[str]]:
+        """Yield serials of certificates issued (``not_before``) after a time, in batches."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return backend-specific counters."""
+        return {"backend": self.backend}
+
+    def close(self) -> None:
+        """Release connections held by the backend."""
+
+
+def build_dataset_query(
+    columns: Sequence[str],
+    after_id: Optional[int],
+    limit: Optional[int],
+    organization: Optional[str],
+    is_public: Optional[bool],
+    name_prefix: Optional[str],
+    placeholder: str = "?",
+    quote=lambda column: column,
+):
+    """
+    Build the keyset-paginated, filtered dataset_details SELECT for a SQL backend.
+
+    ``columns`` must be dataset_details columns (see ``split_columns``). The SQL text depends only on which filters are present, never on their
+    values, so backends can cache or prepare each shape once.
+    """
+    clauses, params = [], []
+    if after_id is not None:
+        clauses.append(f"id > {placeholder}")
+        params.append(after_id)
+    if organization is not None:
+        clauses.append(f"organization_name = {placeholder}")
+        params.append(organization)
+    if is_public is not None:
+        clauses.append(f"{quote('isPublic')} = {placeholder}")
+        params.append(is_public)
+    if name_prefix:
+        # Range instead of LIKE so the dataset_name index can be used
+        clauses.append(f"dataset_name >= {placeholder} AND dataset_name < {placeholder}")
+        params.extend([name_prefix, prefix_upper_bound(name_prefix)])
+
+    sql = f"SELECT {', '.join(quote(column) for column in columns)} FROM dataset_details"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += f" LIMIT {placeholder}"
+        params.append(limit)
+    return sql, params
+
+
+def check_decision(approve: Sequence[int], deny: Sequence[int]) -> None:
+    """Reject a bulk decision that both approves and denies the same request."""
+    both = set(approve) & set(deny)
+    if both:
+        raise ValueError(f"Requests both approved and denied: {', '.join(map(str, sorted(both)))}")
+
+
+def build_access_request_query(
+    enclave_id: Optional[str],
+    email: Optional[str],
+    status: Optional[AccessStatus],
+    after_id: Optional[int],
+    limit: Optional[int],
+    placeholder: str = "?",
+):
+    """
+    Build the keyset-paginated, filtered access_requests SELECT for a SQL backend.
+
+    Enclave (and status) filters are served by the (enclave_id, status, id)
+    index, email filters by (email, id).
+    """
+    clauses, params = [], []
+    if enclave_id is not None:
+        clauses.append(f"enclave_id = {placeholder}")
+        params.append(enclave_id)
+    if email is not None:
+        clauses.append(f"email = {placeholder}")
+        params.append(normalize_email(email))
+    if status is not None:
+        clauses.append(f"status = {placeholder}")
+        params.append(AccessStatus(status).value)
+    if after_id is not None:
+        clauses.append(f"id > {placeholder}")
+        params.append(after_id)
+
+    sql = f"SELECT {', '.join(ACCESS_REQUEST_COLUMNS)} FROM access_requests"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += f" LIMIT {placeholder}"
+        params.append(limit)
+    return sql, params
@@ -0,0 +1,240 @@
+import bisect
+import copy
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .base import (
+    DATASET_COLUMNS, AccessDecision, AccessRequest, AccessStatus, CARecord, Dataset, IssuedCertificate, Repository,
+    check_decision, dataset_children, normalize_email, select_columns,
+)
+from ..pagination import prefix_upper_bound
+
+
+class InMemoryRepository(Repository):
+    """
+    Repository held in process memory, for tests, benchmarks and throwaway instances.
+
+    Datasets are kept in id order, so ``after_id`` is a binary search; filters
+    scan forward from there. Access checks use sets mirroring the SQL
+    backends' whitelist indexes. Nothing survives a restart.
+    """
+
+    backend = "memory"
+
+    def __init__(self):
+        self._ca_records: Dict[str, CARecord] = {}
+        self._ids: List[int] = []
+        self._datasets: List[Dataset] = []
+        self._next_id = 1
+        # (dataset id, email) and (enclave id, email) whitelist entries
+        self._whitelist: Set[Tuple[int, str]] = set()
+        self._enclave_whitelist: Set[Tuple[str, str]] = set()
+        # enclave id -> number of its public datasets
+        self._public_per_enclave: Dict[str, int] = {}
+        # access requests by id (insertion order is id order) and by (enclave id, email)
+        self._access_requests: Dict[int, AccessRequest] = {}
+        self._access_request_ids: Dict[Tuple[str, str], int] = {}
+        self._next_request_id = 1
+        self._certificates: Dict[str, IssuedCertificate] = {}
+        self._lock = threading.Lock()
+
+    def init_schema(self) -> None:
+        pass
+
+    def get_ca_record(self, enclave_id: str) -> Optional[CARecord]:
+        return self._ca_records.get(enclave_id)
+
+    def upsert_ca_record(self, enclave_id: str, record: CARecord) -> None:
+        with self._lock:
+            self._ca_records[enclave_id] = CARecord(*record)
+
+    def insert_datasets(self, datasets: Sequence[Dataset]) -> int:
+        with self._lock:
+            for dataset in datasets:
+                row = {column: copy.copy(dataset[column]) for column in DATASET_COLUMNS[1:]}
+                row["id"] = self._next_id
+                row["isPublic"] = bool(row["isPublic"])
+                self._next_id += 1
+                _, whitelist = dataset_children(row["id"], row)
+                row["whitelistEmails"] = sorted(email for _, _, email in whitelist)
+                for dataset_id, enclave_id, email in whitelist:
+                    self._whitelist.add((dataset_id, email))
+                    self._enclave_whitelist.add((enclave_id, email))
+                if row["isPublic"]:
+                    self._public_per_enclave[row["enclave_id"]] = self._public_per_enclave.get(row["enclave_id"], 0) + 1
+                self._ids.append(row["id"])
+                self._datasets.append(row)
+        return len(datasets)
+
+    def list_datasets(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        organization: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dataset]:
+        selected = select_columns(columns)
+        upper = prefix_upper_bound(name_prefix) if name_prefix else None
+        with self._lock:
+            start = bisect.bisect_right(self._ids, after_id) if after_id is not None else 0
+            datasets = self._datasets
+            results = []
+            for index in range(start, len(datasets)):
+                row = datasets[index]
+                if organization is not None and row["organization_name"] != organization:
+                    continue
+                if is_public is not None and row["isPublic"] != is_public:
+                    continue
+                if upper is not None and not (name_prefix <= row["dataset_name"] < upper):
+                    continue
+                results.append({column: copy.copy(row[column]) for column in selected})
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def can_access(self, dataset_id: int, email: str) -> Optional[bool]:
+        index = bisect.bisect_left(self._ids, dataset_id)
+        if index == len(self._ids) or self._ids[index] != dataset_id:
+            return None
+        return self._datasets[index]["isPublic"] or (dataset_id, normalize_email(email)) in self._whitelist
+
+    def can_access_enclave(self, enclave_id: str, email: str) -> bool:
+        return enclave_id in self._public_per_enclave or (enclave_id, normalize_email(email)) in self._enclave_whitelist
+
+    def add_access_request(self, enclave_id: str, email: str) -> AccessRequest:
+        key = (enclave_id, normalize_email(email))
+        now = time.time()
+        with self._lock:
+            request_id = self._access_request_ids.get(key)
+            if request_id is None:
+                request_id = self._access_request_ids[key] = self._next_request_id
+                self._next_request_id += 1
+                self._access_requests[request_id] = {
+                    "id": request_id, "enclave_id": key[0], "email": key[1], "status": AccessStatus.PENDING.value,
+                    "request_count": 1, "created_at": now, "updated_at": now,
+                }
+            else:
+                request = self._access_requests[request_id]
+                if request["status"] == AccessStatus.DENIED.value:
+                    request["status"] = AccessStatus.PENDING.value
+                request["request_count"] += 1
+                request["updated_at"] = now
+            return dict(self._access_requests[request_id])
+
+    def list_access_requests(
+        self,
+        enclave_id: Optional[str] = None,
+        email: Optional[str] = None,
+        status: Optional[AccessStatus] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[AccessRequest]:
+        email = normalize_email(email) if email is not None else None
+        status = AccessStatus(status).value if status is not None else None
+        results = []
+        with self._lock:
+            for request in self._access_requests.values():
+                if after_id is not None and request["id"] <= after_id:
+                    continue
+                if enclave_id is not None and request["enclave_id"] != enclave_id:
+                    continue
+                if email is not None and request["email"] != email:
+                    continue
+                if status is not None and request["status"] != status:
+                    continue
+                results.append(dict(request))
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def _set_whitelisted(self, enclave_id: str, email: str, whitelisted: bool) -> None:
+        """Add or remove an email on every dataset of an enclave; the caller holds the lock."""
+        for row in self._datasets:
+            if row["enclave_id"] != enclave_id:
+                continue
+            emails = set(row["whitelistEmails"])
+            if whitelisted:
+                emails.add(email)
+                self._whitelist.add((row["id"], email))
+            else:
+                emails.discard(email)
+                self._whitelist.discard((row["id"], email))
+            row["whitelistEmails"] = sorted(emails)
+        if whitelisted and any(row["enclave_id"] == enclave_id for row in self._datasets):
+            self._enclave_whitelist.add((enclave_id, email))
+        elif not whitelisted:
+            self._enclave_whitelist.discard((enclave_id, email))
+
+    def decide_access_requests(self, enclave_id: str, approve: Sequence[int], deny: Sequence[int]) -> AccessDecision:
+        check_decision(approve, deny)
+        now = time.time()
+        decided: Dict[AccessStatus, List[int]] = {AccessStatus.APPROVED: [], AccessStatus.DENIED: []}
+        not_found = []
+        with self._lock:
+            for status, ids in ((AccessStatus.APPROVED, approve), (AccessStatus.DENIED, deny)):
+                for request_id in ids:
+                    request = self._access_requests.get(request_id)
+                    if request is None or request["enclave_id"] != enclave_id:
+                        not_found.append(request_id)
+                        continue
+                    request["status"] = status.value
+                    request["updated_at"] = now
+                    self._set_whitelisted(enclave_id, request["email"], status is AccessStatus.APPROVED)
+                    decided[status].append(request_id)
+        return AccessDecision(
+            sorted(set(decided[AccessStatus.APPROVED])), sorted(set(decided[AccessStatus.DENIED])), sorted(set(not_found))
+        )
+
+    def record_certificates(self, certificates: Sequence[IssuedCertificate]) -> int:
+        with self._lock:
+            for certificate in certificates:
+                self._certificates.setdefault(certificate.serial, IssuedCertificate(*certificate))
+        return len(certificates)
+
+    def get_certificate(self, serial: str) -> Optional[IssuedCertificate]:
+        return self._certificates.get(serial)
+
+    def revoke_certificates(self, serials: Sequence[str], reason: Optional[str] = None) -> List[IssuedCertificate]:
+        now = time.time()
+        revoked = []
+        with self._lock:
+            for serial in dict.fromkeys(serials):
+                certificate = self._certificates.get(serial)
+                if certificate is None or certificate.revoked_at is not None:
+                    continue
+                certificate = self._certificates[serial] = certificate._replace(revoked_at=now, revocation_reason=reason)
+                revoked.append(certificate)
+        return revoked
+
+    def list_revoked_certificates(
+        self, enclave_id: Optional[str] = None, revoked_after: Optional[float] = None
+    ) -> List[IssuedCertificate]:
+        with self._lock:
+            revoked = [
+                certificate for certificate in self._certificates.values()
+                if certificate.revoked_at is not None
+                and (enclave_id is None or certificate.enclave_id == enclave_id)
+                and (revoked_after is None or certificate.revoked_at > revoked_after)
+            ]
+        return sorted(revoked, key=lambda certificate: certificate.revoked_at)
+
+    def iter_certificate_serials(self, issued_after: Optional[float] = None, batch_size: int = 10000) -> Iterator[List[str]]:
+        with self._lock:
+            serials = [
+                certificate.serial for certificate in self._certificates.values()
+                if issued_after is None or certificate.not_before > issued_after
+            ]
+        for start in range(0, len(serials), batch_size):
+            yield serials[start:start + batch_size]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "enclaves": len(self._ca_records),
+            "datasets": len(self._datasets),
+            "access_requests": len(self._access_requests),
+            "certificates": len(self._certificates),
+        }
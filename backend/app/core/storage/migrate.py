@@ -0,0 +1,43 @@
+"""
+Bring existing SQLite databases up to the current schema.
+
+    python -m app.core.storage.migrate Backend/enclave_mapping.db app/Backend/enclave_mapping.db
+
+``init_schema`` runs the same migrations on startup; this entry point upgrades
+databases ahead of a deploy, or ones no running instance points at.
+"""
+import argparse
+import os
+
+from ..sqlite_pool import SQLitePool
+from .sqlite import SQLiteRepository
+
+
+def migrate_database(path: str) -> int:
+    """Migrate one database file; returns the number of datasets whose lists were normalized."""
+    pool = SQLitePool(path, size=1)
+    try:
+        with pool.connection() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(dataset_details)")]
+            legacy = conn.execute("SELECT count(*) FROM dataset_details").fetchone()[0] if "sample_queries" in columns else 0
+        SQLiteRepository(pool).init_schema()
+        return legacy
+    finally:
+        pool.close()
+
+
+def main():
+    """Migrate every database given on the command line (default: DB_PATH)."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=[os.getenv("DB_PATH", "Backend/enclave_mapping.db")])
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"{path}: not found, skipped")
+            continue
+        print(f"{path}: {migrate_database(path)} datasets migrated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+import hashlib
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..sqlite_pool import PoolTimeout
+from .base import (
+    ACCESS_REQUEST_COLUMNS, CERTIFICATE_COLUMNS, SCALAR_COLUMNS, AccessDecision, AccessRequest, AccessStatus,
+    CARecord, ChildLists, Dataset, IssuedCertificate, Repository,
+    build_access_request_query, build_dataset_query, check_decision, dataset_children, decode_dataset,
+    encode_dataset, group_children, normalize_email, select_columns, split_columns,
+)
+
+try:
+    import psycopg2
+    from psycopg2.extras import execute_values
+    from psycopg2.pool import ThreadedConnectionPool
+except ImportError:  # optional: only needed when STORAGE_BACKEND=postgres
+    psycopg2 = None
+
+
+PLACEHOLDER = re.compile(r"%(.)", re.DOTALL)
+
+
+def number_placeholders(sql: str) -> Tuple[str, int]:
+    """
+    Rewrite ``sql`` written for psycopg2 into a PREPARE body: ``%s`` becomes ``$1``, ``$2``, ... and ``%%`` becomes ``%``.
+
+    This follows psycopg2's own rules, which apply everywhere in the
+    statement including inside quoted literals (a literal ``%s`` is written
+    ``%%s``). Returns the statement and its number of parameters.
+    """
+    count = 0
+
+    def replace(match) -> str:
+        nonlocal count
+        if match.group(1) == "%":
+            return "%"
+        if match.group(1) == "s":
+            count += 1
+            return f"${count}"
+        raise ValueError(f"Unsupported placeholder %{match.group(1)} in {sql!r}")
+
+    return PLACEHOLDER.sub(replace, sql), count
+
+
+def quote(column: str) -> str:
+    """Quote camelCase columns (isPublic), which Postgres would otherwise fold to lower case."""
+    return f'"{column}"' if column != column.lower() else column
+
+
+INSERT_DATASET_SQL = (
+    f"INSERT INTO dataset_details ({', '.join(quote(column) for column in SCALAR_COLUMNS[1:])}) VALUES %s RETURNING id"
+)
+
+# Child rows of a page of datasets, with the ids passed as one array parameter
+CHILD_SQL = {
+    "sample_queries": (
+        "SELECT dataset_id, query FROM dataset_sample_queries WHERE dataset_id = ANY(%s) ORDER BY dataset_id, position"
+    ),
+    "whitelistEmails": (
+        "SELECT dataset_id, email FROM dataset_whitelist WHERE dataset_id = ANY(%s) ORDER BY dataset_id, email"
+    ),
+}
+
+CAN_ACCESS_SQL = (
+    'SELECT "isPublic" OR EXISTS (SELECT 1 FROM dataset_whitelist w WHERE w.dataset_id = d.id AND w.email = %s) '
+    "FROM dataset_details d WHERE d.id = %s"
+)
+
+CAN_ACCESS_ENCLAVE_SQL = (
+    'SELECT EXISTS (SELECT 1 FROM dataset_details WHERE enclave_id = %s AND "isPublic") '
+    "OR EXISTS (SELECT 1 FROM dataset_whitelist WHERE email = %s AND enclave_id = %s)"
+)
+
+# A repeated request bumps its counter and puts a denied request back to pending;
+# the unique (enclave_id, email) key keeps one row per pair
+ADD_ACCESS_REQUEST_SQL = (
+    "INSERT INTO access_requests (enclave_id, email, status, request_count, created_at, updated_at) "
+    "VALUES (%s, %s, 'pending', 1, %s, %s) "
+    "ON CONFLICT (enclave_id, email) DO UPDATE SET "
+    "status = CASE WHEN access_requests.status = 'denied' THEN 'pending' ELSE access_requests.status END, "
+    "request_count = access_requests.request_count + 1, updated_at = EXCLUDED.updated_at "
+    f"RETURNING {', '.join(ACCESS_REQUEST_COLUMNS)}"
+)
+
+DECIDE_ACCESS_REQUESTS_SQL = (
+    "UPDATE access_requests SET status = %s, updated_at = %s "
+    "WHERE enclave_id = %s AND id = ANY(%s) RETURNING id, email"
+)
+
+WHITELIST_ENCLAVE_SQL = (
+    "INSERT INTO dataset_whitelist (dataset_id, enclave_id, email) "
+    "SELECT id, enclave_id, %s FROM dataset_details WHERE enclave_id = %s ON CONFLICT DO NOTHING"
+)
+
+UNWHITELIST_ENCLAVE_SQL = "DELETE FROM dataset_whitelist WHERE email = %s AND enclave_id = %s"
+
+RECORD_CERTIFICATES_SQL = (
+    f"INSERT INTO issued_certificates ({', '.join(CERTIFICATE_COLUMNS)}) VALUES %s ON CONFLICT (serial) DO NOTHING"
+)
+
+REVOKE_CERTIFICATES_SQL = (
+    "UPDATE issued_certificates SET revoked_at = %s, revocation_reason = %s "
+    "WHERE serial = ANY(%s) AND revoked_at IS NULL "
+    f"RETURNING {', '.join(CERTIFICATE_COLUMNS)}"
+)
+
+# Moves JSON-encoded list columns of databases created before the schema was
+# normalized into the child tables, then drops them; a no-op once migrated.
+# The advisory lock keeps concurrently starting instances from racing.
+MIGRATE_JSON_LISTS_SQL = '''
+DO $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('dataset_details_json_lists'));
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'dataset_details' AND column_name = 'sample_queries'
+    ) THEN
+        INSERT INTO dataset_sample_queries (dataset_id, position, query)
+            SELECT d.id, q.ordinality - 1, q.value
+            FROM dataset_details d, json_array_elements_text(d.sample_queries::json) WITH ORDINALITY AS q(value, ordinality)
+            ON CONFLICT DO NOTHING;
+        INSERT INTO dataset_whitelist (dataset_id, enclave_id, email)
+            SELECT d.id, d.enclave_id, lower(trim(w.value))
+            FROM dataset_details d, json_array_elements_text(d."whitelistEmails"::json) AS w(value)
+            ON CONFLICT DO NOTHING;
+        ALTER TABLE dataset_details DROP COLUMN sample_queries, DROP COLUMN "whitelistEmails";
+    END IF;
+END
+$$;
+'''
+
+
+class PostgresRepository(Repository):
+    """
+    Repository on Postgres (including a Supabase project's database) via psycopg2.
+
+    Connections come from a thread-safe pool. Hot queries are sent as
+    server-side prepared statements: each distinct SQL shape is PREPAREd once
+    per connection and then run with EXECUTE, skipping parse and plan.
+    Batched inserts use a single multi-row INSERT per page of rows; list
+    fields live in child tables read with one ``= ANY(ids)`` query per page.
+
+    Prepared statements live in the database session, so behind a
+    transaction-mode pooler (e.g. Supabase's port 6543) set
+    ``max_prepared_per_connection`` to 0 to run every query unprepared.
+    """
+
+    backend = "postgres"
+
+    def __init__(
+        self,
+        dsn: str,
+        min_connections: int = 1,
+        max_connections: int = 10,
+        max_prepared_per_connection: int = 256,
+        acquire_timeout: float = 30.0,
+    ):
+        if psycopg2 is None:
+            raise RuntimeError("STORAGE_BACKEND=postgres requires psycopg2 (see requirements.txt)")
+        self.dsn = dsn
+        self.max_prepared_per_connection = max_prepared_per_connection
+        self._pool = ThreadedConnectionPool(min_connections, max_connections, dsn)
+        self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+        # psycopg2's pool raises at once when every connection is out; wait for one instead
+        self._slots = threading.BoundedSemaphore(max_connections)
+        # connection -> names of statements prepared in its session. A pooled
+        # connection is used by one thread at a time, but the mapping is shared
+        self._prepared: "weakref.WeakKeyDictionary[Any, set]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executions = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; the transaction is committed on success and rolled back on error."""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(self.acquire_timeout)
+        try:
+            conn = self._pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def _execute(self, cursor, sql: str, params: Sequence[Any]) -> None:
+        """Run ``sql`` (with %s placeholders) as a prepared statement on the cursor's connection."""
+        name = "q_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        with self._lock:
+            prepared = self._prepared.setdefault(cursor.connection, set())
+        if name not in prepared:
+            if len(prepared) >= self.max_prepared_per_connection:
+                cursor.execute(sql, params)
+                return
+            numbered, count = number_placeholders(sql)
+            if count != len(params):
+                raise ValueError(f"Statement has {count} placeholders but {len(params)} parameters were given")
+            cursor.execute(f"PREPARE {name} AS {numbered}")
+            prepared.add(name)
+            with self._lock:
+                self.prepares += 1
+        placeholders = ", ".join(["%s"] * len(params))
+        cursor.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
+        with self._lock:
+            self.executions += 1
+
+    def init_schema(self) -> None:
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS enclave_mapping (
+                enclave_id TEXT PRIMARY KEY,
+                private_key_path TEXT NOT NULL,
+                certificate_path TEXT NOT NULL,
+                key_algorithm TEXT NOT NULL DEFAULT 'rsa-2048'
+            );
+            ALTER TABLE enclave_mapping ADD COLUMN IF NOT EXISTS key_algorithm TEXT NOT NULL DEFAULT 'rsa-2048';
+
+            CREATE TABLE IF NOT EXISTS dataset_details (
+                id BIGSERIAL PRIMARY KEY,
+                enclave_id TEXT NOT NULL,
+                dataset_name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                organization_name TEXT NOT NULL,
+                rules TEXT NOT NULL,
+                "isPublic" BOOLEAN NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dataset_sample_queries (
+                dataset_id BIGINT NOT NULL REFERENCES dataset_details (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                query TEXT NOT NULL,
+                PRIMARY KEY (dataset_id, position)
+            );
+            CREATE TABLE IF NOT EXISTS dataset_whitelist (
+                dataset_id BIGINT NOT NULL REFERENCES dataset_details (id) ON DELETE CASCADE,
+                enclave_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                PRIMARY KEY (dataset_id, email)
+            );
+            CREATE TABLE IF NOT EXISTS access_requests (
+                id BIGSERIAL PRIMARY KEY,
+                enclave_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                request_count INTEGER NOT NULL DEFAULT 1,
+                created_at DOUBLE PRECISION NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL,
+                UNIQUE (enclave_id, email)
+            );
+            CREATE TABLE IF NOT EXISTS issued_certificates (
+                serial TEXT PRIMARY KEY,
+                enclave_id TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                not_before DOUBLE PRECISION NOT NULL,
+                not_after DOUBLE PRECISION NOT NULL,
+                revoked_at DOUBLE PRECISION,
+                revocation_reason TEXT
+            );
+            ''')
+            cursor.execute(MIGRATE_JSON_LISTS_SQL)
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_dataset_details_org ON dataset_details (organization_name, id);
+            CREATE INDEX IF NOT EXISTS idx_dataset_details_public ON dataset_details ("isPublic", id);
+            CREATE INDEX IF NOT EXISTS idx_dataset_details_name ON dataset_details (dataset_name text_pattern_ops);
+            CREATE INDEX IF NOT EXISTS idx_dataset_details_enclave ON dataset_details (enclave_id, "isPublic");
+            CREATE INDEX IF NOT EXISTS idx_dataset_whitelist_email ON dataset_whitelist (email, enclave_id);
+            CREATE INDEX IF NOT EXISTS idx_access_requests_enclave_status ON access_requests (enclave_id, status, id);
+            CREATE INDEX IF NOT EXISTS idx_access_requests_email ON access_requests (email, id);
+            CREATE INDEX IF NOT EXISTS idx_issued_certificates_issued ON issued_certificates (not_before);
+            CREATE INDEX IF NOT EXISTS idx_issued_certificates_revoked ON issued_certificates (enclave_id, revoked_at)
+                WHERE revoked_at IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS idx_issued_certificates_revoked_at ON issued_certificates (revoked_at)
+                WHERE revoked_at IS NOT NULL;
+            ''')
+
+    def get_ca_record(self, enclave_id: str) -> Optional[CARecord]:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(
+                cursor,
+                "SELECT private_key_path, certificate_path, key_algorithm FROM enclave_mapping WHERE enclave_id = %s",
+                (enclave_id,)
+            )
+            row = cursor.fetchone()
+        return CARecord(*row) if row else None
+
+    def upsert_ca_record(self, enclave_id: str, record: CARecord) -> None:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(
+                cursor,
+                "INSERT INTO enclave_mapping (enclave_id, private_key_path, certificate_path, key_algorithm) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (enclave_id) DO UPDATE SET private_key_path = EXCLUDED.private_key_path, "
+                "certificate_path = EXCLUDED.certificate_path, key_algorithm = EXCLUDED.key_algorithm",
+                (enclave_id, *record)
+            )
+
+    def insert_datasets(self, datasets: Sequence[Dataset]) -> int:
+        with self.connection() as conn, conn.cursor() as cursor:
+            # Multi-row INSERT ... RETURNING yields ids in VALUES order
+            ids = execute_values(
+                cursor, INSERT_DATASET_SQL, [encode_dataset(dataset) for dataset in datasets], page_size=1000, fetch=True
+            )
+            queries, whitelist = [], []
+            for (dataset_id,), dataset in zip(ids, datasets):
+                dataset_queries, dataset_whitelist = dataset_children(dataset_id, dataset)
+                queries.extend(dataset_queries)
+                whitelist.extend(dataset_whitelist)
+            execute_values(cursor, "INSERT INTO dataset_sample_queries (dataset_id, position, query) VALUES %s", queries, page_size=1000)
+            execute_values(cursor, "INSERT INTO dataset_whitelist (dataset_id, enclave_id, email) VALUES %s", whitelist, page_size=1000)
+        return len(datasets)
+
+    def _children(self, conn, ids: List[int], list_columns: Sequence[str]) -> ChildLists:
+        """Read the requested list fields of the datasets with these ids."""
+        if not ids or not list_columns:
+            return {}
+        children = {}
+        with conn.cursor() as cursor:
+            for column in list_columns:
+                self._execute(cursor, CHILD_SQL[column], (ids,))
+                children[column] = group_children(cursor.fetchall())
+        return children
+
+    def _decode(self, conn, selected: List[str], rows: List[tuple]) -> List[Dataset]:
+        """Build dataset rows for a page of dataset_details rows (``id`` first)."""
+        scalar, lists = split_columns(selected)
+        children = self._children(conn, [row[0] for row in rows], lists)
+        return [decode_dataset(scalar, row, children) for row in rows]
+
+    def list_datasets(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        organization: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dataset]:
+        selected = select_columns(columns)
+        sql, params = build_dataset_query(
+            split_columns(selected)[0], after_id, limit, organization, is_public, name_prefix, placeholder="%s", quote=quote
+        )
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                self._execute(cursor, sql, params)
+                rows = cursor.fetchall()
+            return self._decode(conn, selected, rows)
+
+    def can_access(self, dataset_id: int, email: str) -> Optional[bool]:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, CAN_ACCESS_SQL, (normalize_email(email), dataset_id))
+            row = cursor.fetchone()
+        return bool(row[0]) if row else None
+
+    def can_access_enclave(self, enclave_id: str, email: str) -> bool:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, CAN_ACCESS_ENCLAVE_SQL, (enclave_id, normalize_email(email), enclave_id))
+            return bool(cursor.fetchone()[0])
+
+    def add_access_request(self, enclave_id: str, email: str) -> AccessRequest:
+        now = time.time()
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, ADD_ACCESS_REQUEST_SQL, (enclave_id, normalize_email(email), now, now))
+            return dict(zip(ACCESS_REQUEST_COLUMNS, cursor.fetchone()))
+
+    def list_access_requests(
+        self,
+        enclave_id: Optional[str] = None,
+        email: Optional[str] = None,
+        status: Optional[AccessStatus] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[AccessRequest]:
+        sql, params = build_access_request_query(enclave_id, email, status, after_id, limit, placeholder="%s")
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, sql, params)
+            rows = cursor.fetchall()
+        return [dict(zip(ACCESS_REQUEST_COLUMNS, row)) for row in rows]
+
+    def decide_access_requests(self, enclave_id: str, approve: Sequence[int], deny: Sequence[int]) -> AccessDecision:
+        check_decision(approve, deny)
+        now = time.time()
+        decided: Dict[AccessStatus, List[int]] = {AccessStatus.APPROVED: [], AccessStatus.DENIED: []}
+        # One connection() block is one transaction: all updates commit together or not at all
+        with self.connection() as conn, conn.cursor() as cursor:
+            for status, ids, whitelist_sql in (
+                (AccessStatus.APPROVED, approve, WHITELIST_ENCLAVE_SQL),
+                (AccessStatus.DENIED, deny, UNWHITELIST_ENCLAVE_SQL),
+            ):
+                if not ids:
+                    continue
+                self._execute(cursor, DECIDE_ACCESS_REQUESTS_SQL, (status.value, now, enclave_id, list(ids)))
+                rows = cursor.fetchall()
+                for _, email in rows:
+                    self._execute(cursor, whitelist_sql, (email, enclave_id))
+                decided[status] = sorted(request_id for request_id, _ in rows)
+        found = set(decided[AccessStatus.APPROVED]) | set(decided[AccessStatus.DENIED])
+        not_found = sorted((set(approve) | set(deny)) - found)
+        return AccessDecision(decided[AccessStatus.APPROVED], decided[AccessStatus.DENIED], not_found)
+
+    def record_certificates(self, certificates: Sequence[IssuedCertificate]) -> int:
+        with self.connection() as conn, conn.cursor() as cursor:
+            execute_values(cursor, RECORD_CERTIFICATES_SQL, [tuple(certificate) for certificate in certificates], page_size=1000)
+        return len(certificates)
+
+    def get_certificate(self, serial: str) -> Optional[IssuedCertificate]:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, f"SELECT {', '.join(CERTIFICATE_COLUMNS)} FROM issued_certificates WHERE serial = %s", (serial,))
+            row = cursor.fetchone()
+        return IssuedCertificate(*row) if row else None
+
+    def revoke_certificates(self, serials: Sequence[str], reason: Optional[str] = None) -> List[IssuedCertificate]:
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, REVOKE_CERTIFICATES_SQL, (time.time(), reason, list(serials)))
+            rows = cursor.fetchall()
+        return [IssuedCertificate(*row) for row in rows]
+
+    def list_revoked_certificates(
+        self, enclave_id: Optional[str] = None, revoked_after: Optional[float] = None
+    ) -> List[IssuedCertificate]:
+        clauses, params = ["revoked_at IS NOT NULL"], []
+        if enclave_id is not None:
+            clauses.append("enclave_id = %s")
+            params.append(enclave_id)
+        if revoked_after is not None:
+            clauses.append("revoked_at > %s")
+            params.append(revoked_after)
+        sql = f"SELECT {', '.join(CERTIFICATE_COLUMNS)} FROM issued_certificates WHERE {' AND '.join(clauses)} ORDER BY revoked_at"
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, sql, params)
+            rows = cursor.fetchall()
+        return [IssuedCertificate(*row) for row in rows]
+
+    def iter_certificate_serials(self, issued_after: Optional[float] = None, batch_size: int = 10000) -> Iterator[List[str]]:
+        sql, params = "SELECT serial FROM issued_certificates", ()
+        if issued_after is not None:
+            sql, params = sql + " WHERE not_before > %s", (issued_after,)
+        with self.connection() as conn, conn.cursor(name="iter_certificate_serials") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [serial for serial, in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "max_connections": self.max_connections,
+                "prepared_statements": self.prepares,
+                "prepared_executions": self.executions,
+                "timeouts": self.timeouts,
+            }
+
+    def close(self) -> None:
+        self._pool.closeall()
+        with self._lock:
+            self._prepared.clear()
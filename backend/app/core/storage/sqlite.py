@@ -0,0 +1,398 @@
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from ..sqlite_pool import SQLitePool
+from .base import (
+    ACCESS_REQUEST_COLUMNS, CERTIFICATE_COLUMNS, SCALAR_COLUMNS, AccessDecision, AccessRequest, AccessStatus,
+    CARecord, ChildLists, Dataset, IssuedCertificate, Repository,
+    build_access_request_query, build_dataset_query, check_decision, dataset_children, decode_dataset,
+    encode_dataset, group_children, normalize_email, select_columns, split_columns,
+)
+
+INSERT_DATASET_SQL = (
+    f"INSERT INTO dataset_details ({', '.join(SCALAR_COLUMNS[1:])}) "
+    f"VALUES ({', '.join('?' for _ in SCALAR_COLUMNS[1:])})"
+)
+
+# Child rows of a page of datasets; ids are passed as one JSON array so the SQL text stays fixed
+CHILD_SQL = {
+    "sample_queries": (
+        "SELECT dataset_id, query FROM dataset_sample_queries "
+        "WHERE dataset_id IN (SELECT value FROM json_each(?)) ORDER BY dataset_id, position"
+    ),
+    "whitelistEmails": (
+        "SELECT dataset_id, email FROM dataset_whitelist "
+        "WHERE dataset_id IN (SELECT value FROM json_each(?)) ORDER BY dataset_id, email"
+    ),
+}
+
+CAN_ACCESS_SQL = (
+    "SELECT isPublic OR EXISTS (SELECT 1 FROM dataset_whitelist w WHERE w.dataset_id = d.id AND w.email = ?) "
+    "FROM dataset_details d WHERE d.id = ?"
+)
+
+CAN_ACCESS_ENCLAVE_SQL = (
+    "SELECT EXISTS (SELECT 1 FROM dataset_details WHERE enclave_id = ? AND isPublic) "
+    "OR EXISTS (SELECT 1 FROM dataset_whitelist WHERE email = ? AND enclave_id = ?)"
+)
+
+
+# A repeated request bumps its counter and puts a denied request back to pending;
+# the unique (enclave_id, email) key keeps one row per pair
+ADD_ACCESS_REQUEST_SQL = (
+    "INSERT INTO access_requests (enclave_id, email, status, request_count, created_at, updated_at) "
+    "VALUES (?, ?, 'pending', 1, ?, ?) "
+    "ON CONFLICT (enclave_id, email) DO UPDATE SET "
+    "status = CASE WHEN status = 'denied' THEN 'pending' ELSE status END, "
+    "request_count = request_count + 1, updated_at = excluded.updated_at "
+    f"RETURNING {', '.join(ACCESS_REQUEST_COLUMNS)}"
+)
+
+DECIDE_ACCESS_REQUESTS_SQL = (
+    "UPDATE access_requests SET status = ?, updated_at = ? "
+    "WHERE enclave_id = ? AND id IN (SELECT value FROM json_each(?)) RETURNING id, email"
+)
+
+WHITELIST_ENCLAVE_SQL = (
+    "INSERT OR IGNORE INTO dataset_whitelist (dataset_id, enclave_id, email) "
+    "SELECT id, enclave_id, ? FROM dataset_details WHERE enclave_id = ?"
+)
+
+UNWHITELIST_ENCLAVE_SQL = "DELETE FROM dataset_whitelist WHERE email = ? AND enclave_id = ?"
+
+
+RECORD_CERTIFICATE_SQL = (
+    f"INSERT OR IGNORE INTO issued_certificates ({', '.join(CERTIFICATE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in CERTIFICATE_COLUMNS)})"
+)
+
+REVOKE_CERTIFICATES_SQL = (
+    "UPDATE issued_certificates SET revoked_at = ?, revocation_reason = ? "
+    "WHERE serial IN (SELECT value FROM json_each(?)) AND revoked_at IS NULL "
+    f"RETURNING {', '.join(CERTIFICATE_COLUMNS)}"
+)
+
+
+def migrate_json_lists(conn: sqlite3.Connection) -> int:
+    """
+    Move JSON-encoded sample_queries/whitelistEmails columns into the child tables.
+
+    Databases created before the schema was normalized keep both lists as JSON
+    text in dataset_details. Their elements are copied into
+    dataset_sample_queries and dataset_whitelist, then the columns are dropped,
+    all in one transaction (``BEGIN IMMEDIATE`` also keeps two processes
+    starting at once from migrating twice). Returns the number of datasets
+    migrated, 0 if there was nothing to do.
+    """
+    def legacy() -> bool:
+        return "sample_queries" in [row[1] for row in conn.execute("PRAGMA table_info(dataset_details)")]
+
+    if not legacy():
+        return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not legacy():
+            conn.rollback()
+            return 0
+        conn.execute(
+            "INSERT OR IGNORE INTO dataset_sample_queries (dataset_id, position, query) "
+            "SELECT d.id, j.key, j.value FROM dataset_details d, json_each(d.sample_queries) j "
+            "WHERE json_valid(d.sample_queries)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO dataset_whitelist (dataset_id, enclave_id, email) "
+            "SELECT d.id, d.enclave_id, lower(trim(j.value)) FROM dataset_details d, json_each(d.whitelistEmails) j "
+            "WHERE json_valid(d.whitelistEmails)"
+        )
+        migrated = conn.execute("SELECT count(*) FROM dataset_details").fetchone()[0]
+        conn.execute("ALTER TABLE dataset_details DROP COLUMN sample_queries")
+        conn.execute("ALTER TABLE dataset_details DROP COLUMN whitelistEmails")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return migrated
+
+
+class SQLiteRepository(Repository):
+    """
+    Repository on a local SQLite file through a pool of WAL-mode connections.
+
+    Every query has fixed SQL text per filter combination, so each pooled
+    connection's statement cache keeps it prepared across requests. List
+    fields are read from the child tables with one query per page and list.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, pool: SQLitePool):
+        self.pool = pool
+
+    def init_schema(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS enclave_mapping (
+                enclave_id TEXT PRIMARY KEY,
+                private_key_path TEXT NOT NULL,
+                certificate_path TEXT NOT NULL,
+                key_algorithm TEXT NOT NULL DEFAULT 'rsa-2048'
+            );
+            ''')
+
+            # Databases created before key algorithms were selectable hold RSA-2048 CAs only
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(enclave_mapping)")]
+            if "key_algorithm" not in columns:
+                conn.execute("ALTER TABLE enclave_mapping ADD COLUMN key_algorithm TEXT NOT NULL DEFAULT 'rsa-2048'")
+
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS dataset_details (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                enclave_id TEXT NOT NULL,
+                dataset_name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                organization_name TEXT NOT NULL,
+                rules TEXT NOT NULL,
+                isPublic BOOLEAN NOT NULL,
+                FOREIGN KEY (enclave_id) REFERENCES enclave_mapping (enclave_id)
+            );
+            ''')
+
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS dataset_sample_queries (
+                dataset_id INTEGER NOT NULL REFERENCES dataset_details (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                query TEXT NOT NULL,
+                PRIMARY KEY (dataset_id, position)
+            ) WITHOUT ROWID;
+            ''')
+
+            # The primary key answers "is this email whitelisted for this dataset"
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS dataset_whitelist (
+                dataset_id INTEGER NOT NULL REFERENCES dataset_details (id) ON DELETE CASCADE,
+                enclave_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                PRIMARY KEY (dataset_id, email)
+            ) WITHOUT ROWID;
+            ''')
+
+            # One row per (enclave, email): duplicates bump request_count instead of adding rows
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS access_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                enclave_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                request_count INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (enclave_id, email)
+            );
+            ''')
+
+            # Registry of issued user certificates, looked up by serial
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS issued_certificates (
+                serial TEXT PRIMARY KEY,
+                enclave_id TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                not_before REAL NOT NULL,
+                not_after REAL NOT NULL,
+                revoked_at REAL,
+                revocation_reason TEXT
+            ) WITHOUT ROWID;
+            ''')
+            conn.commit()
+
+            migrate_json_lists(conn)
+
+            # Indexes backing the marketplace filters; each ends in id for keyset pagination
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dataset_details_org ON dataset_details (organization_name, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dataset_details_public ON dataset_details (isPublic, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dataset_details_name ON dataset_details (dataset_name)")
+            # Access checks by enclave: public datasets of an enclave, and an email's entries per enclave
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dataset_details_enclave ON dataset_details (enclave_id, isPublic)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dataset_whitelist_email ON dataset_whitelist (email, enclave_id)")
+            # Data owners page through an enclave's requests by status; requesters look up their own by email
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_access_requests_enclave_status ON access_requests (enclave_id, status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_access_requests_email ON access_requests (email, id)")
+            # Incremental loads of issued serials, and per-enclave CRLs from the (few) revoked rows only
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_issued_certificates_issued ON issued_certificates (not_before)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_issued_certificates_revoked ON issued_certificates (enclave_id, revoked_at) "
+                "WHERE revoked_at IS NOT NULL"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_issued_certificates_revoked_at ON issued_certificates (revoked_at) "
+                "WHERE revoked_at IS NOT NULL"
+            )
+            conn.commit()
+
+    def get_ca_record(self, enclave_id: str) -> Optional[CARecord]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT private_key_path, certificate_path, key_algorithm FROM enclave_mapping WHERE enclave_id = ?",
+                (enclave_id,)
+            ).fetchone()
+        return CARecord(*row) if row else None
+
+    def upsert_ca_record(self, enclave_id: str, record: CARecord) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO enclave_mapping (enclave_id, private_key_path, certificate_path, key_algorithm) VALUES (?, ?, ?, ?)",
+                (enclave_id, *record)
+            )
+            conn.commit()
+
+    def insert_datasets(self, datasets: Sequence[Dataset]) -> int:
+        queries, whitelist = [], []
+        with self.pool.connection() as conn:
+            try:
+                for dataset in datasets:
+                    dataset_id = conn.execute(INSERT_DATASET_SQL, encode_dataset(dataset)).lastrowid
+                    dataset_queries, dataset_whitelist = dataset_children(dataset_id, dataset)
+                    queries.extend(dataset_queries)
+                    whitelist.extend(dataset_whitelist)
+                conn.executemany("INSERT INTO dataset_sample_queries (dataset_id, position, query) VALUES (?, ?, ?)", queries)
+                conn.executemany("INSERT INTO dataset_whitelist (dataset_id, enclave_id, email) VALUES (?, ?, ?)", whitelist)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return len(datasets)
+
+    def _children(self, conn: sqlite3.Connection, ids: List[int], list_columns: Sequence[str]) -> ChildLists:
+        """Read the requested list fields of the datasets with these ids."""
+        if not ids or not list_columns:
+            return {}
+        id_list = json.dumps(ids)
+        return {column: group_children(conn.execute(CHILD_SQL[column], (id_list,)).fetchall()) for column in list_columns}
+
+    def _decode(self, conn: sqlite3.Connection, selected: List[str], rows: List[tuple]) -> List[Dataset]:
+        """Build dataset rows for a page of dataset_details rows (``id`` first)."""
+        scalar, lists = split_columns(selected)
+        children = self._children(conn, [row[0] for row in rows], lists)
+        return [decode_dataset(scalar, row, children) for row in rows]
+
+    def list_datasets(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        organization: Optional[str] = None,
+        is_public: Optional[bool] = None,
+        name_prefix: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dataset]:
+        selected = select_columns(columns)
+        sql, params = build_dataset_query(split_columns(selected)[0], after_id, limit, organization, is_public, name_prefix)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            return self._decode(conn, selected, rows)
+
+    def can_access(self, dataset_id: int, email: str) -> Optional[bool]:
+        with self.pool.connection() as conn:
+            row = conn.execute(CAN_ACCESS_SQL, (normalize_email(email), dataset_id)).fetchone()
+        return bool(row[0]) if row else None
+
+    def can_access_enclave(self, enclave_id: str, email: str) -> bool:
+        with self.pool.connection() as conn:
+            row = conn.execute(CAN_ACCESS_ENCLAVE_SQL, (enclave_id, normalize_email(email), enclave_id)).fetchone()
+        return bool(row[0])
+
+    def add_access_request(self, enclave_id: str, email: str) -> AccessRequest:
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(ADD_ACCESS_REQUEST_SQL, (enclave_id, normalize_email(email), now, now)).fetchone()
+            conn.commit()
+        return dict(zip(ACCESS_REQUEST_COLUMNS, row))
+
+    def list_access_requests(
+        self,
+        enclave_id: Optional[str] = None,
+        email: Optional[str] = None,
+        status: Optional[AccessStatus] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[AccessRequest]:
+        sql, params = build_access_request_query(enclave_id, email, status, after_id, limit)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(zip(ACCESS_REQUEST_COLUMNS, row)) for row in rows]
+
+    def decide_access_requests(self, enclave_id: str, approve: Sequence[int], deny: Sequence[int]) -> AccessDecision:
+        check_decision(approve, deny)
+        now = time.time()
+        decided: Dict[AccessStatus, List[int]] = {AccessStatus.APPROVED: [], AccessStatus.DENIED: []}
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for status, ids, whitelist_sql in (
+                    (AccessStatus.APPROVED, approve, WHITELIST_ENCLAVE_SQL),
+                    (AccessStatus.DENIED, deny, UNWHITELIST_ENCLAVE_SQL),
+                ):
+                    if not ids:
+                        continue
+                    rows = conn.execute(DECIDE_ACCESS_REQUESTS_SQL, (status.value, now, enclave_id, json.dumps(list(ids)))).fetchall()
+                    conn.executemany(whitelist_sql, [(email, enclave_id) for _, email in rows])
+                    decided[status] = sorted(request_id for request_id, _ in rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        found = set(decided[AccessStatus.APPROVED]) | set(decided[AccessStatus.DENIED])
+        not_found = sorted((set(approve) | set(deny)) - found)
+        return AccessDecision(decided[AccessStatus.APPROVED], decided[AccessStatus.DENIED], not_found)
+
+    def record_certificates(self, certificates: Sequence[IssuedCertificate]) -> int:
+        with self.pool.connection() as conn:
+            conn.executemany(RECORD_CERTIFICATE_SQL, certificates)
+            conn.commit()
+        return len(certificates)
+
+    def get_certificate(self, serial: str) -> Optional[IssuedCertificate]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(CERTIFICATE_COLUMNS)} FROM issued_certificates WHERE serial = ?", (serial,)
+            ).fetchone()
+        return IssuedCertificate(*row) if row else None
+
+    def revoke_certificates(self, serials: Sequence[str], reason: Optional[str] = None) -> List[IssuedCertificate]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(REVOKE_CERTIFICATES_SQL, (time.time(), reason, json.dumps(list(serials)))).fetchall()
+            conn.commit()
+        return [IssuedCertificate(*row) for row in rows]
+
+    def list_revoked_certificates(
+        self, enclave_id: Optional[str] = None, revoked_after: Optional[float] = None
+    ) -> List[IssuedCertificate]:
+        clauses, params = ["revoked_at IS NOT NULL"], []
+        if enclave_id is not None:
+            clauses.append("enclave_id = ?")
+            params.append(enclave_id)
+        if revoked_after is not None:
+            clauses.append("revoked_at > ?")
+            params.append(revoked_after)
+        sql = f"SELECT {', '.join(CERTIFICATE_COLUMNS)} FROM issued_certificates WHERE {' AND '.join(clauses)} ORDER BY revoked_at"
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [IssuedCertificate(*row) for row in rows]
+
+    def iter_certificate_serials(self, issued_after: Optional[float] = None, batch_size: int = 10000) -> Iterator[List[str]]:
+        sql, params = "SELECT serial FROM issued_certificates", ()
+        if issued_after is not None:
+            sql, params = sql + " WHERE not_before > ?", (issued_after,)
+        with self.pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [serial for serial, in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self.pool.stats()}
+
+    def close(self) -> None:
+        self.pool.close()
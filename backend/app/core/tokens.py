@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from jose import jwt
+from jose.exceptions import JWTError
+
+from .models import AuthenticatedUser
+
+# Fetches a JWKS document ({"keys": [...]})
+JWKSFetcher = Callable[[], Dict[str, Any]]
+
+# Validates a token against Supabase when it cannot be verified locally; returns None if invalid
+RemoteValidator = Callable[[str], Optional[AuthenticatedUser]]
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, expired, revoked or fails signature checks."""
+
+
+class CannotVerifyLocally(Exception):
+    """Raised when no key is available to verify a token in-process."""
+
+
+def token_hash(token: str) -> bytes:
+    """Cache key for a token; raw tokens are never stored."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class JWKSCache:
+    """
+    Signing keys of the auth server, fetched on first use and refreshed every ``ttl_seconds``.
+
+    A token whose ``kid`` is unknown triggers an early refresh (key rotation), at
+    most once per ``min_refresh_interval`` so garbage tokens cannot hammer the
+    JWKS endpoint.
+    """
+
+    def __init__(self, fetch: JWKSFetcher, ttl_seconds: float = 600.0, min_refresh_interval: float = 30.0):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failures = 0
+
+    def _refresh(self) -> None:
+        """Reload the key set, keeping the previous keys if the fetch fails."""
+        self._fetched_at = time.monotonic()
+        try:
+            document = self.fetch()
+        except Exception:
+            self.failures += 1
+            return
+        self._keys = {key["kid"]: key for key in document.get("keys", []) if "kid" in key}
+        self.refreshes += 1
+
+    def get(self, kid: str) -> Optional[Dict[str, Any]]:
+        """Return the JWK with this key id, refreshing the set if it is stale or lacks the key."""
+        with self._lock:
+            now = time.monotonic()
+            age = None if self._fetched_at is None else now - self._fetched_at
+            if age is None or age >= self.ttl_seconds or (kid not in self._keys and age >= self.min_refresh_interval):
+                self._refresh()
+            return self._keys.get(kid)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return key count and refresh counters."""
+        return {"keys": len(self._keys), "refreshes": self.refreshes, "failures": self.failures}
+
+
+class TokenVerifier:
+    """
+    Verify Supabase access tokens in-process.
+
+    HS256 tokens are checked against the project's JWT secret, asymmetric tokens
+    (RS256/ES256) against the JWKS key named by their ``kid``. Signature,
+    ``exp`` and audience are always enforced.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        jwks: Optional[JWKSCache] = None,
+        audience: Optional[str] = "authenticated",
+        issuer: Optional[str] = None,
+        leeway_seconds: int = 0,
+    ):
+        self.secret = secret
+        self.jwks = jwks
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway_seconds = leeway_seconds
+
+    def _key_for(self, header: Dict[str, Any]) -> Tuple[Any, List[str]]:
+        """Pick the verification key and allowed algorithms for a token header."""
+        algorithm = header.get("alg", "")
+        if algorithm.startswith("HS"):
+            if not self.secret:
+                raise CannotVerifyLocally("no JWT secret configured for HS tokens")
+            return self.secret, ["HS256"]
+        if algorithm in ("RS256", "ES256") and self.jwks is not None:
+            key = self.jwks.get(header.get("kid", ""))
+            if key is None:
+                raise CannotVerifyLocally(f"no JWKS key for kid {header.get('kid')!r}")
+            return key, [algorithm]
+        raise CannotVerifyLocally(f"unsupported token algorithm {algorithm!r}")
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the verified claims of a token."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise InvalidToken(str(e))
+        key, algorithms = self._key_for(header)
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                options={"verify_aud": self.audience is not None, "leeway": self.leeway_seconds},
+            )
+        except JWTError as e:
+            raise InvalidToken(str(e))
+
+
+class TokenCache:
+    """
+    Size-bounded LRU cache of validated tokens keyed by token hash.
+
+    An entry lives until the token's ``exp`` or ``ttl_seconds`` after it was
+    validated, whichever comes first. Revoked tokens (logout) are remembered
+    until their ``exp`` so that local verification cannot re-admit them; the
+    revocation list is per process and holds at most ``max_entries`` tokens,
+    dropping those closest to expiry first when full. Only tokens that
+    validated may be revoked (see ``TokenValidator.revoke``), so the list
+    cannot be filled with made-up tokens.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, AuthenticatedUser]]" = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.revocations = 0
+        self.revocation_evictions = 0
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        """Return the cached user for a token, or None on a miss."""
+        key = token_hash(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, user = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return user
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user: AuthenticatedUser) -> None:
+        """Cache a validated token until its expiry or the cache TTL."""
+        key = token_hash(token)
+        expires_at = min(float(user.expires_at), time.time() + self.ttl_seconds)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revoke(self, token: str, expires_at: Optional[float] = None) -> None:
+        """Evict a validated token and refuse it until its verified ``expires_at`` (default: the cache TTL)."""
+        key = token_hash(token)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._revoked[key] = expires_at if expires_at is not None else now + self.ttl_seconds
+            self.revocations += 1
+            if len(self._revoked) > self.max_entries:
+                # Forget revocations of tokens that have expired anyway, then those expiring soonest
+                self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+                excess = len(self._revoked) - self.max_entries
+                if excess > 0:
+                    for k, _ in heapq.nsmallest(excess, self._revoked.items(), key=lambda item: item[1]):
+                        del self._revoked[k]
+                    self.revocation_evictions += excess
+
+    def is_revoked(self, token: str) -> bool:
+        """Whether a token was revoked and has not expired yet."""
+        expires_at = self._revoked.get(token_hash(token))
+        return expires_at is not None and time.time() < expires_at
+
+    def clear(self) -> None:
+        """Drop all cached tokens and revocations."""
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current sizes."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "revocations": self.revocations,
+                "revocation_evictions": self.revocation_evictions,
+            }
+
+
+def user_from_claims(claims: Dict[str, Any]) -> AuthenticatedUser:
+    """Build the authenticated user from verified JWT claims."""
+    return AuthenticatedUser(
+        id=claims["sub"],
+        email=claims.get("email"),
+        role=claims.get("role"),
+        expires_at=int(claims["exp"]),
+    )
+
+
+class TokenValidator:
+    """
+    Validate bearer tokens with a cache in front of local verification.
+
+    Tokens that cannot be verified in-process (e.g. HS256 without a configured
+    secret) fall back to ``remote`` (Supabase ``auth.get_user``); the result is
+    cached the same way.
+    """
+
+    def __init__(self, verifier: TokenVerifier, cache: TokenCache, remote: Optional[RemoteValidator] = None):
+        self.verifier = verifier
+        self.cache = cache
+        self.remote = remote
+        self.local_verifications = 0
+        self.remote_validations = 0
+
+    def validate_uncached(self, token: str) -> AuthenticatedUser:
+        """Verify a token without consulting the cache, then cache the result."""
+        if self.cache.is_revoked(token):
+            raise InvalidToken("token has been revoked")
+        try:
+            user = user_from_claims(self.verifier.verify(token))
+            self.local_verifications += 1
+        except CannotVerifyLocally:
+            if self.remote is None:
+                raise InvalidToken("token cannot be verified")
+            user = self.remote(token)
+            self.remote_validations += 1
+            if user is None:
+                raise InvalidToken("token rejected by auth server")
+        except KeyError as e:
+            raise InvalidToken(f"token lacks claim {e}")
+        self.cache.put(token, user)
+        return user
+
+    def validate(self, token: str) -> AuthenticatedUser:
+        """Return the user a token belongs to, raising InvalidToken if it is not valid."""
+        return self.cache.get(token) or self.validate_uncached(token)
+
+    async def validate_async(self, token: str) -> AuthenticatedUser:
+        """``validate`` for async callers: cache hits stay on the loop, misses run in a thread."""
+        user = self.cache.get(token)
+        if user is not None:
+            return user
+        return await asyncio.to_thread(self.validate_uncached, token)
+
+    def revoke(self, token: str, user: AuthenticatedUser) -> None:
+        """
+        Evict a token from the cache and refuse it until it expires (logout).
+
+        ``user`` is what ``validate`` returned for the token: only tokens that
+        validated are revoked, and only until their verified ``exp``.
+        """
+        self.cache.revoke(token, float(user.expires_at))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache, verification and JWKS counters."""
+        return {
+            **self.cache.stats(),
+            "local_verifications": self.local_verifications,
+            "remote_validations": self.remote_validations,
+            "jwks": self.verifier.jwks.stats() if self.verifier.jwks else None,
+        }
+
+
+def http_jwks_fetcher(url: str, timeout: float = 5.0) -> JWKSFetcher:
+    """Fetcher loading a JWKS document over HTTP."""
+    def fetch() -> Dict[str, Any]:
+        response = httpx.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    return fetch
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import router as api_router
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics_response
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
 
@@ -14,5 +15,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, status and in-flight metrics
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose request, stage and error metrics in the Prometheus text format."""
+    return metrics_response()
+
 # Include the API router
 app.include_router(api_router, prefix=settings.API_V1_STR) 
\ No newline at end of file
@@ -1,31 +1,104 @@
 from cryptography import x509
-from cryptography.x509.oid import NameOID
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
-from fastapi import FastAPI, HTTPException, Request
+from cryptography.hazmat.primitives import serialization
+from fastapi import Depends, FastAPI, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import base64
 import httpx
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 import os
-import subprocess
-import sqlite3
-from contextlib import contextmanager
+import shlex
+import shutil
 import json
-from datetime import datetime, timedelta
-import time
+import math
+import asyncio
+from app.core.ca_cache import ca_cache, load_ca_files
+from app.core.certificates import (
+    KeyAlgorithm, decode_csr, build_user_certificate, certificate_to_pem,
+    build_ca_certificate, generate_ca_key, write_ca_files,
+)
+from app.core.key_pool import rsa_key_pool
+from app.core.signing_pool import signing_pool, PoolSaturated, server_timing
+from app.core.enclave_client import enclave_client
+from app.core.enclave_health import enclave_health_from_env
+from app.core.breaker import BreakerOpenError
+from app.core.admission import Admission, QueueRejected, RateLimited, admission_from_env
+from app.core.relay import RelayResponse
+from app.core.envelope import ENVELOPE_VERSION
+from app.core.sqlite_pool import PoolTimeout
+from app.core.storage import DATABASE_ERRORS, AccessStatus, CARecord, IssuedCertificate, get_repository
+from app.core.jobs import Job, JobConflict, JobQueue, run_command
+from app.core.enclave_build import ArtifactStore, TemplateSet, build_cache_from_env, build_context_key
+from app.core.response_cache import marketplace_cache_from_env
+from app.core.pagination import encode_cursor, decode_cursor, parse_fields
+from app.core.metrics import MetricsMiddleware, metrics_response, observe_stage, record_error, stage
+from app.core.logs import sampled_logger
+from app.core.revocation import get_revocation_registry, issued_certificate, parse_serial
+
+# Enclave ids end up in file names, CLI arguments, breakers and metric labels, so only plain names are accepted
+ENCLAVE_ID_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$"
 
 # Create a model for the request body
 class CSRRequest(BaseModel):
-    enclaveid: str
+    enclaveid: str = Field(..., pattern=ENCLAVE_ID_PATTERN)
     csr_pem: str
 
 
+# Models for batch CSR signing
+class CSRBatchRequest(BaseModel):
+    items: List[CSRRequest]
+
+
+class CSRBatchResult(BaseModel):
+    index: int
+    enclaveid: str
+    signed_cert: Optional[str] = None
+    error: Optional[str] = None
+
+
+class CSRBatchResponse(BaseModel):
+    signed: int
+    failed: int
+    results: List[CSRBatchResult]
+
+
+class RevokeCertificatesRequest(BaseModel):
+    serials: List[str]
+    reason: Optional[x509.ReasonFlags] = None
+
+
+# Models for batched query submission to one enclave
+class QueryItem(BaseModel):
+    encrypted_query: str
+    signed_query: str
+    version: int = Field(1, ge=1, le=ENVELOPE_VERSION)
+
+
+class ProcessQueryBatchRequest(BaseModel):
+    enclaveid: str = Field(..., pattern=ENCLAVE_ID_PATTERN)
+    queries: List[QueryItem]
+
+
+class ProcessQueryBatchResult(BaseModel):
+    index: int
+    status_code: Optional[int] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class ProcessQueryBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[ProcessQueryBatchResult]
+
+
 class RegisterUserRequest(BaseModel):
     signed_cert: str
     public_key: str
-    enclaveid: str
+    enclaveid: str = Field(..., pattern=ENCLAVE_ID_PATTERN)
+    version: int = Field(1, ge=1, le=ENVELOPE_VERSION)
 
 
 # Add this model for dataset details
@@ -42,6 +115,28 @@ class DatasetDetails(BaseModel):
 class RequestAccess(BaseModel):
     email: str
 
+
+class AccessRequestItem(BaseModel):
+    id: int
+    enclave_id: str
+    email: str
+    status: AccessStatus
+    request_count: int
+    created_at: float
+    updated_at: float
+
+
+# Bulk approve/deny of an enclave's access requests, by request id
+class AccessDecisionRequest(BaseModel):
+    approve: List[int] = []
+    deny: List[int] = []
+
+
+class AccessDecisionResponse(BaseModel):
+    approved: List[int]
+    denied: List[int]
+    not_found: List[int]
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -53,6 +148,26 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-route latency, status and in-flight metrics, served on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Sampled structured request logging (LOG_SAMPLE_RATE, off by default)
+request_log = sampled_logger("signing")
+
+def database_error(e: Exception, detail: str = "Database error") -> HTTPException:
+    """500 for a failed database call, or 503 with Retry-After when no pooled connection became free"""
+    if isinstance(e, PoolTimeout):
+        record_error("database_busy")
+        return HTTPException(status_code=503, detail="Database is busy, please retry", headers={"Retry-After": str(e.retry_after)})
+    record_error("database")
+    return HTTPException(status_code=500, detail=f"{detail}: {str(e)}")
+
+@app.exception_handler(PoolTimeout)
+async def database_busy(request: Request, e: PoolTimeout):
+    """Answer pool timeouts raised outside a database error handler with 503 as well"""
+    error = database_error(e)
+    return JSONResponse({"detail": error.detail}, status_code=error.status_code, headers=error.headers)
+
 CA_CERT = "C:/Users/LENOVO/tools/CDR/Backend/ca_certificate.pem"
 CA_KEY = "C:/Users/LENOVO/tools/CDR/Backend/ca_private.pem"
 
@@ -68,373 +183,940 @@ class MarketplaceItem(BaseModel):
     enclave_id: str
     isPublic: bool
 
-# Database path
-DB_PATH = 'Backend/enclave_mapping.db'
+# Upper bound on the number of CSRs accepted by /sign-csr/batch
+SIGN_CSR_BATCH_MAX_ITEMS = int(os.getenv("SIGN_CSR_BATCH_MAX_ITEMS", "1000"))
+
+# Page sizes for /api/marketplace/
+MARKETPLACE_DEFAULT_LIMIT = int(os.getenv("MARKETPLACE_DEFAULT_LIMIT", "100"))
+MARKETPLACE_MAX_LIMIT = int(os.getenv("MARKETPLACE_MAX_LIMIT", "1000"))
+MARKETPLACE_STREAM_BATCH = 500
+
+# Page sizes for /access-requests/ and the cap on ids per bulk decision
+ACCESS_REQUESTS_DEFAULT_LIMIT = int(os.getenv("ACCESS_REQUESTS_DEFAULT_LIMIT", "100"))
+ACCESS_REQUESTS_MAX_LIMIT = int(os.getenv("ACCESS_REQUESTS_MAX_LIMIT", "1000"))
+ACCESS_DECISION_MAX_ITEMS = int(os.getenv("ACCESS_DECISION_MAX_ITEMS", "1000"))
+
+# Upper bound on the number of queries accepted by /process-query/batch
+PROCESS_QUERY_BATCH_MAX_ITEMS = int(os.getenv("PROCESS_QUERY_BATCH_MAX_ITEMS", "100"))
+
+# Upper bound on the number of serials accepted by /certificates/revoke
+REVOKE_MAX_ITEMS = int(os.getenv("REVOKE_MAX_ITEMS", "1000"))
+
+# Rendered marketplace pages, invalidated whenever a dataset is saved
+marketplace_cache = marketplace_cache_from_env()
+
+# Enclave provisioning: base project copied into each job's workspace, and the ev CLI command
+# (EV_CLI runs inside the job workspace, so point it at a local fake by absolute path,
+# e.g. "python /abs/path/to/backend/test/fake_ev.py").
+# Every path is made absolute once here; nothing below depends on the process cwd.
+ENCLAVE_BASE_DIR = os.path.abspath(os.getenv("ENCLAVE_BASE_DIR", "test/test-enclave/hello-enclave"))
+PROVISIONING_WORKSPACE_ROOT = os.path.abspath(os.getenv("PROVISIONING_WORKSPACE_ROOT", "Backend/workspaces"))
+EV_CLI = shlex.split(os.getenv("EV_CLI", "ev"))
+
+# Directory holding each enclave's CA key and certificate files
+CA_DIR = os.path.abspath(os.getenv("CA_DIR", "Backend"))
+
+# Enclave source templates ship next to this module; they are read and compiled once, here
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+enclave_templates = TemplateSet.from_files(TEMPLATE_DIR, {
+    "index.js": "template_index.js",
+    "package.json": "package_template.json",
+    "package-lock.json": "package-lock_template.json",
+})
+
+# Rendered enclave sources, stored once per distinct content and linked into workspaces
+artifact_store = ArtifactStore(os.getenv("ARTIFACT_DIR", "Backend/artifacts"))
+
+# Built enclave images keyed by the content hash of their build context
+build_cache = build_cache_from_env()
+EV_BUILD_ARGS = ["enclave", "build", "-v", "--output", "."]
+
+# Workspace files left out of the build cache key: the enclave.toml `ev enclave init` writes
+# (per-enclave ev config, regenerated by every job), the fake CLI's log and the build output.
+# The CA PEM and enclave name are compiled into index.js and package.json, so they stay in the key.
+BUILD_CACHE_EXCLUDE = ("enclave.toml", "ev_calls.log", "enclave.eif")
+
+# Enclave mappings and datasets; STORAGE_BACKEND selects sqlite (DB_PATH, default), postgres or memory
+repository = get_repository()
+
+# Issued certificates, revocations and CRLs, answered from memory and kept in sync with storage
+revocation_registry = get_revocation_registry()
+
+# Background /health checks of recently used enclaves, feeding their circuit breakers
+enclave_health = enclave_health_from_env(enclave_client)
+
+# Token buckets per caller and per enclave, then fair queuing, in front of signing and enclave calls
+admission = admission_from_env()
+
+async def caller_identity(request: Request) -> str:
+    """Identify the caller for rate limiting: verified bearer token subject, else client address"""
+    return await admission.identify(request)
+
+class AdmissionHold:
+    """An admitted request's rate-limit headers and slot; the slot is released when the block exits unless handed off"""
+
+    def __init__(self, ticket: Admission):
+        self.ticket = ticket
+        self.headers = ticket.headers
+        self.handed_off = False
+
+    def hand_off(self) -> Callable[[], None]:
+        """Keep the slot past the block, e.g. while a streamed body is relayed; returns the release callback"""
+        self.handed_off = True
+        return lambda: admission.release(self.ticket)
+
+@asynccontextmanager
+async def admitted(caller: str, enclaves: Dict[str, int], response: Response) -> AsyncIterator[AdmissionHold]:
+    """Hold an admission slot for the block, rejecting with 429 or 503; rate-limit headers are also set on response"""
+    try:
+        ticket = await admission.acquire(caller, enclaves)
+    except RateLimited as e:
+        record_error("rate_limited")
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+    except QueueRejected as e:
+        record_error("admission_rejected")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    response.headers.update(ticket.headers)
+    hold = AdmissionHold(ticket)
+    try:
+        yield hold
+    finally:
+        if not hold.handed_off:
+            admission.release(ticket)
 
 def init_db():
-    """Initialize the SQLite database and create tables if they do not exist."""
-    # Ensure the Backend directory exists
-    os.makedirs('Backend', exist_ok=True)
-
-    with sqlite3.connect(DB_PATH) as conn:
-        # Create enclave_mapping table
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS enclave_mapping (
-            enclave_id TEXT PRIMARY KEY,
-            private_key_path TEXT NOT NULL,
-            certificate_path TEXT NOT NULL
-        );
-        ''')
-
-        # Create dataset_details table
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS dataset_details (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            enclave_id TEXT NOT NULL,
-            dataset_name TEXT NOT NULL,
-            description TEXT NOT NULL,
-            organization_name TEXT NOT NULL,
-            sample_queries TEXT NOT NULL,
-            rules TEXT NOT NULL,
-            isPublic BOOLEAN NOT NULL,
-            whitelistEmails TEXT NOT NULL,
-            FOREIGN KEY (enclave_id) REFERENCES enclave_mapping (enclave_id)
-        );
-        ''')
+    """Create the storage backend's tables and indexes if they do not exist."""
+    repository.init_schema()
 
 # Call the init_db function when the application starts
 @app.on_event("startup")
 def startup_event():
     init_db()
+    revocation_registry.load()
+    revocation_registry.start()
+    signing_pool.start()
+    enclave_client.start()
+    enclave_health.start()
+    rsa_key_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await provisioning_jobs.shutdown()
+    rsa_key_pool.stop()
+    revocation_registry.stop()
+    signing_pool.shutdown()
+    admission.store.close()
+    await enclave_health.stop()
+    await enclave_client.close()
+    repository.close()
+
+def load_ca(enclaveid: str):
+    """Look up an enclave's CA paths in the database and load the key material from disk"""
+    with stage("db_lookup"):
+        record = repository.get_ca_record(enclaveid)
+
+    if not record:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No CA found for enclave {enclaveid}"
+        )
 
-@contextmanager
-def get_db():
-    """Context manager for database connections"""
-    # Ensure the Backend directory exists
-    os.makedirs('Backend', exist_ok=True)
-    
-    db_path = 'Backend/enclave_mapping.db'
-    conn = sqlite3.connect(db_path)
-    try:
-        yield conn
-    finally:
-        conn.close()
+    with stage("key_load"):
+        return load_ca_files(record.private_key_path, record.certificate_path)
+
+def sign_csr_job(enclaveid: str, csr_pem: str) -> Tuple[str, IssuedCertificate]:
+    """Decode a CSR and sign it with the enclave's CA, returning the PEM and its registry record; runs on the signing pool"""
+    with stage("csr_decode"):
+        csr = decode_csr(csr_pem)
+
+    # Load the CA private key and certificate for this enclave (cached per enclave)
+    ca_private_key, ca_cert = ca_cache.get_or_load(enclaveid, lambda: load_ca(enclaveid))
+
+    # Sign CSR with the enclave's CA
+    with stage("sign"):
+        cert = build_user_certificate(csr, ca_private_key, ca_cert)
+    with stage("serialize"):
+        return certificate_to_pem(cert), issued_certificate(enclaveid, cert)
 
 @app.post("/sign-csr/")
-async def sign_csr(request: CSRRequest):
+async def sign_csr(request: CSRRequest, response: Response, caller: str = Depends(caller_identity)):
     """Sign CSR with enclave's CA private key"""
-    print(request)
-    try:
-        # Get the enclave ID from the request
-        enclaveid = request.enclaveid
-
-        # Get CA paths from database for this enclave
-        with get_db() as conn:
-            result = conn.execute(
-                "SELECT private_key_path, certificate_path FROM enclave_mapping WHERE enclave_id = ?",
-                (enclaveid,)
-            ).fetchone()
-            
-            if not result:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No CA found for enclave {enclaveid}"
-                )
-            
-            ca_private_key_path, ca_cert_path = result
-
-        # Decode the base64 encoded CSR
-        csr_pem_decoded = base64.b64decode(request.csr_pem).decode('utf-8')
-        csr = x509.load_pem_x509_csr(csr_pem_decoded.encode())
-
-        # Load the CA private key and certificate for this enclave
-        with open(ca_private_key_path, "rb") as key_file:
-            ca_private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password=None
-            )
-
-        with open(ca_cert_path, "rb") as cert_file:
-            ca_cert = x509.load_pem_x509_certificate(cert_file.read())
-
-        # Sign CSR with the enclave's CA
-        cert = (
-            x509.CertificateBuilder()
-            .subject_name(csr.subject)
-            .issuer_name(ca_cert.subject)
-            .public_key(csr.public_key())
-            .serial_number(x509.random_serial_number())
-            .not_valid_before(datetime.utcnow())
-            .not_valid_after(
-                datetime.utcnow() + timedelta(days=365)
+    if request_log.sampled():
+        request_log.event("sign_csr", enclaveid=request.enclaveid, csr_bytes=len(request.csr_pem))
+    async with admitted(caller, {request.enclaveid: 1}, response):
+        try:
+            # File I/O, PEM parsing and signing run on the worker pool, not the event loop
+            (signed_cert, record), timings = await signing_pool.run(sign_csr_job, request.enclaveid, request.csr_pem)
+            observe_stage("signing_queue_wait", timings["queue_wait_ms"] / 1000)
+            response.headers["Server-Timing"] = server_timing(timings)
+        except PoolSaturated as e:
+            record_error("signing_pool_saturated")
+            raise HTTPException(
+                status_code=503,
+                detail="Signing service is busy, please retry",
+                headers={"Retry-After": str(e.retry_after)}
             )
-            .add_extension(
-                x509.BasicConstraints(ca=False, path_length=None),
-                critical=True
+        except PoolTimeout as e:
+            raise database_error(e)
+        except Exception as e:
+            record_error("enclave_not_found" if isinstance(e, HTTPException) and e.status_code == 404 else "sign_failed")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Error signing CSR: {str(e)}"
             )
-            .sign(ca_private_key, hashes.SHA256())
-        )
-
-        # Return the signed certificate
-        return {
-            "signed_cert": cert.public_bytes(
-                serialization.Encoding.PEM
-            ).decode()
-        }
 
-    except Exception as e:
+    # A certificate is only handed out once it is in the registry, so it can always be revoked
+    try:
+        with stage("cert_registry"):
+            await asyncio.to_thread(revocation_registry.record_issued, [record])
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+
+    # Return the signed certificate
+    return {"signed_cert": signed_cert}
+
+def load_ca_job(enclaveid: str) -> None:
+    """Load an enclave's CA into the cache so a batch fails fast when the enclave is unknown"""
+    ca_cache.get_or_load(enclaveid, lambda: load_ca(enclaveid))
+
+def sign_csr_batch_job(enclaveid: str, csr_pems: List[str]) -> List[Tuple[Optional[str], Optional[str], Optional[IssuedCertificate]]]:
+    """Sign several CSRs with one enclave's CA, returning a (signed_cert, error, registry record) triple per CSR"""
+    ca_private_key, ca_cert = ca_cache.get_or_load(enclaveid, lambda: load_ca(enclaveid))
+
+    results = []
+    for csr_pem in csr_pems:
+        try:
+            cert = build_user_certificate(decode_csr(csr_pem), ca_private_key, ca_cert)
+            results.append((certificate_to_pem(cert), None, issued_certificate(enclaveid, cert)))
+        except Exception as e:
+            results.append((None, f"Error signing CSR: {str(e)}", None))
+    return results
+
+def batch_error(e: Exception) -> str:
+    """Describe why a batch job failed for every item it covered"""
+    if isinstance(e, PoolSaturated):
+        return "Signing service is busy, please retry"
+    if isinstance(e, PoolTimeout):
+        return "Database is busy, please retry"
+    return f"Error signing CSR: {str(e)}"
+
+@app.post("/sign-csr/batch", response_model=CSRBatchResponse)
+async def sign_csr_batch(request: CSRBatchRequest, response: Response, caller: str = Depends(caller_identity)):
+    """Sign many CSRs at once, loading each enclave's CA once and reporting errors per item"""
+    if len(request.items) > SIGN_CSR_BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=400,
-            detail=f"Error signing CSR: {str(e)}"
+            status_code=413,
+            detail=f"Batch too large: {len(request.items)} items, maximum is {SIGN_CSR_BATCH_MAX_ITEMS}"
         )
 
-@app.get("/api/marketplace/", response_model=List[MarketplaceItem])
-async def get_marketplace_items():
-    """Fetch marketplace items from dataset_details table"""
-    try:
-        with get_db() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT 
-                    id,
-                    dataset_name as name,
-                    description,
-                    organization_name as provider,
-                    sample_queries,
-                    rules,
-                    enclave_id,
-                    isPublic
-                FROM dataset_details
-            """)
-            
-            rows = cursor.fetchall()
-            marketplace_items = []
-            
-            for row in rows:
-                row_dict = dict(row)
-                sample_queries = json.loads(row_dict['sample_queries'])
-                
-                item = MarketplaceItem(
-                    id=row_dict['id'],
-                    name=row_dict['name'],
-                    description=row_dict['description'],
-                    price="Contact Provider",
-                    provider=row_dict['provider'],
-                    exampleQueries=sample_queries,
-                    rules=row_dict['rules'],
-                    enclave_id=row_dict['enclave_id'],
-                    isPublic=row_dict['isPublic']
-                )
-                marketplace_items.append(item)
-                
-            return marketplace_items
-            
-    except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-
-@app.post("/generate-ca/{enclaveid}")
-async def generate_ca(enclaveid: str):
-    """Generate CA private key and self-signed certificate for the given enclaveid"""
-    try:
-        # Define file paths
-        private_key_path = f"Backend/{enclaveid}_ca_private.pem"
-        certificate_path = f"Backend/{enclaveid}_ca_certificate.pem"
-
-        # Generate private key
-        subprocess.run(["openssl", "genrsa", "-out", private_key_path, "2048"], check=True)
-
-        # Generate self-signed certificate
-        subprocess.run([
-            "openssl", "req", "-x509", "-new", "-nodes", "-key", private_key_path,
-            "-sha256", "-days", "3650", "-out", certificate_path,
-            "-subj", f"/CN={enclaveid}"
-        ], check=True)
-
-        # Read the certificate and strip any extra whitespace/newlines
-        with open(certificate_path, "rb") as cert_file:
-            signed_cert = cert_file.read().decode('utf-8').strip()  # Use strip() to remove extra newlines
-
-        # Read the template_index.js
-        with open("app/template_index.js", "r") as template_file:
-            template_content = template_file.read()
-
-        # Replace the placeholder with the actual certificate
-        updated_content = template_content.replace("{{caCertPem}}", signed_cert.replace("\n", ""))
-
-        # Write the updated content to index.js
-        with open("test/test-enclave/hello-enclave/index.js", "w") as index_file:
-            index_file.write(updated_content)
-
-        # Store the mapping in the database
-        with get_db() as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO enclave_mapping (enclave_id, private_key_path, certificate_path) VALUES (?, ?, ?)",
-                (enclaveid, private_key_path, certificate_path)
-            )
-            conn.commit()
-
-
-
-        # open the package.json file and change the name to the enclaveid
-        with open("app/package_template.json", "r") as package_file:
-            package_content = package_file.read()
-        package_content = package_content.replace("{{enclaveid}}", enclaveid)
-        with open("test/test-enclave/hello-enclave/package.json", "w") as package_file:
-            package_file.write(package_content)
-
-        # even get the package-lock.json file and change the name to the enclaveid
-        with open("app/package-lock_template.json", "r") as package_lock_file:
-            package_lock_content = package_lock_file.read()
-        package_lock_content = package_lock_content.replace("{{enclaveid}}", enclaveid)
-        with open("test/test-enclave/hello-enclave/package-lock.json", "w") as package_lock_file:
-            package_lock_file.write(package_lock_content)
-
+    # Group item positions by enclave so each CA is looked up once
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(request.items):
+        groups.setdefault(item.enclaveid, []).append(index)
+
+    results: List[Optional[CSRBatchResult]] = [None] * len(request.items)
+    records: List[IssuedCertificate] = []
+
+    def fail(indexes: List[int], error: str):
+        for index in indexes:
+            results[index] = CSRBatchResult(index=index, enclaveid=request.items[index].enclaveid, error=error)
+
+    async def sign_group(enclaveid: str, indexes: List[int]):
+        try:
+            await signing_pool.run(load_ca_job, enclaveid)
+        except Exception as e:
+            fail(indexes, batch_error(e))
+            return
+
+        # Spread the group across the pool's workers
+        chunk_size = max(1, math.ceil(len(indexes) / signing_pool.max_workers))
+        chunks = [indexes[i:i + chunk_size] for i in range(0, len(indexes), chunk_size)]
+        outcomes = await asyncio.gather(
+            *[
+                signing_pool.run(sign_csr_batch_job, enclaveid, [request.items[i].csr_pem for i in chunk])
+                for chunk in chunks
+            ],
+            return_exceptions=True
+        )
 
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, Exception):
+                fail(chunk, batch_error(outcome))
+                continue
+            signed, _ = outcome
+            for index, (signed_cert, error, record) in zip(chunk, signed):
+                results[index] = CSRBatchResult(index=index, enclaveid=enclaveid, signed_cert=signed_cert, error=error)
+                if record is not None:
+                    records.append(record)
 
-        # i want to see the current directory using subprocess
-        print("Current directory:")
-        result = subprocess.run(["pwd"], capture_output=True, text=True)
-        print(result.stdout)
-        
-        # Change directory using os.chdir instead of subprocess
-        os.chdir("test/test-enclave/hello-enclave")
-        result = subprocess.run(["pwd"], capture_output=True, text=True)
-        print(result.stdout)
-        
-        print("starting to build enclave" , enclaveid)
-        command = ["ev", "enclave", "init", "-f", "Dockerfile", "--name", enclaveid, "--egress"]
-        print(command)
-        result = subprocess.run(command)
-        print("this came here " , result.stdout)
-        subprocess.run(["ev", "enclave", "build", "-v", "--output", "."])
-        subprocess.run(["ev", "enclave", "deploy", "-v", "--eif-path", "./enclave.eif"])
+    async with admitted(caller, {enclaveid: len(indexes) for enclaveid, indexes in groups.items()}, response):
+        await asyncio.gather(*[sign_group(enclaveid, indexes) for enclaveid, indexes in groups.items()])
 
-        # Change back to original directory
-        os.chdir("../..")
+    # Register the whole batch in one write before any certificate is returned
+    try:
+        with stage("cert_registry"):
+            await asyncio.to_thread(revocation_registry.record_issued, records)
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+
+    failed = sum(1 for result in results if result.error is not None)
+    return CSRBatchResponse(signed=len(results) - failed, failed=failed, results=results)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose request, stage and error metrics in the Prometheus text format"""
+    return metrics_response()
+
+@app.get("/signing-pool/stats")
+async def get_signing_pool_stats():
+    """Report queue depth, rejections and queue-wait/sign-time aggregates of the signing pool"""
+    return signing_pool.stats()
+
+@app.get("/ca-cache/stats")
+async def get_ca_cache_stats():
+    """Report hit/miss/eviction counters for the CA key cache"""
+    return ca_cache.stats()
+
+@app.get("/certificates/{serial}/status")
+async def get_certificate_status(serial: str):
+    """OCSP-style status of a certificate serial (hex): good, revoked or unknown, answered from memory"""
+    try:
+        normalized = parse_serial(serial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    status = revocation_registry.status(normalized)
+    return {"serial": normalized, **status._asdict()}
+
+@app.post("/certificates/revoke")
+async def revoke_certificates(request: RevokeCertificatesRequest):
+    """Revoke issued certificates by serial; unknown and already revoked serials are reported as unchanged"""
+    if len(request.serials) > REVOKE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many serials: {len(request.serials)}, maximum is {REVOKE_MAX_ITEMS}"
+        )
+    try:
+        serials = list(dict.fromkeys(parse_serial(serial) for serial in request.serials))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    reason = request.reason.value if request.reason is not None else None
+    try:
+        with stage("db_query"):
+            revoked = await asyncio.to_thread(revocation_registry.revoke, serials, reason)
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+    revoked_serials = {certificate.serial for certificate in revoked}
+    return {
+        "revoked": [serial for serial in serials if serial in revoked_serials],
+        "unchanged": [serial for serial in serials if serial not in revoked_serials],
+    }
+
+def enclave_crl_job(enclaveid: str) -> x509.CertificateRevocationList:
+    """Build or fetch the cached CRL of an enclave CA"""
+    ca_private_key, ca_cert = ca_cache.get_or_load(enclaveid, lambda: load_ca(enclaveid))
+    return revocation_registry.crl(enclaveid, ca_private_key, ca_cert)
+
+@app.get("/enclaves/{enclaveid}/crl")
+async def get_enclave_crl(enclaveid: str, request: Request, format: str = Query("der", pattern="^(der|pem)$")):
+    """Serve the enclave CA's CRL, re-signed only when a certificate of the enclave was revoked; honors If-None-Match"""
+    try:
+        with stage("crl"):
+            crl = await asyncio.to_thread(enclave_crl_job, enclaveid)
+    except HTTPException:
+        record_error("enclave_not_found")
+        raise
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+
+    # Clients revalidate every time (revocations must show up at once) and get a 304 while the CRL is unchanged
+    number = crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number
+    etag = f'"{number}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if format == "pem":
+        return Response(crl.public_bytes(serialization.Encoding.PEM), media_type="application/x-pem-file", headers=headers)
+    return Response(crl.public_bytes(serialization.Encoding.DER), media_type="application/pkix-crl", headers=headers)
+
+@app.get("/revocation/stats")
+async def get_revocation_stats():
+    """Report revoked/issued registry sizes, Bloom filter fill and CRL cache counters"""
+    return revocation_registry.stats()
+
+@app.get("/enclave-client/stats")
+async def get_enclave_client_stats():
+    """Report request, retry, hedging and connection-reuse counters of the shared enclave client"""
+    return enclave_client.stats()
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Report rate-limit settings, bucket store size and fair-queue occupancy"""
+    return admission.stats()
+
+@app.get("/enclave-breakers/stats")
+async def get_enclave_breaker_stats():
+    """Report each enclave's circuit breaker state and the last health check results"""
+    return {"breakers": enclave_client.breakers.stats(), "health": enclave_health.stats()}
+
+@app.get("/enclaves/{enclaveid}/health")
+async def get_enclave_health(enclaveid: str = Path(..., pattern=ENCLAVE_ID_PATTERN)):
+    """Report a known enclave's cached health, probing /health if the cached result is stale"""
+    # Only registered or already used enclaves: every new id would cost a probe and a cached result
+    if not enclave_health.known(enclaveid):
+        try:
+            record = await asyncio.to_thread(repository.get_ca_record, enclaveid)
+        except DATABASE_ERRORS as e:
+            raise database_error(e)
+        if record is None:
+            record_error("enclave_not_found")
+            raise HTTPException(status_code=404, detail=f"No CA found for enclave {enclaveid}")
+    status = await enclave_health.status(enclaveid)
+    breaker = enclave_client.breakers.find(enclaveid)
+    return {**status, "breaker": breaker.stats() if breaker is not None else None}
+
+# Marketplace fields and the dataset_details column each one is read from
+MARKETPLACE_COLUMNS = {
+    "id": "id",
+    "name": "dataset_name",
+    "description": "description",
+    "price": None,
+    "provider": "organization_name",
+    "exampleQueries": "sample_queries",
+    "rules": "rules",
+    "enclave_id": "enclave_id",
+    "isPublic": "isPublic",
+}
+
+def marketplace_columns(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """dataset_details columns needed to build the requested marketplace fields"""
+    if fields is None:
+        return None
+    return [MARKETPLACE_COLUMNS[field] for field in fields if MARKETPLACE_COLUMNS[field] is not None]
+
+def row_to_marketplace_item(row: dict, fields: Optional[List[str]]) -> dict:
+    """Convert a dataset_details row into a (projected) marketplace item"""
+    item = {}
+    for field in (fields if fields is not None else MARKETPLACE_COLUMNS):
+        if field == "price":
+            item[field] = "Contact Provider"
+        else:
+            item[field] = row[MARKETPLACE_COLUMNS[field]]
+    return item
+
+def fetch_marketplace_page(limit: int, fields: Optional[List[str]], **filters):
+    """Read one page of marketplace items plus the cursor of the next page, if any"""
+    with stage("db_query"):
+        rows = repository.list_datasets(limit=limit + 1, columns=marketplace_columns(fields), **filters)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["id"])
+    return [row_to_marketplace_item(row, fields) for row in rows], next_cursor
+
+def stream_marketplace_items(limit: Optional[int], fields: Optional[List[str]], **filters):
+    """Yield marketplace items as NDJSON lines while rows are fetched from the database"""
+    batches = repository.iter_datasets(
+        limit=limit, columns=marketplace_columns(fields), batch_size=MARKETPLACE_STREAM_BATCH, **filters
+    )
+    for rows in batches:
+        yield "".join(json.dumps(row_to_marketplace_item(row, fields)) + "\n" for row in rows)
+
+@app.get("/api/marketplace/")
+async def get_marketplace_items(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MARKETPLACE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    organization: Optional[str] = None,
+    isPublic: Optional[bool] = None,
+    name_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Fetch marketplace items from dataset_details table.
+
+    Items are ordered by id and paged with an opaque keyset cursor returned in
+    the X-Next-Cursor header. ``fields`` restricts the returned fields and
+    ``format=ndjson`` streams one item per line as rows are read. JSON pages
+    are cached until the next dataset write and honor If-None-Match.
+    """
+    filters = {
+        "after_id": decode_cursor(cursor),
+        "organization": organization,
+        "is_public": isPublic,
+        "name_prefix": name_prefix,
+    }
+    projection = parse_fields(fields, MARKETPLACE_COLUMNS)
 
-        return {"message": "CA generated successfully", "enclaveid": enclaveid}
+    try:
+        if format == "ndjson":
+            return StreamingResponse(
+                stream_marketplace_items(limit, projection, **filters),
+                media_type="application/x-ndjson"
+            )
 
-    except subprocess.CalledProcessError as e:
-        # Clean up files if they were created
-        for path in [private_key_path, certificate_path]:
-            if os.path.exists(path):
-                os.remove(path)
-        raise HTTPException(status_code=500, detail=f"Error generating CA: {str(e)}")
-    except sqlite3.Error as e:
+        cache_key = (limit, cursor, organization, isPublic, name_prefix, fields)
+        entry = marketplace_cache.get(cache_key)
+        if entry is None:
+            version = marketplace_cache.version
+            items, next_cursor = await asyncio.to_thread(
+                fetch_marketplace_page, limit or MARKETPLACE_DEFAULT_LIMIT, projection, **filters
+            )
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            with stage("serialize"):
+                body = json.dumps(items).encode()
+            entry = marketplace_cache.put(cache_key, body, headers=headers, version=version)
+        return marketplace_cache.respond(request, entry)
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+
+@app.get("/marketplace-cache/stats")
+async def get_marketplace_cache_stats():
+    """Report hit rate and bytes saved by the marketplace response cache"""
+    return marketplace_cache.stats()
+
+@app.get("/db-pool/stats")
+async def get_db_pool_stats():
+    """Report the storage backend and its connection pool and query counters"""
+    return repository.stats()
+
+def ca_file_paths(enclaveid: str):
+    """Absolute paths of the CA private key and certificate files for an enclave"""
+    return (
+        os.path.join(CA_DIR, f"{enclaveid}_ca_private.pem"),
+        os.path.join(CA_DIR, f"{enclaveid}_ca_certificate.pem"),
+    )
+
+def create_ca_files(enclaveid: str, key_algorithm: KeyAlgorithm):
+    """Generate the enclave's CA key and self-signed certificate in-process and write them to disk"""
+    private_key_path, certificate_path = ca_file_paths(enclaveid)
+    os.makedirs(CA_DIR, exist_ok=True)
+    try:
+        if key_algorithm == KeyAlgorithm.RSA_2048:
+            # Take a pre-generated key so the slow RSA prime search stays off the provisioning path
+            private_key = rsa_key_pool.take()
+        else:
+            # EC keys are cheap to generate on demand
+            private_key = generate_ca_key(key_algorithm)
+        write_ca_files(private_key, build_ca_certificate(private_key, enclaveid), private_key_path, certificate_path)
+    except Exception:
         # Clean up files if they were created
         for path in [private_key_path, certificate_path]:
             if os.path.exists(path):
                 os.remove(path)
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        raise
+
+def existing_ca_algorithm(enclaveid: str) -> Optional[str]:
+    """Key algorithm of the enclave's current CA if its files are still on disk, else None"""
+    record = repository.get_ca_record(enclaveid)
+    if record is None or not all(os.path.exists(path) for path in (record.private_key_path, record.certificate_path)):
+        return None
+    return record.key_algorithm
+
+async def stage_generate_ca(job: Job):
+    """Generate the CA private key and self-signed certificate, or keep the current CA when not rotating"""
+    enclaveid = job.params["enclaveid"]
+    if not job.params.get("rotate_ca", True):
+        key_algorithm = await asyncio.to_thread(existing_ca_algorithm, enclaveid)
+        if key_algorithm is not None:
+            job.params["key_algorithm"] = key_algorithm
+            job.result["ca"] = "reused"
+            return
+    await asyncio.to_thread(create_ca_files, enclaveid, KeyAlgorithm(job.params["key_algorithm"]))
+    job.result["ca"] = "generated"
+
+def render_enclave_sources(enclaveid: str, workdir: str) -> Dict[str, str]:
+    """Copy the base enclave project into the job's workspace and place the rendered templates; returns their digests"""
+    if os.path.isdir(ENCLAVE_BASE_DIR):
+        shutil.copytree(ENCLAVE_BASE_DIR, workdir, dirs_exist_ok=True)
+
+    # Read the certificate and strip any extra whitespace/newlines
+    _, certificate_path = ca_file_paths(enclaveid)
+    with open(certificate_path, "rb") as cert_file:
+        signed_cert = cert_file.read().decode('utf-8').strip()
+
+    # The certificate goes inside a JS template literal, so PEM line breaks become \n escapes;
+    # package.json and package-lock.json are named after the enclave
+    rendered = enclave_templates.render({"caCertPem": signed_cert.replace("\n", "\\n"), "enclaveid": enclaveid})
+    digests = {}
+    for output_name, content in rendered.items():
+        digests[output_name] = artifact_store.put(content)
+        artifact_store.materialize(digests[output_name], os.path.join(workdir, output_name))
+    return digests
+
+async def stage_render_enclave(job: Job):
+    """Write index.js, package.json and package-lock.json into the job's workspace"""
+    job.result["artifacts"] = await asyncio.to_thread(render_enclave_sources, job.params["enclaveid"], job.workdir)
+
+def insert_enclave_mapping(enclaveid: str, key_algorithm: str):
+    """Store the CA file paths and key algorithm of an enclave"""
+    private_key_path, certificate_path = ca_file_paths(enclaveid)
+    repository.upsert_ca_record(enclaveid, CARecord(private_key_path, certificate_path, key_algorithm))
+
+async def stage_register_mapping(job: Job):
+    """Store the enclave's CA mapping and drop any cached key material for its previous CA"""
+    enclaveid = job.params["enclaveid"]
+    await asyncio.to_thread(insert_enclave_mapping, enclaveid, job.params["key_algorithm"])
+    ca_cache.invalidate(enclaveid)
+
+async def stage_ev_init(job: Job):
+    """Initialise the enclave with the ev CLI"""
+    await run_command(EV_CLI + ["enclave", "init", "-f", "Dockerfile", "--name", job.params["enclaveid"], "--egress"], cwd=job.workdir)
+
+async def stage_ev_build(job: Job):
+    """Build the enclave image, or reuse a cached image of an identical build context"""
+    command = EV_CLI + EV_BUILD_ARGS
+    key, _ = await asyncio.to_thread(build_context_key, job.workdir, command, BUILD_CACHE_EXCLUDE)
+    image_path = os.path.join(job.workdir, "enclave.eif")
+    job.result["build_key"] = key
+    if await asyncio.to_thread(build_cache.fetch, key, image_path):
+        job.result["build_cache"] = "hit"
+        return
+    job.result["build_cache"] = "miss"
+    await run_command(command, cwd=job.workdir)
+    await asyncio.to_thread(build_cache.store, key, image_path)
+
+async def stage_ev_deploy(job: Job):
+    """Deploy the built enclave image"""
+    await run_command(EV_CLI + ["enclave", "deploy", "-v", "--eif-path", "./enclave.eif"], cwd=job.workdir)
+
+# Background provisioning jobs, one isolated workspace per job and at most one unfinished job per enclave
+provisioning_jobs = JobQueue(
+    stages=[
+        ("generate_ca", stage_generate_ca),
+        ("render_enclave", stage_render_enclave),
+        ("register_mapping", stage_register_mapping),
+        ("ev_init", stage_ev_init),
+        ("ev_build", stage_ev_build),
+        ("ev_deploy", stage_ev_deploy),
+    ],
+    workspace_root=PROVISIONING_WORKSPACE_ROOT,
+    max_concurrency=int(os.getenv("PROVISIONING_MAX_CONCURRENCY", "2")),
+)
+
+@app.post("/generate-ca/{enclaveid}", status_code=202)
+async def generate_ca(
+    enclaveid: str = Path(..., pattern=ENCLAVE_ID_PATTERN),
+    key_algorithm: KeyAlgorithm = KeyAlgorithm.RSA_2048,
+    rotate_ca: bool = True,
+):
+    """Queue CA generation and enclave provisioning for the given enclaveid (rotate_ca=false redeploys with the current CA)"""
+    try:
+        job = provisioning_jobs.submit(key=enclaveid, enclaveid=enclaveid, key_algorithm=key_algorithm.value, rotate_ca=rotate_ca)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job_id})
+    return {
+        "message": "Enclave provisioning queued",
+        "enclaveid": enclaveid,
+        "key_algorithm": key_algorithm.value,
+        "job_id": job.id,
+        "status_url": f"/provisioning-jobs/{job.id}",
+    }
+
+@app.get("/key-pool/stats")
+async def get_key_pool_stats():
+    """Report depth and refill rate of the pre-generated RSA key pool"""
+    return rsa_key_pool.stats()
+
+@app.get("/build-cache/stats")
+async def get_build_cache_stats():
+    """Report the compiled enclave templates, artifact store and EIF build cache hit/miss counters"""
+    return {
+        "templates": enclave_templates.stats(),
+        "artifacts": artifact_store.stats(),
+        "builds": build_cache.stats(),
+    }
+
+@app.get("/provisioning-jobs/stats")
+async def get_provisioning_stats():
+    """Report provisioning job counts by status"""
+    return provisioning_jobs.stats()
+
+@app.get("/provisioning-jobs/{job_id}")
+async def get_provisioning_job(job_id: str):
+    """Report the status of each stage of a provisioning job"""
+    job = provisioning_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No provisioning job {job_id}")
+    return job.to_dict()
+
+@app.post("/provisioning-jobs/{job_id}/retry", status_code=202)
+async def retry_provisioning_job(job_id: str):
+    """Resume a failed provisioning job from the stage that failed"""
+    try:
+        return provisioning_jobs.retry(job_id).to_dict()
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No provisioning job {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 # Add a helper function to get CA paths for an enclave
 def get_ca_paths(enclaveid: str):
     """Get the CA certificate and private key paths for an enclave"""
-    with get_db() as conn:
-        result = conn.execute(
-            "SELECT private_key_path, certificate_path FROM enclave_mapping WHERE enclave_id = ?",
-            (enclaveid,)
-        ).fetchone()
-        
-        if result is None:
-            raise HTTPException(status_code=404, detail=f"No CA found for enclave {enclaveid}")
-        
-        return {"private_key": result[0], "certificate": result[1]}
+    record = repository.get_ca_record(enclaveid)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No CA found for enclave {enclaveid}")
+
+    return {"private_key": record.private_key_path, "certificate": record.certificate_path}
+
+def insert_dataset(enclaveid: str, details: DatasetDetails):
+    """Insert one dataset_details row"""
+    repository.insert_dataset({"enclave_id": enclaveid, **details.model_dump()})
 
 @app.post("/save-dataset/{enclaveid}")
 async def save_dataset(enclaveid: str, details: DatasetDetails):
     """Save dataset details for the given enclaveid"""
     try:
-        with get_db() as conn:
-            conn.execute(
-                "INSERT INTO dataset_details (enclave_id, dataset_name, description, organization_name, sample_queries, rules, isPublic, whitelistEmails) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (enclaveid, details.dataset_name, details.description, details.organization_name, json.dumps(details.sample_queries), details.rules, details.isPublic, json.dumps(details.whitelistEmails))
-            )
-            conn.commit()
+        await asyncio.to_thread(insert_dataset, enclaveid, details)
+        marketplace_cache.invalidate()
         return {"message": "Dataset details saved successfully"}
-    except sqlite3.Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+
+@app.get("/datasets/{dataset_id}/access")
+async def check_dataset_access(dataset_id: int, email: str):
+    """Report whether an email may use a dataset, i.e. it is public or the email is whitelisted"""
+    try:
+        with stage("db_query"):
+            allowed = await asyncio.to_thread(repository.can_access, dataset_id, email)
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+    if allowed is None:
+        raise HTTPException(status_code=404, detail=f"No dataset {dataset_id}")
+    return {"dataset_id": dataset_id, "email": email, "allowed": allowed}
+
+@app.get("/enclaves/{enclaveid}/access")
+async def check_enclave_access(enclaveid: str, email: str):
+    """Report whether an email may use at least one dataset of an enclave"""
+    try:
+        with stage("db_query"):
+            allowed = await asyncio.to_thread(repository.can_access_enclave, enclaveid, email)
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+    return {"enclaveid": enclaveid, "email": email, "allowed": allowed}
 
 @app.post("/request-access/{enclaveid}")
 async def request_access(enclaveid: str, request: RequestAccess):
-    """Handle access requests for a private enclave"""
+    """Store an access request for a private enclave; repeated requests are deduplicated"""
     try:
-        # Here you can implement logic to store the access request
-        # For example, you could save it to a database or send an email notification
-        print(f"Access request for enclave {enclaveid} from {request.email}")
-        return {"message": "Access request received"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing access request: {str(e)}")
-    
-
-
-
-
-
-
-
-
-
+        with stage("db_query"):
+            stored = await asyncio.to_thread(repository.add_access_request, enclaveid, request.email)
+    except DATABASE_ERRORS as e:
+        raise database_error(e, "Error processing access request")
+    if request_log.sampled():
+        request_log.event("access_request", enclaveid=enclaveid, request_id=stored["id"], request_count=stored["request_count"])
+    return {"message": "Access request received", "request_id": stored["id"], "status": stored["status"]}
+
+@app.get("/access-requests/", response_model=List[AccessRequestItem])
+async def list_access_requests(
+    response: Response,
+    enclaveid: Optional[str] = None,
+    email: Optional[str] = None,
+    status: Optional[AccessStatus] = None,
+    limit: Optional[int] = Query(None, ge=1, le=ACCESS_REQUESTS_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """
+    List access requests for data owners, filtered by enclave, email and status.
+
+    Requests are ordered by id and paged with an opaque keyset cursor returned
+    in the X-Next-Cursor header.
+    """
+    page_size = limit or ACCESS_REQUESTS_DEFAULT_LIMIT
+    try:
+        with stage("db_query"):
+            rows = await asyncio.to_thread(
+                repository.list_access_requests, enclaveid, email, status, decode_cursor(cursor), page_size + 1
+            )
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1]["id"])
+    return rows
+
+@app.post("/access-requests/{enclaveid}/decisions", response_model=AccessDecisionResponse)
+async def decide_access_requests(enclaveid: str, request: AccessDecisionRequest):
+    """Approve and deny access requests of an enclave in one transaction, updating dataset whitelists"""
+    count = len(request.approve) + len(request.deny)
+    if count > ACCESS_DECISION_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many decisions: {count} ids, maximum is {ACCESS_DECISION_MAX_ITEMS}"
+        )
+    try:
+        with stage("db_query"):
+            decision = await asyncio.to_thread(repository.decide_access_requests, enclaveid, request.approve, request.deny)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DATABASE_ERRORS as e:
+        raise database_error(e)
+    marketplace_cache.invalidate()
+    return decision._asdict()
+
+def enclave_unavailable(e: BreakerOpenError) -> HTTPException:
+    """503 telling the client when the enclave's breaker lets calls through again"""
+    record_error("circuit_open")
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+async def open_enclave_stream(enclaveid: str, path: str, idempotent: bool, data: dict) -> httpx.Response:
+    """POST to an enclave and return the open response for relaying; error responses are read and raised"""
+    with stage("upstream_enclave"):
+        response = await enclave_client.post(enclaveid, path, idempotent=idempotent, stream=True, json=data)
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        response.raise_for_status()
+    return response
 
 @app.post("/register-user/")
-async def register_user( request: RegisterUserRequest):
+async def register_user(
+    request: RegisterUserRequest,
+    http_response: Response,
+    stream: bool = False,
+    caller: str = Depends(caller_identity),
+):
     """Register user with enclave and get an encrypted key"""
-    try:
-        # Print the request body
-        # Prepare the data to send to the external endpoint
-        #  would be sent as base64 encoded string
+    async with admitted(caller, {request.enclaveid: 1}, http_response) as hold:
+        try:
+            # Print the request body
+            # Prepare the data to send to the external endpoint
+            #  would be sent as base64 encoded string
         
-        signed_cert = request.signed_cert
-        public_key = request.public_key
+            signed_cert = request.signed_cert
+            public_key = request.public_key
         
-        # decode the base64 encoded string
-        signed_cert = base64.b64decode(signed_cert).decode('utf-8')
-        public_key = base64.b64decode(public_key).decode('utf-8')
+            # decode the base64 encoded string
+            signed_cert = base64.b64decode(signed_cert).decode('utf-8')
+            public_key = base64.b64decode(public_key).decode('utf-8')
         
-        data = {
-            "signed_cert": signed_cert,
-            "public_key": public_key
-        }
+            data = {
+                "signed_cert": signed_cert,
+                "public_key": public_key
+            }
+            # Version 2 asks the enclave for an envelope-encrypted E_pub; version 1 requests are sent unchanged
+            if request.version != 1:
+                data["version"] = request.version
         
 
-        # https://{enclaveid}.app-73f7d14326e6.enclave.evervault.com
+            # https://{enclaveid}.app-73f7d14326e6.enclave.evervault.com
+
 
+            # stream=true relays the enclave's body as it arrives, without decoding it; the slot is held until it is relayed
+            if stream:
+                upstream = await open_enclave_stream(request.enclaveid, "/register-user", False, data)
+                return RelayResponse(upstream, hold.headers, release=hold.hand_off())
 
-        # Send the request to the external endpoint
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"https://{request.enclaveid}.app-73f7d14326e6.enclave.evervault.com/register-user", json=data)
+            # Send the request to the external endpoint over the shared, pooled client
+            with stage("upstream_enclave"):
+                response = await enclave_client.post(request.enclaveid, "/register-user", json=data)
             response.raise_for_status()  # Raise an error for bad responses
 
         
-        # Return the encrypted key received from the external service
-        return response.json()
-
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=f"Error registering user: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing registration: {str(e)}")
+            # Return the encrypted key received from the external service
+            with stage("deserialize"):
+                return response.json()
+
+        except BreakerOpenError as e:
+            raise enclave_unavailable(e)
+        except httpx.HTTPStatusError as e:
+            record_error("upstream_status")
+            raise HTTPException(status_code=e.response.status_code, detail=f"Error registering user: {str(e)}")
+        except Exception as e:
+            record_error("upstream_transport" if isinstance(e, httpx.TransportError) else "register_failed")
+            raise HTTPException(status_code=500, detail=f"Error processing registration: {str(e)}")
 
 @app.post("/process-query/")
-async def process_query(encrypted_query: str, signed_query: str , enclaveid: str):
-    """Process the encrypted query and signed query"""
-    try:
-        # Prepare the data to send to the external endpoint
-        data = {
-            "encrypted_query": encrypted_query,
-            "signed_query": signed_query,
-        }
-
-        # Send the request to the external endpoint
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"https://{enclaveid}.app-73f7d14326e6.enclave.evervault.com/process-query", json=data)
+async def process_query(
+    encrypted_query: str,
+    signed_query: str ,
+    enclaveid: Annotated[str, Query(pattern=ENCLAVE_ID_PATTERN)],
+    http_response: Response,
+    stream: bool = False,
+    version: int = Query(1, ge=1, le=ENVELOPE_VERSION),
+    caller: str = Depends(caller_identity),
+):
+    """Process the encrypted query and signed query; stream=true relays large results as they arrive, version=2 uses envelope encryption"""
+    async with admitted(caller, {enclaveid: 1}, http_response) as hold:
+        try:
+            # Prepare the data to send to the external endpoint
+            data = {
+                "encrypted_query": encrypted_query,
+                "signed_query": signed_query,
+            }
+            # Version 2 queries are RSA-wrapped AES-GCM envelopes (app/core/envelope.py); version 1 requests are sent unchanged
+            if version != 1:
+                data["version"] = version
+
+            # The slot is held until the streamed body is relayed
+            if stream:
+                upstream = await open_enclave_stream(enclaveid, "/process-query", True, data)
+                return RelayResponse(upstream, hold.headers, release=hold.hand_off())
+
+            # Send the request to the external endpoint; queries are read-only, so transient failures are retried
+            with stage("upstream_enclave"):
+                response = await enclave_client.post(enclaveid, "/process-query", idempotent=True, json=data)
             response.raise_for_status()  # Raise an error for bad responses
 
-        # Return the response from the external service
-        return response.json()
+            # Return the response from the external service
+            with stage("deserialize"):
+                return response.json()
+
+        except BreakerOpenError as e:
+            raise enclave_unavailable(e)
+        except httpx.HTTPStatusError as e:
+            record_error("upstream_status")
+            raise HTTPException(status_code=e.response.status_code, detail=f"Error processing query: {str(e)}")
+        except Exception as e:
+            record_error("upstream_transport" if isinstance(e, httpx.TransportError) else "query_failed")
+            raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+def query_batch_result(index: int, outcome: Any) -> ProcessQueryBatchResult:
+    """Turn one upstream outcome of a query batch into its per-item result"""
+    if isinstance(outcome, BreakerOpenError):
+        record_error("circuit_open")
+        return ProcessQueryBatchResult(index=index, status_code=503, error=str(outcome))
+    if isinstance(outcome, Exception):
+        record_error("upstream_transport" if isinstance(outcome, httpx.TransportError) else "query_failed")
+        return ProcessQueryBatchResult(index=index, error=f"Error processing request: {str(outcome)}")
+    if outcome.is_error:
+        record_error("upstream_status")
+        return ProcessQueryBatchResult(
+            index=index,
+            status_code=outcome.status_code,
+            error=f"Error processing query: enclave returned {outcome.status_code}",
+        )
+    try:
+        return ProcessQueryBatchResult(index=index, status_code=outcome.status_code, result=outcome.json())
+    except ValueError as e:
+        record_error("query_failed")
+        return ProcessQueryBatchResult(index=index, status_code=outcome.status_code, error=f"Invalid enclave response: {str(e)}")
+
+@app.post("/process-query/batch", response_model=ProcessQueryBatchResponse)
+async def process_query_batch(request: ProcessQueryBatchRequest, response: Response, caller: str = Depends(caller_identity)):
+    """Forward many queries to one enclave concurrently and report results in order, with errors per item"""
+    if len(request.queries) > PROCESS_QUERY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.queries)} queries, maximum is {PROCESS_QUERY_BATCH_MAX_ITEMS}"
+        )
+
+    # All queries go out together (capped per enclave), so the batch takes about as long as its slowest query
+    async with admitted(caller, {request.enclaveid: len(request.queries)}, response):
+        with stage("upstream_enclave"):
+            outcomes = await enclave_client.post_many(
+                request.enclaveid,
+                "/process-query",
+                [query.model_dump(exclude_defaults=True) for query in request.queries],
+                idempotent=True,
+            )
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=f"Error processing query: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
\ No newline at end of file
+    with stage("deserialize"):
+        results = [query_batch_result(index, outcome) for index, outcome in enumerate(outcomes)]
+    failed = sum(1 for result in results if result.error is not None)
+    return ProcessQueryBatchResponse(succeeded=len(results) - failed, failed=failed, results=results)
@@ -3,6 +3,7 @@ const express = require("express");
 const bodyParser = require("body-parser");
 const forge = require("node-forge");
 const base64url = require("base64url");
+const crypto = require("crypto");
 
 const app = express();
 const port = 8008;
@@ -71,19 +72,24 @@ const caCertPem = `{{caCertPem}}`;
   
 /**
  * Verify Cert_U against the CA certificate.
+ * Uses Node's X509Certificate so RSA, ECDSA P-256 and Ed25519 CAs are all supported.
  * Returns the verified U_pub key.
  */
 function verifyCertificate(certPem) {
-    const caCert = forge.pki.certificateFromPem(caCertPem);
-    const userCert = forge.pki.certificateFromPem(certPem);
-
+    let verified = false;
+    let userCert;
     try {
+        const caCert = new crypto.X509Certificate(caCertPem);
+        userCert = new crypto.X509Certificate(certPem);
         // Verify signature using CA public key
-        userCert.verify(caCert);
-        return userCert.publicKey;
+        verified = userCert.verify(caCert.publicKey);
     } catch (error) {
+        verified = false;
+    }
+    if (!verified) {
         throw new Error("Certificate verification failed");
     }
+    return userCert.publicKey;
 }
 
 /**
@@ -124,12 +130,105 @@ function verifySignature(publicKey, signature, data) {
     return publicKey.verify(md.digest().bytes(), base64url.toBuffer(signature));
 }
 
+// Envelope encryption (protocol version 2): a per-message AES-256-GCM key wrapped once with
+// RSA-OAEP, so payloads of any size cost one RSA operation. Same format as backend/app/core/envelope.py:
+//   v2.<wrapped key>.<nonce prefix>.<chunk size>.<chunk 0>.<chunk 1>...
+// Each chunk is authenticated together with the header, its index and whether it is the last one.
+const ENVELOPE_VERSION = 2;
+const ENVELOPE_CHUNK_BYTES = 64 * 1024;
+const OAEP_SHA256 = { padding: crypto.constants.RSA_PKCS1_OAEP_PADDING, oaepHash: "sha256" };
+
+function envelopeNonce(prefix, index) {
+    const nonce = Buffer.alloc(12);
+    prefix.copy(nonce, 0);
+    nonce.writeUInt32BE(index, 8);
+    return nonce;
+}
+
+function envelopeAad(header, index, last) {
+    return Buffer.from(`${header}.${index}.${last ? 1 : 0}`);
+}
+
+/**
+ * Encrypt plaintext into a version 2 envelope, yielding the header and then one ".<chunk>" part per chunk.
+ */
+function* sealEnvelopeParts(publicKeyPem, plaintext) {
+    const key = crypto.randomBytes(32);
+    const prefix = crypto.randomBytes(8);
+    const wrappedKey = crypto.publicEncrypt({ key: publicKeyPem, ...OAEP_SHA256 }, key);
+    const header = ["v2", wrappedKey.toString("base64url"), prefix.toString("base64url"), String(ENVELOPE_CHUNK_BYTES)].join(".");
+    yield header;
+
+    const count = Math.max(1, Math.ceil(plaintext.length / ENVELOPE_CHUNK_BYTES));
+    for (let index = 0; index < count; index++) {
+        const cipher = crypto.createCipheriv("aes-256-gcm", key, envelopeNonce(prefix, index));
+        cipher.setAAD(envelopeAad(header, index, index === count - 1));
+        const chunk = plaintext.subarray(index * ENVELOPE_CHUNK_BYTES, (index + 1) * ENVELOPE_CHUNK_BYTES);
+        yield "." + Buffer.concat([cipher.update(chunk), cipher.final(), cipher.getAuthTag()]).toString("base64url");
+    }
+}
+
+/**
+ * Decrypt a version 2 envelope; throws if it is malformed, truncated or was tampered with.
+ */
+function openEnvelope(privateKeyPem, envelope) {
+    const parts = envelope.split(".");
+    if (parts.length < 5 || parts[0] !== "v2") {
+        throw new Error("Malformed envelope");
+    }
+    const header = parts.slice(0, 4).join(".");
+    const key = crypto.privateDecrypt({ key: privateKeyPem, ...OAEP_SHA256 }, Buffer.from(parts[1], "base64url"));
+    const prefix = Buffer.from(parts[2], "base64url");
+    const chunks = parts.slice(4);
+    return Buffer.concat(chunks.map((part, index) => {
+        const sealed = Buffer.from(part, "base64url");
+        const decipher = crypto.createDecipheriv("aes-256-gcm", key, envelopeNonce(prefix, index));
+        decipher.setAAD(envelopeAad(header, index, index === chunks.length - 1));
+        decipher.setAuthTag(sealed.subarray(sealed.length - 16));
+        return Buffer.concat([decipher.update(sealed.subarray(0, sealed.length - 16)), decipher.final()]);
+    }));
+}
+
+/**
+ * Verify a signature over a (possibly large) version 2 envelope with Node's native crypto.
+ */
+function verifyEnvelopeSignature(publicKeyPem, signature, data) {
+    return crypto.verify("sha256", Buffer.from(data), publicKeyPem, Buffer.from(signature, "base64url"));
+}
+
+/**
+ * Send `{ field: <envelope>, version: 2 }`, writing the envelope chunk by chunk as it is sealed
+ * and waiting for the socket to drain, so large results are never held as one JSON string.
+ */
+async function sendEnvelope(res, field, publicKeyPem, plaintext) {
+    const parts = sealEnvelopeParts(publicKeyPem, plaintext);
+    // Wrap the key before anything is written, so a bad public key still gets a 400
+    const header = parts.next().value;
+    res.type("application/json");
+    res.write(`{"${field}": "${header}`);
+    for (const part of parts) {
+        if (res.destroyed) {
+            return;
+        }
+        if (!res.write(part)) {
+            await new Promise((resolve) => {
+                res.once("drain", resolve);
+                res.once("close", resolve);
+            });
+        }
+    }
+    res.end(`", "version": ${ENVELOPE_VERSION}}`);
+}
+
 /**
  * Register user: Step 4 & 5
  */
-app.post("/register-user", (req, res) => {
+app.post("/register-user", async (req, res) => {
     try {
-        const { U_pub_pem, Cert_U } = req.body;
+        const { U_pub_pem, Cert_U, version = 1 } = req.body;
+        if (version !== 1 && version !== ENVELOPE_VERSION) {
+            return res.status(400).json({ error: `Unsupported protocol version ${version}` });
+        }
 
         // Verify certificate
         const verifiedU_pub = verifyCertificate(Cert_U);
@@ -137,8 +236,13 @@ app.post("/register-user", (req, res) => {
         // Generate enclave keypair (E_priv, E_pub)
         const { publicKey: E_pub, privateKey: E_priv } = generateKeyPair();
 
-        // Store user mapping
-        userKeyMap[U_pub_pem] = { E_priv, E_pub };
+        // Store user mapping (with a PEM copy of E_priv for the native envelope decryption)
+        userKeyMap[U_pub_pem] = { E_priv, E_pub, E_priv_pem: forge.pki.privateKeyToPem(E_priv) };
+
+        // Version 2: return E_pub in an envelope sealed for U_pub
+        if (version === ENVELOPE_VERSION) {
+            return await sendEnvelope(res, "encrypted_E_pub", U_pub_pem, Buffer.from(forge.pki.publicKeyToPem(E_pub)));
+        }
 
         // Encrypt E_pub using U_pub and return it
         const U_pub = forge.pki.publicKeyFromPem(U_pub_pem);
@@ -156,11 +260,27 @@ app.post("/register-user", (req, res) => {
 /**
  * Process user query: Step 9
  */
-app.post("/process-query", (req, res) => {
+app.post("/process-query", async (req, res) => {
     try {
-        const { encrypted_query, signed_query } = req.body;
+        const { encrypted_query, signed_query, version = 1 } = req.body;
+        if (version !== 1 && version !== ENVELOPE_VERSION) {
+            return res.status(400).json({ error: `Unsupported protocol version ${version}` });
+        }
+
+        for (const [U_pub_pem, { E_priv, E_pub, E_priv_pem }] of Object.entries(userKeyMap)) {
+            // Version 2: envelope in, envelope out
+            if (version === ENVELOPE_VERSION) {
+                if (!verifyEnvelopeSignature(U_pub_pem, signed_query, encrypted_query)) {
+                    continue; // Try the next U_pub
+                }
+                const decrypted_query = openEnvelope(E_priv_pem, encrypted_query).toString("utf8");
+
+                // 🔹 Process the query against enclave dataset (Placeholder)
+                const response = `Processed query: ${decrypted_query}`;
+
+                return await sendEnvelope(res, "encrypted_response", U_pub_pem, Buffer.from(response, "utf8"));
+            }
 
-        for (const [U_pub_pem, { E_priv, E_pub }] of Object.entries(userKeyMap)) {
             const U_pub = forge.pki.publicKeyFromPem(U_pub_pem);
 
             // Verify signature
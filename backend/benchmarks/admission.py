@@ -0,0 +1,282 @@
+"""
+Check per-caller rate limits, fair queuing and the shared bucket store.
+
+    python -m benchmarks.admission --seconds 4
+
+Runs the stub enclave under uvicorn with --enclave-capacity queries served
+at once and --latency seconds each, and drives the backend in-process with
+HS256 bearer tokens so callers are told apart by their ``sub``:
+
+- fairness: a "heavy" caller keeps --heavy-concurrency queries in flight
+  while a "light" caller sends one at a time. Without admission control the
+  light caller queues behind the heavy one at the enclave; with the fair
+  queue (capacity --enclave-capacity) its p50 must at least halve;
+- rate limit: with a caller limit of 5/s (burst 10) the heavy caller must
+  get 429s carrying RateLimit-* and Retry-After headers while the light
+  caller, staying under its limit, gets none;
+- full batches: under the default limits (burst 40 per caller) a
+  /sign-csr/batch and a /process-query/batch at their size caps must be
+  admitted, and the caller's next call must wait out the debt they left
+  with a finite Retry-After rather than be rejected for good;
+- shared store: --workers processes take from one bucket (burst 20, next
+  to no refill). With the SQLite store they must admit 20 in total; with
+  per-process memory stores each admits 20;
+- overhead: time of one acquire/release per store.
+
+Exits 1 if a check fails.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from jose import jwt
+
+from app.core.admission import AdmissionController, Limit, MemoryBucketStore, SQLiteBucketStore
+from app.core.sqlite_pool import SQLitePool
+from benchmarks.common import measure_async, summarize
+from benchmarks import stub_enclave
+from benchmarks.stub_enclave import serve_in_thread, stub
+
+SECRET = "benchmark-secret"
+
+
+def token(sub: str) -> str:
+    """HS256 access token for ``sub``, as Supabase would issue it."""
+    return jwt.encode({"sub": sub, "aud": "authenticated", "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256")
+
+
+def configure(stub_url: str, capacity: int) -> None:
+    """Point the backend at the stub and size its fair queue before the app is imported."""
+    os.environ.update(
+        ENCLAVE_URL_TEMPLATE=stub_url,
+        DB_PATH=os.path.join(tempfile.mkdtemp(), "enclave_mapping.db"),
+        ENCLAVE_MAX_CONNECTIONS_PER_HOST="200",
+        SUPABASE_JWT_SECRET=SECRET,
+        ADMISSION_MAX_CONCURRENCY=str(capacity),
+        ADMISSION_MAX_WAIT="30",
+        RATE_LIMIT_CALLER_RATE="0",
+        RATE_LIMIT_ENCLAVE_RATE="0",
+    )
+
+
+async def query(client, headers: Dict[str, str]) -> Tuple[float, int, Dict[str, str]]:
+    """One /process-query/ call; returns (seconds, status code, response headers)."""
+    started = time.perf_counter()
+    response = await client.post(
+        "/process-query/", params={"encrypted_query": "q", "signed_query": "s", "enclaveid": "shared"}, headers=headers)
+    return time.perf_counter() - started, response.status_code, dict(response.headers)
+
+
+async def contend(client, seconds: float, concurrency: int, light_pause: float = 0.0) -> Dict[str, List[Tuple[float, int, Dict[str, str]]]]:
+    """Run the heavy and the light caller side by side for ``seconds``."""
+    deadline = time.perf_counter() + seconds
+    outcomes: Dict[str, List[Tuple[float, int, Dict[str, str]]]] = {"heavy": [], "light": []}
+
+    async def worker(name: str, pause: float):
+        headers = {"Authorization": f"Bearer {token(name)}"}
+        while time.perf_counter() < deadline:
+            outcome = await query(client, headers)
+            outcomes[name].append(outcome)
+            # Also yields to the loop: a call rejected in-process never suspends on its own
+            await asyncio.sleep(pause if outcome[1] == 200 else 0.01)
+
+    await asyncio.gather(
+        *(worker("heavy", 0.0) for _ in range(concurrency)), worker("light", light_pause))
+    return outcomes
+
+
+def describe(outcomes: List[Tuple[float, int, Dict[str, str]]]) -> Dict[str, Any]:
+    """Latency summary of successful calls plus counts per status code."""
+    statuses: Dict[str, int] = {}
+    for _, status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [seconds for seconds, status, _ in outcomes if status == 200]
+    return {**(summarize(ok) if ok else {}), "statuses": statuses}
+
+
+async def fairness(client, signing, seconds: float, concurrency: int) -> Dict[str, Any]:
+    """Light caller latency without and with admission control."""
+    results = {}
+    for label, enabled in (("off", False), ("on", True)):
+        signing.admission.enabled = enabled
+        outcomes = await contend(client, seconds, concurrency)
+        results[label] = {name: describe(calls) for name, calls in outcomes.items()}
+    return results
+
+
+async def rate_limit(client, signing, seconds: float, concurrency: int) -> Dict[str, Any]:
+    """Heavy and light caller under a 5/s caller limit."""
+    signing.admission.enabled = True
+    signing.admission.caller_limit = Limit(5, 10)
+    try:
+        outcomes = await contend(client, seconds, concurrency, light_pause=0.5)
+    finally:
+        signing.admission.caller_limit = None
+    limited = next((headers for _, status, headers in outcomes["heavy"] if status == 429), {})
+    return {
+        **{name: describe(calls) for name, calls in outcomes.items()},
+        "limited_headers": {k: v for k, v in limited.items() if k.startswith(("ratelimit-", "retry-after"))},
+    }
+
+
+async def full_batches(client, signing) -> Dict[str, Any]:
+    """One batch of each kind at its size cap under the default limits (own enclave each), then one more call per caller."""
+    signing.admission.enabled = True
+    signing.admission.caller_limit, signing.admission.enclave_limit = Limit(20, 40), Limit(200, 400)
+    batches = {
+        "sign_csr": ("/sign-csr/batch", {
+            "items": [{"enclaveid": "batch-csr", "csr_pem": "csr"}] * signing.SIGN_CSR_BATCH_MAX_ITEMS}),
+        "process_query": ("/process-query/batch", {
+            "enclaveid": "batch-query",
+            "queries": [{"encrypted_query": "q", "signed_query": "s"}] * signing.PROCESS_QUERY_BATCH_MAX_ITEMS}),
+    }
+    results = {}
+    try:
+        for name, (path, body) in batches.items():
+            headers = {"Authorization": f"Bearer {token('batch-' + name)}"}
+            first = await client.post(path, json=body, headers=headers)
+            _, status, after = await query(client, headers)
+            results[name] = {
+                "items": len(next(iter(v for v in body.values() if isinstance(v, list)))),
+                "status": first.status_code,
+                "next_status": status,
+                "next_retry_after": after.get("retry-after"),
+            }
+    finally:
+        signing.admission.caller_limit = signing.admission.enclave_limit = None
+    return results
+
+
+def take_all(path: str, attempts: int) -> int:
+    """Worker process: try ``attempts`` takes from the shared bucket; returns how many were admitted."""
+    store = SQLiteBucketStore(SQLitePool(path, size=1)) if path else MemoryBucketStore()
+    admitted = sum(store.take([("caller:user:shared", Limit(0.001, 20), 1.0)])[0] for _ in range(attempts))
+    store.close()
+    return admitted
+
+
+def shared_store(workers: int, attempts: int) -> Dict[str, Any]:
+    """Total admitted from one bucket across ``workers`` processes, per store."""
+    path = os.path.join(tempfile.mkdtemp(), "rate_limits.db")
+    SQLiteBucketStore(SQLitePool(path, size=1)).close()
+    results = {}
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for name, store_path in (("sqlite", path), ("memory", "")):
+            results[name] = sum(pool.starmap(take_all, [(store_path, attempts)] * workers))
+    return results
+
+
+async def overhead(iterations: int) -> Dict[str, Any]:
+    """Latency of one acquire/release with caller and enclave buckets, per store."""
+    stores = {
+        "memory": MemoryBucketStore(),
+        "sqlite": SQLiteBucketStore(SQLitePool(os.path.join(tempfile.mkdtemp(), "rate_limits.db"), size=2)),
+    }
+    results = {}
+    for name, store in stores.items():
+        controller = AdmissionController(store, Limit(1e9, 1e9), Limit(1e9, 1e9))
+
+        async def admit():
+            controller.release(await controller.acquire("user:bench", {"enclave": 1}))
+
+        results[name] = await measure_async(admit, iterations)
+        store.close()
+    return results
+
+
+def main():
+    """Run the fairness, rate-limit, shared-store and overhead checks and print a summary."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=4, help="length of each contention run")
+    parser.add_argument("--heavy-concurrency", type=int, default=32)
+    parser.add_argument("--enclave-capacity", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub enclave seconds per query")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=2000, help="acquire/release calls timed per store")
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    stub_enclave.LATENCY = args.latency
+    # Binds to the stub server's loop on first contended use
+    stub_enclave.capacity = asyncio.Semaphore(args.enclave_capacity)
+    stub_server, stub_url = serve_in_thread(stub)
+    configure(stub_url, args.enclave_capacity)
+
+    import httpx
+    from app import signing
+
+    async def run() -> Dict[str, Any]:
+        transport = httpx.ASGITransport(app=signing.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=60) as client:
+            results = {
+                "fairness": await fairness(client, signing, args.seconds, args.heavy_concurrency),
+                "rate_limit": await rate_limit(client, signing, args.seconds, args.heavy_concurrency),
+                "full_batches": await full_batches(client, signing),
+                "admission_stats": signing.admission.stats(),
+            }
+        await signing.enclave_client.close()
+        results["overhead"] = await overhead(args.iterations)
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        stub_server.should_exit = True
+    results["shared_store"] = shared_store(args.workers, 40)
+
+    problems = []
+    fair = results["fairness"]
+    if fair["on"]["light"]["p50_ms"] * 2 > fair["off"]["light"]["p50_ms"]:
+        problems.append(
+            f"fair queuing did not halve light caller p50 ({fair['off']['light']['p50_ms']:.0f} -> "
+            f"{fair['on']['light']['p50_ms']:.0f} ms)")
+    limited = results["rate_limit"]
+    if limited["heavy"]["statuses"].get("429", 0) == 0:
+        problems.append("heavy caller was never rate limited")
+    if set(limited["limited_headers"]) != {"ratelimit-limit", "ratelimit-remaining", "ratelimit-reset", "retry-after"}:
+        problems.append(f"429 response lacks rate-limit headers: {limited['limited_headers']}")
+    if limited["light"]["statuses"].get("429", 0):
+        problems.append(f"light caller was rate limited: {limited['light']['statuses']}")
+    for name, batch in results["full_batches"].items():
+        if batch["status"] == 429:
+            problems.append(f"{name} batch of {batch['items']} items was rate limited")
+        if batch["next_status"] != 429 or not (batch["next_retry_after"] or "").isdigit():
+            problems.append(f"call after the {name} batch got {batch['next_status']}, "
+                            f"Retry-After {batch['next_retry_after']}; expected 429 while in debt")
+    shared = results["shared_store"]
+    if shared["sqlite"] != 20:
+        problems.append(f"{args.workers} workers sharing the SQLite store admitted {shared['sqlite']} from a burst of 20")
+    if shared["memory"] != 20 * args.workers:
+        problems.append(f"per-process memory stores admitted {shared['memory']}, expected {20 * args.workers}")
+
+    for label in ("off", "on"):
+        r = fair[label]
+        print(
+            f"admission {label:<3} light p50/p99 {r['light']['p50_ms']:.1f}/{r['light']['p99_ms']:.1f} ms "
+            f"({r['light']['iterations']} calls); heavy p50 {r['heavy']['p50_ms']:.1f} ms ({r['heavy']['iterations']} calls)")
+    print(f"rate limit 5/s: heavy {limited['heavy']['statuses']}, light {limited['light']['statuses']}, "
+          f"429 headers {limited['limited_headers']}")
+    for name, batch in results["full_batches"].items():
+        print(f"full {name} batch ({batch['items']} items): {batch['status']}, "
+              f"next call {batch['next_status']} Retry-After {batch['next_retry_after']}")
+    print(f"shared bucket (burst 20) across {args.workers} workers: sqlite admitted {shared['sqlite']}, "
+          f"memory admitted {shared['memory']}")
+    for name, r in results["overhead"].items():
+        print(f"acquire/release {name:<6} p50/p99 {r['p50_ms'] * 1000:.0f}/{r['p99_ms'] * 1000:.0f} us")
+    for problem in problems:
+        print(f"  {problem}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"results": results, "problems": problems}, output, indent=2)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+import resource
+import statistics
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float], wall_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Latency percentiles (ms) and throughput for per-operation durations in seconds.
+
+    ``wall_seconds`` is the elapsed time of the whole run; pass it when
+    operations overlapped so throughput is not understated.
+    """
+    elapsed = wall_seconds if wall_seconds is not None else sum(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "ops_per_sec": len(samples) / elapsed if elapsed else 0.0,
+    }
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 3) -> Dict[str, Any]:
+    """Time ``iterations`` calls of ``fn`` after ``warmup`` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def measure_async(fn: Callable[[], Awaitable[Any]], iterations: int, concurrency: int = 1, warmup: int = 3) -> Dict[str, Any]:
+    """Time ``iterations`` awaits of ``fn`` with up to ``concurrency`` in flight."""
+    for _ in range(warmup):
+        await fn()
+    samples: List[float] = []
+    remaining = iterations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await fn()
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    result = summarize(samples, time.perf_counter() - started)
+    result["concurrency"] = concurrency
+    return result
+
+
+def peak_rss_kib() -> int:
+    """Peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
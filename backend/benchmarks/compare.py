@@ -0,0 +1,61 @@
+"""
+Compare two benchmark result files and fail on regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+A measurement regresses when its ops/sec drops, or its p99 latency grows,
+by more than ``--threshold`` percent. Exits with status 1 if any did.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.run import iter_summaries
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Tuple[str, str, float, float, float, bool]]:
+    """Return (measurement, metric, baseline, current, change %, regressed) for every shared measurement."""
+    rows = []
+    for case, result in current["results"].items():
+        if case not in baseline["results"]:
+            continue
+        before = dict(iter_summaries(baseline["results"][case]["metrics"]))
+        for path, summary in iter_summaries(result["metrics"]):
+            if path not in before:
+                continue
+            for metric, higher_is_better in (("ops_per_sec", True), ("p99_ms", False)):
+                old, new = before[path][metric], summary[metric]
+                if not old:
+                    continue
+                change = (new - old) / old * 100
+                regressed = (-change if higher_is_better else change) > threshold
+                rows.append((f"{case}.{path}", metric, old, new, change, regressed))
+    return rows
+
+
+def main():
+    """Print a comparison table and exit non-zero on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    for name, metric, old, new, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:<55} {metric:<12} {old:>12.3f} -> {new:>12.3f} ({change:+6.1f}%) {flag}")
+
+    regressions = sum(1 for row in rows if row[-1])
+    print(f"{len(rows)} comparisons, {regressions} regressions over {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
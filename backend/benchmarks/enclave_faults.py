@@ -0,0 +1,214 @@
+"""
+Fault-injection check of enclave circuit breakers, health probing and hedging.
+
+    python -m benchmarks.enclave_faults --seconds 6
+
+Runs the stub enclave under uvicorn, standing in for several enclaves, and
+drives the backend in-process with timeouts scaled down (read timeout
+--read-timeout, breakers open for 1s, health checks every 0.25s):
+
+- outage: enclave "good" answers normally while "bad" hangs past the read
+  timeout. Run once with breakers disabled and once enabled; with breakers,
+  calls to "bad" must fail fast with 503 after the first few, reach the
+  stub far less often, and leave "good" unaffected;
+- recovery: the fault is cleared; the next health check must move the
+  breaker to half-open and trial calls must close it again;
+- hedging: enclave "tail" answers 5% of calls --slow-latency late. The
+  same sequential load runs without and with ENCLAVE_HEDGE_DELAY; hedging
+  must cut p99.
+
+Exits 1 if a check fails.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import summarize
+from benchmarks.stub_enclave import Fault, calls, faults, serve_in_thread, stub
+
+
+def configure(stub_url: str, read_timeout: float) -> None:
+    """Scale the enclave client's timeouts and breaker settings down before the app is imported."""
+    os.environ.update(
+        ENCLAVE_URL_TEMPLATE=stub_url + "/enclaves/{enclaveid}",
+        DB_PATH=os.path.join(tempfile.mkdtemp(), "enclave_mapping.db"),
+        ENCLAVE_READ_TIMEOUT=str(read_timeout),
+        ENCLAVE_MAX_CONNECTIONS_PER_HOST="200",
+        ENCLAVE_BREAKER_MIN_CALLS="5",
+        ENCLAVE_BREAKER_SLOW_SECONDS=str(read_timeout / 2),
+        ENCLAVE_BREAKER_OPEN_SECONDS="1",
+        ENCLAVE_HEALTH_INTERVAL="0.25",
+        ENCLAVE_HEALTH_TIMEOUT=str(read_timeout / 2),
+        ENCLAVE_HEDGE_MAX_RATIO="0.2",
+        RATE_LIMIT_CALLER_RATE="0",
+        RATE_LIMIT_ENCLAVE_RATE="0",
+    )
+
+
+async def query(client, enclaveid: str) -> Tuple[float, int, float]:
+    """One /process-query/ call; returns (seconds, status code, Retry-After seconds or 0)."""
+    started = time.perf_counter()
+    response = await client.post(
+        "/process-query/", params={"encrypted_query": "q", "signed_query": "s", "enclaveid": enclaveid})
+    return time.perf_counter() - started, response.status_code, float(response.headers.get("retry-after", 0))
+
+
+async def load(client, enclaveid: str, seconds: float, concurrency: int) -> List[Tuple[float, int]]:
+    """Keep ``concurrency`` queries to one enclave in flight for ``seconds``, honouring Retry-After like a client would."""
+    deadline = time.perf_counter() + seconds
+    outcomes: List[Tuple[float, int, float]] = []
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            outcome = await query(client, enclaveid)
+            outcomes.append(outcome)
+            # Also yields to the loop: a call rejected in-process never suspends on its own
+            await asyncio.sleep(min(outcome[2], max(0.0, deadline - time.perf_counter())))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return outcomes
+
+
+def describe(outcomes: List[Tuple[float, int, float]]) -> Dict[str, Any]:
+    """Latency summary plus counts per status code."""
+    statuses: Dict[str, int] = {}
+    for _, status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {**summarize([seconds for seconds, _, _ in outcomes]), "statuses": statuses}
+
+
+async def outage(client, signing, seconds: float, concurrency: int, breakers: bool) -> Dict[str, Any]:
+    """Load a healthy and a hanging enclave side by side."""
+    signing.enclave_client.breakers.enabled = breakers
+    good, bad = ("good", "bad") if breakers else ("good-nobreaker", "bad-nobreaker")
+    faults[bad] = Fault(latency=3600)
+    before = calls[bad, "process-query"]
+    started = time.perf_counter()
+    good_outcomes, bad_outcomes = await asyncio.gather(
+        load(client, good, seconds, concurrency), load(client, bad, seconds, concurrency))
+    return {
+        "breakers": breakers,
+        "seconds": time.perf_counter() - started,
+        "good": describe(good_outcomes),
+        "bad": describe(bad_outcomes),
+        "bad_calls_reaching_enclave": calls[bad, "process-query"] - before,
+        "bad_breaker": signing.enclave_client.breakers.get(bad).stats() if breakers else None,
+    }
+
+
+async def recovery(client, signing, timeout: float = 5.0) -> Dict[str, Any]:
+    """Clear the fault and time how long the breaker takes to close again."""
+    faults.pop("bad", None)
+    breaker = signing.enclave_client.breakers.get("bad")
+    started = time.perf_counter()
+    states = [breaker.state]
+    while time.perf_counter() - started < timeout:
+        _, status, _ = await query(client, "bad")
+        if breaker.state != states[-1]:
+            states.append(breaker.state)
+        if breaker.state == "closed" and status == 200:
+            break
+        await asyncio.sleep(0.05)
+    return {"states": states, "closed": breaker.state == "closed", "seconds": time.perf_counter() - started}
+
+
+async def hedging(client, signing, requests: int, slow_latency: float, hedge_delay: float) -> Dict[str, Any]:
+    """Sequential queries to an enclave with a slow tail, without and with hedging."""
+    results = {}
+    for label, delay in (("off", 0.0), ("on", hedge_delay)):
+        enclaveid = f"tail-{label}"
+        faults[enclaveid] = Fault(slow_rate=0.05, slow_latency=slow_latency)
+        signing.enclave_client.hedge_delay = delay
+        hedges_before = signing.enclave_client.hedges
+        outcomes = [await query(client, enclaveid) for _ in range(requests)]
+        results[label] = {**describe(outcomes), "hedges": signing.enclave_client.hedges - hedges_before}
+    signing.enclave_client.hedge_delay = 0.0
+    return results
+
+
+def main():
+    """Run the outage, recovery and hedging scenarios and print a summary."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=6, help="length of each outage run")
+    parser.add_argument("--concurrency", type=int, default=8, help="queries in flight per enclave")
+    parser.add_argument("--read-timeout", type=float, default=1.0)
+    parser.add_argument("--hedge-requests", type=int, default=400)
+    parser.add_argument("--slow-latency", type=float, default=0.3)
+    parser.add_argument("--hedge-delay", type=float, default=0.03)
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    stub_server, stub_url = serve_in_thread(stub)
+    configure(stub_url, args.read_timeout)
+
+    import httpx
+    from app import signing
+
+    async def run() -> Dict[str, Any]:
+        signing.enclave_health.start()
+        transport = httpx.ASGITransport(app=signing.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=60) as client:
+            results = {
+                "without_breakers": await outage(client, signing, args.seconds, args.concurrency, breakers=False),
+                "with_breakers": await outage(client, signing, args.seconds, args.concurrency, breakers=True),
+            }
+            results["recovery"] = await recovery(client, signing)
+            results["hedging"] = await hedging(client, signing, args.hedge_requests, args.slow_latency, args.hedge_delay)
+            results["metrics"] = [
+                line for line in (await client.get("/metrics")).text.splitlines()
+                if line.startswith(("enclave_breaker_state{", "enclave_health_up{")) and "bad\"" in line
+            ]
+        await signing.enclave_health.stop()
+        await signing.enclave_client.close()
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        stub_server.should_exit = True
+
+    problems = []
+    without, with_ = results["without_breakers"], results["with_breakers"]
+    if with_["bad_breaker"]["times_opened"] == 0:
+        problems.append("breaker of the hanging enclave never opened")
+    if with_["bad"]["p50_ms"] > 50:
+        problems.append(f"calls to the hanging enclave still took {with_['bad']['p50_ms']:.0f} ms (p50) with breakers")
+    if with_["bad"]["statuses"].get("503", 0) == 0:
+        problems.append("no call to the hanging enclave was rejected with 503")
+    if with_["bad_calls_reaching_enclave"] * 2 > without["bad_calls_reaching_enclave"]:
+        problems.append("breaker did not cut calls reaching the hanging enclave by half")
+    if with_["good"]["p99_ms"] > max(250, 2 * without["good"]["p99_ms"]):
+        problems.append(f"healthy enclave p99 {with_['good']['p99_ms']:.0f} ms during the outage")
+    if not results["recovery"]["closed"]:
+        problems.append(f"breaker did not close after the fault cleared: {results['recovery']['states']}")
+    hedge = results["hedging"]
+    if hedge["on"]["p99_ms"] * 2 > hedge["off"]["p99_ms"]:
+        problems.append(f"hedging did not halve p99 ({hedge['off']['p99_ms']:.0f} -> {hedge['on']['p99_ms']:.0f} ms)")
+
+    for name in ("without_breakers", "with_breakers"):
+        r = results[name]
+        print(
+            f"{name:<17} good p50/p99 {r['good']['p50_ms']:.1f}/{r['good']['p99_ms']:.1f} ms; "
+            f"bad p50/p99 {r['bad']['p50_ms']:.1f}/{r['bad']['p99_ms']:.1f} ms {r['bad']['statuses']}, "
+            f"{r['bad_calls_reaching_enclave']} calls reached the enclave"
+        )
+    print(f"recovery: {' -> '.join(results['recovery']['states'])} in {results['recovery']['seconds']:.2f}s")
+    for label in ("off", "on"):
+        h = hedge[label]
+        print(f"hedging {label:<3} p50/p99 {h['p50_ms']:.1f}/{h['p99_ms']:.1f} ms, {h['hedges']} hedges")
+    for problem in problems:
+        print(f"  {problem}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"results": results, "problems": problems}, output, indent=2)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare version 2 envelope encryption with RSA-only encryption across payload sizes.
+
+Run from the backend directory:
+
+    python -m benchmarks.envelope [--iterations N] [--rsa-max-bytes N]
+
+Each measurement is one round trip: encrypt for the recipient's RSA-2048
+key and decrypt with its private key, as the enclave and client do for a
+query or a result. RSA-OAEP alone fits 190 bytes per operation, so larger
+RSA-only payloads are split into 190-byte blocks, one RSA operation each;
+the envelope does one RSA operation per message whatever its size.
+"""
+import argparse
+import os
+from typing import Any, Dict
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core.envelope import OAEP, open_envelope, seal
+from benchmarks.common import measure
+
+# Largest plaintext one RSA-2048 OAEP-SHA256 operation can take
+RSA_BLOCK_BYTES = 190
+
+PAYLOAD_SIZES = (100, 1024, 16 * 1024, 256 * 1024, 1024 * 1024, 16 * 1024 * 1024)
+
+
+def rsa_only_round_trip(private_key: rsa.RSAPrivateKey, plaintext: bytes) -> bytes:
+    """Encrypt and decrypt ``plaintext`` block by block with RSA-OAEP alone."""
+    public_key = private_key.public_key()
+    blocks = [public_key.encrypt(plaintext[i:i + RSA_BLOCK_BYTES], OAEP) for i in range(0, len(plaintext), RSA_BLOCK_BYTES)]
+    return b"".join(private_key.decrypt(block, OAEP) for block in blocks)
+
+
+def run(iterations: int = 50, rsa_max_bytes: int = 256 * 1024) -> Dict[str, Any]:
+    """Round-trip latency of both schemes per payload size; RSA-only stops above ``rsa_max_bytes``."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = private_key.public_key()
+    results = {}
+    for size in PAYLOAD_SIZES:
+        plaintext = os.urandom(size)
+        count = max(3, min(iterations, iterations * 16 * 1024 // size))
+        result = {
+            "envelope": measure(lambda: open_envelope(private_key, seal(public_key, plaintext)), count, warmup=1),
+            "envelope_bytes": len(seal(public_key, plaintext)),
+        }
+        if size <= rsa_max_bytes:
+            result["rsa_only"] = measure(lambda: rsa_only_round_trip(private_key, plaintext), max(1, count // 4), warmup=0)
+            result["rsa_operations"] = 2 * -(-size // RSA_BLOCK_BYTES)
+        results[size] = result
+    return results
+
+
+def main():
+    """Print round-trip latency and speedup per payload size."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--rsa-max-bytes", type=int, default=256 * 1024, help="largest payload measured RSA-only")
+    args = parser.parse_args()
+
+    print(f"{'payload':>10} {'envelope ms':>12} {'MB/s':>8} {'rsa-only ms':>12} {'speedup':>8}")
+    for size, result in run(args.iterations, args.rsa_max_bytes).items():
+        envelope_ms = result["envelope"]["p50_ms"]
+        line = f"{size:>10} {envelope_ms:>12.2f} {size / envelope_ms / 1000:>8.1f}"
+        if "rsa_only" in result:
+            rsa_ms = result["rsa_only"]["p50_ms"]
+            line += f" {rsa_ms:>12.2f} {rsa_ms / envelope_ms:>7.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare certificate issuance throughput across CA key algorithms.
+
+Run from the backend directory:
+
+    python -m benchmarks.issuance [--iterations N]
+"""
+import argparse
+import base64
+from typing import Any, Dict
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.core.certificates import (
+    KeyAlgorithm, build_ca_certificate, build_user_certificate, decode_csr, generate_ca_key,
+)
+from benchmarks.common import measure
+
+
+def make_csr_b64(common_name: str = "bench-user") -> str:
+    """Build a base64 encoded PEM CSR the way the frontend sends it."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    csr = (
+        x509.CertificateSigningRequestBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)]))
+        .sign(key, hashes.SHA256())
+    )
+    return base64.b64encode(csr.public_bytes(serialization.Encoding.PEM)).decode()
+
+
+def run(iterations: int = 200) -> Dict[str, Any]:
+    """Measure CA key generation and CSR parse+sign for every supported algorithm."""
+    csr_b64 = make_csr_b64()
+    results = {}
+    for algorithm in KeyAlgorithm:
+        ca_key = generate_ca_key(algorithm)
+        ca_cert = build_ca_certificate(ca_key, "bench-ca")
+        results[algorithm.value] = {
+            "keygen": measure(lambda: generate_ca_key(algorithm), max(5, iterations // 20), warmup=1),
+            "issue": measure(lambda: build_user_certificate(decode_csr(csr_b64), ca_key, ca_cert), iterations),
+        }
+    return results
+
+
+def main():
+    """Print issuance and key generation throughput per algorithm."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'algorithm':<12} {'issue ops/s':>12} {'issue p99 ms':>13} {'keygen ops/s':>13}")
+    for algorithm, result in run(args.iterations).items():
+        print(f"{algorithm:<12} {result['issue']['ops_per_sec']:>12.1f} {result['issue']['p99_ms']:>13.3f} {result['keygen']['ops_per_sec']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Stress test of parallel enclave provisioning against the fake ev CLI.
+
+    python -m benchmarks.provisioning_stress --enclaves 32 --delay 0.2
+
+Queues N /generate-ca jobs at once with PROVISIONING_MAX_CONCURRENCY=N and
+checks that they did not interfere: every job succeeds, each workspace held
+the index.js, package.json, ev_calls.log and enclave.eif of its own enclave
+only (recorded as the last stage ends) and was deleted once the job
+succeeded, every CA mapping points at that enclave's own files and certificate,
+a second submit for a busy enclave is rejected, and the process cwd never
+moves. Then it redeploys every enclave with rotate_ca=false, which must take
+each image from the build cache instead of running ev enclave build again.
+Exits 1 and lists the violations if any check fails.
+
+All state (database, CA files, workspaces) goes to a scratch directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+FAKE_EV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test", "fake_ev.py")
+
+
+def configure(scratch: str, enclaves: int, delay: float) -> None:
+    """Point every provisioning path at ``scratch`` before the app is imported."""
+    base_dir = os.path.join(scratch, "base-enclave")
+    os.makedirs(base_dir)
+    with open(os.path.join(base_dir, "Dockerfile"), "w") as dockerfile:
+        dockerfile.write("FROM node:18-alpine\n")
+    os.environ.update(
+        STORAGE_BACKEND="sqlite",
+        DB_PATH=os.path.join(scratch, "enclave_mapping.db"),
+        CA_DIR=os.path.join(scratch, "ca"),
+        ARTIFACT_DIR=os.path.join(scratch, "artifacts"),
+        BUILD_CACHE_DIR=os.path.join(scratch, "build-cache"),
+        BUILD_CACHE_MAX_ENTRIES=str(enclaves),
+        PROVISIONING_WORKSPACE_ROOT=os.path.join(scratch, "workspaces"),
+        ENCLAVE_BASE_DIR=base_dir,
+        PROVISIONING_MAX_CONCURRENCY=str(enclaves),
+        EV_CLI=f"{shlex.quote(sys.executable)} {shlex.quote(FAKE_EV)}",
+        FAKE_EV_DELAY=str(delay),
+    )
+
+
+# Workspace files recorded per job id before the job deletes its workspace
+WORKSPACE_FILES = ("index.js", "package.json", "ev_calls.log", "enclave.eif", "Dockerfile")
+
+
+def record_workspaces(jobs) -> Dict[str, Dict[str, str]]:
+    """Wrap the last provisioning stage so it records the workspace files once it has run."""
+    snapshots: Dict[str, Dict[str, str]] = {}
+    name, last_stage = jobs.stages[-1]
+
+    async def recording(job):
+        await last_stage(job)
+        snapshots[job.id] = {}
+        for file_name in WORKSPACE_FILES:
+            path = os.path.join(job.workdir, file_name)
+            if os.path.exists(path):
+                with open(path) as f:
+                    snapshots[job.id][file_name] = f.read()
+
+    jobs.stages[-1] = (name, recording)
+    return snapshots
+
+
+def check_enclave(signing, enclaveid: str, job, files: Dict[str, str], others: List[str], image: str = None) -> List[str]:
+    """Violations found in one enclave's recorded workspace ``files`` and CA mapping; ``image`` is the expected cached EIF."""
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+
+    problems = []
+    if job.status != "succeeded":
+        return [f"{enclaveid}: job {job.id} {job.status}: {[s.error for s in job.stages if s.error]}"]
+
+    if os.path.exists(job.workdir):
+        problems.append(f"{enclaveid}: workspace of succeeded job {job.id} was not deleted")
+
+    def read(name: str) -> str:
+        return files.get(name, "")
+
+    private_key_path, certificate_path = signing.ca_file_paths(enclaveid)
+    with open(certificate_path) as f:
+        cert_pem = f.read().strip()
+    cert = x509.load_pem_x509_certificate(cert_pem.encode())
+    if cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value != enclaveid:
+        problems.append(f"{enclaveid}: CA certificate issued for another enclave")
+
+    index_js = read("index.js")
+    if cert_pem.replace("\n", "\\n") not in index_js:
+        problems.append(f"{enclaveid}: index.js does not embed its own CA certificate")
+    package_json = json.loads(read("package.json"))
+    if enclaveid not in json.dumps(package_json):
+        problems.append(f"{enclaveid}: package.json is not named after the enclave")
+    if any(f'"{other}"' in read("package.json") for other in others):
+        problems.append(f"{enclaveid}: package.json mentions another enclave")
+    if "Dockerfile" not in files:
+        problems.append(f"{enclaveid}: base project was not copied into the workspace")
+
+    calls = read("ev_calls.log").splitlines()
+    if len(calls) != (2 if image else 3) or f"--name {enclaveid} " not in calls[0] + " ":
+        problems.append(f"{enclaveid}: unexpected ev calls {calls}")
+    if read("enclave.eif") != (image or f"fake eif for {job.workdir}"):
+        problems.append(f"{enclaveid}: enclave.eif was built for another enclave")
+    if job.result.get("build_cache") != ("hit" if image else "miss"):
+        problems.append(f"{enclaveid}: build cache {job.result.get('build_cache')}")
+
+    record = signing.repository.get_ca_record(enclaveid)
+    if record is None or (record.private_key_path, record.certificate_path) != (private_key_path, certificate_path):
+        problems.append(f"{enclaveid}: CA mapping {record} does not point at its own files")
+    return problems
+
+
+def main():
+    """Provision the enclaves in parallel and verify their isolation."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enclaves", type=int, default=16, help="enclaves provisioned in parallel")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds each fake ev call takes")
+    parser.add_argument("--key-algorithm", default="ecdsa-p256", choices=["rsa-2048", "ecdsa-p256", "ed25519"])
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="provisioning-stress-")
+    configure(scratch, args.enclaves, args.delay)
+    cwd = os.getcwd()
+
+    import httpx
+    from app import signing
+
+    signing.init_db()
+    snapshots = record_workspaces(signing.provisioning_jobs)
+    enclave_ids = [f"stress-{i:04d}" for i in range(args.enclaves)]
+
+    async def provision(client, **params):
+        """Submit one job per enclave at once and wait for all of them; returns (jobs, seconds, busy-enclave response)."""
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post(f"/generate-ca/{enclaveid}", params={"key_algorithm": args.key_algorithm, **params})
+            for enclaveid in enclave_ids
+        ))
+        jobs = [signing.provisioning_jobs.get(response.raise_for_status().json()["job_id"]) for response in responses]
+        duplicate = await client.post(f"/generate-ca/{enclave_ids[0]}", params={"key_algorithm": args.key_algorithm})
+        while any(job.status in ("queued", "running") for job in jobs):
+            await asyncio.sleep(0.05)
+        return jobs, time.perf_counter() - started, duplicate
+
+    async def run() -> Dict[str, Any]:
+        transport = httpx.ASGITransport(app=signing.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+            jobs, wall_seconds, duplicate = await provision(client)
+            invalid = await client.post("/generate-ca/..%2Fescape")
+            images = {
+                enclaveid: snapshots[job.id]["enclave.eif"]
+                for enclaveid, job in zip(enclave_ids, jobs) if "enclave.eif" in snapshots.get(job.id, {})
+            }
+            redeploys, redeploy_seconds, _ = await provision(client, rotate_ca="false")
+            cache_stats = (await client.get("/build-cache/stats")).json()
+            await signing.provisioning_jobs.shutdown()
+
+        problems = []
+        if duplicate.status_code != 409:
+            problems.append(f"second submit for a busy enclave returned {duplicate.status_code}, expected 409")
+        if invalid.status_code not in (404, 422):
+            problems.append(f"path-like enclave id returned {invalid.status_code}, expected 404 or 422")
+        if len({job.workdir for job in jobs}) != len(jobs):
+            problems.append("jobs shared a workspace")
+        for enclaveid, job, redeploy in zip(enclave_ids, jobs, redeploys):
+            others = [other for other in enclave_ids if other != enclaveid]
+            problems.extend(check_enclave(signing, enclaveid, job, snapshots.get(job.id, {}), others))
+            if redeploy.result.get("ca") != "reused":
+                problems.append(f"{enclaveid}: redeploy did not keep the CA ({redeploy.result.get('ca')})")
+            problems.extend(check_enclave(signing, enclaveid, redeploy, snapshots.get(redeploy.id, {}), others, images.get(enclaveid)))
+        if os.getcwd() != cwd:
+            problems.append(f"process cwd moved from {cwd} to {os.getcwd()}")
+
+        # Three ev calls per job; fully serialized provisioning would take at least this long
+        serial_seconds = 3 * args.delay * len(jobs)
+        return {
+            "enclaves": len(jobs),
+            "wall_seconds": wall_seconds,
+            "serial_lower_bound_seconds": serial_seconds,
+            "speedup": serial_seconds / wall_seconds if wall_seconds else None,
+            "redeploy_seconds": redeploy_seconds,
+            "build_cache": cache_stats["builds"],
+            "artifacts": cache_stats["artifacts"],
+            "scratch": scratch,
+            "problems": problems,
+        }
+
+    results = asyncio.run(run())
+    print(
+        f"{results['enclaves']} enclaves in {results['wall_seconds']:.2f}s "
+        f"(serialized >= {results['serial_lower_bound_seconds']:.2f}s, speedup {results['speedup']:.1f}x); "
+        f"redeployed from the build cache in {results['redeploy_seconds']:.2f}s "
+        f"({results['build_cache']['hits']} hits, {results['build_cache']['misses']} misses); "
+        f"{len(results['problems'])} problems"
+    )
+    for problem in results["problems"]:
+        print(f"  {problem}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    sys.exit(1 if results["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Run the backend benchmark suite offline and write the results as JSON.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --cases csr_issue,get_db
+    python -m benchmarks.compare baseline.json bench.json --threshold 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict
+
+from benchmarks.common import peak_rss_kib
+from benchmarks.suite import CASES, marketplace_cases
+
+DEFAULT_ROWS = "1000,100000,1000000"
+QUICK_ROWS = "1000,10000"
+
+
+def run_case(name: str, iterations: int, rows: int = None) -> Dict[str, Any]:
+    """Run one case in a scratch directory; executed in a fresh process."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    os.chdir(workdir)
+    os.environ["DB_PATH"] = os.path.join(workdir, "Backend", "enclave_mapping.db")
+    # Cases drive the backend from one address far above any per-caller rate: buckets off, fair queue on
+    os.environ.setdefault("RATE_LIMIT_CALLER_RATE", "0")
+    os.environ.setdefault("RATE_LIMIT_ENCLAVE_RATE", "0")
+
+    cases = {**CASES, **marketplace_cases([rows] if rows else [])}
+    fn, kwargs = cases[name]
+    started = time.perf_counter()
+    metrics = fn(iterations, **kwargs)
+    return {"metrics": metrics, "seconds": time.perf_counter() - started, "peak_rss_kib": peak_rss_kib()}
+
+
+def git_revision() -> str:
+    """Current git commit, or 'unknown' outside a checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    """Run the selected cases, print a summary and write JSON results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", help="comma separated case names (default: all)")
+    parser.add_argument("--rows", help=f"marketplace table sizes (default: {DEFAULT_ROWS})")
+    parser.add_argument("--iterations", type=int, default=200, help="base iteration count per measurement")
+    parser.add_argument("--quick", action="store_true", help=f"fewer iterations and rows={QUICK_ROWS}")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    iterations = 50 if args.quick else args.iterations
+    rows = [int(r) for r in (args.rows or (QUICK_ROWS if args.quick else DEFAULT_ROWS)).split(",")]
+    available = {**{name: None for name in CASES}, **{f"marketplace_{r}": r for r in rows}}
+    selected = args.cases.split(",") if args.cases else list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}; available: {', '.join(available)}")
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in selected:
+        print(f"running {name}...", file=sys.stderr)
+        # A fresh process per case isolates peak RSS and module-level state
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(run_case, name, iterations, available[name]).result()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    for name, result in results.items():
+        print(f"{name}: {result['seconds']:.1f}s, peak RSS {result['peak_rss_kib'] / 1024:.1f} MiB")
+        for path, summary in iter_summaries(result["metrics"]):
+            print(f"  {path:<40} p50 {summary['p50_ms']:>9.3f} ms  p99 {summary['p99_ms']:>9.3f} ms  {summary['ops_per_sec']:>10.1f} ops/s")
+    print(f"results written to {args.output}", file=sys.stderr)
+
+
+def iter_summaries(metrics: Dict[str, Any], prefix: str = ""):
+    """Yield (path, summary) for every latency summary nested in a case's metrics."""
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            path = f"{prefix}{key}"
+            if "ops_per_sec" in value and "p99_ms" in value:
+                yield path, value
+            else:
+                yield from iter_summaries(value, path + ".")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Common benchmark harness for the storage backends.
+
+    python -m benchmarks.storage --backends memory,sqlite --rows 100000
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.storage --backends postgres
+
+Each backend gets the same workload: batched dataset inserts, CA mapping
+lookups, first/filtered/deep marketplace pages, a full streaming scan and
+whitelist access checks.
+Compare the tables to pick the backend for a deployment.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import measure
+
+BACKENDS = ("memory", "sqlite", "postgres")
+
+
+def open_backend(name: str, workdir: str):
+    """A fresh repository of the given backend, or None if it is not configured here."""
+    from app.core.sqlite_pool import SQLitePool
+    from app.core.storage import InMemoryRepository, PostgresRepository, SQLiteRepository
+
+    if name == "memory":
+        return InMemoryRepository()
+    if name == "sqlite":
+        return SQLiteRepository(SQLitePool(os.path.join(workdir, "bench.db")))
+    if name == "postgres":
+        dsn = os.getenv("BENCH_DATABASE_URL")
+        return PostgresRepository(dsn) if dsn else None
+    raise ValueError(f"Unknown backend {name}")
+
+
+def bench_backend(repository, iterations: int, rows: int) -> Dict[str, Any]:
+    """Run the shared workload against one repository."""
+    from app.core.storage import CARecord
+    from benchmarks.suite import seed_datasets
+
+    repository.init_schema()
+    started = time.perf_counter()
+    seed_datasets(repository, rows)
+    insert_seconds = time.perf_counter() - started
+
+    for i in range(100):
+        repository.upsert_ca_record(f"enclave-{i}", CARecord(f"/keys/{i}.pem", f"/certs/{i}.pem", "rsa-2048"))
+    lookups = iter(range(10 ** 9))
+    checks = iter(range(10 ** 9))
+
+    def access():
+        i = next(checks)
+        repository.can_access(1 + i % rows, f"user-{i % 1000}@example.com")
+
+    def scan():
+        for _ in repository.iter_datasets(batch_size=500):
+            pass
+
+    return {
+        "rows": rows,
+        "insert_rows_per_sec": rows / insert_seconds if insert_seconds else 0.0,
+        "get_ca_record": measure(lambda: repository.get_ca_record(f"enclave-{next(lookups) % 100}"), iterations * 10),
+        "first_page": measure(lambda: repository.list_datasets(limit=100), iterations),
+        "filtered_page": measure(lambda: repository.list_datasets(limit=100, organization="org-7", is_public=False), iterations),
+        "prefix_page": measure(lambda: repository.list_datasets(limit=100, name_prefix="dataset-0000"), iterations),
+        "deep_page": measure(lambda: repository.list_datasets(after_id=rows // 2, limit=100), iterations),
+        "full_scan": measure(scan, max(1, min(iterations, 100_000 // rows)), warmup=0),
+        "can_access": measure(access, iterations * 10),
+        "can_access_enclave": measure(lambda: repository.can_access_enclave(f"enclave-{next(checks) % rows}", "user-1@example.com"), iterations * 10),
+        "stats": repository.stats(),
+    }
+
+
+def bench_storage(iterations: int, rows: int = 10000, backends: List[str] = BACKENDS) -> Dict[str, Any]:
+    """Run the workload on every available backend; unconfigured backends are skipped."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-storage-") as workdir:
+        for name in backends:
+            repository = open_backend(name, workdir)
+            if repository is None:
+                results[name] = {"skipped": "BENCH_DATABASE_URL not set"}
+                continue
+            try:
+                results[name] = bench_backend(repository, iterations, rows)
+            finally:
+                repository.close()
+    return results
+
+
+def main():
+    """Run the storage harness and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    results = bench_storage(args.iterations, args.rows, args.backends.split(","))
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name}: skipped ({result['skipped']})")
+            continue
+        print(f"{name}: {result['insert_rows_per_sec']:.0f} rows/s inserted")
+        for operation in ("get_ca_record", "first_page", "filtered_page", "prefix_page", "deep_page", "full_scan", "can_access", "can_access_enclave"):
+            summary = result[operation]
+            print(f"  {operation:<18} p50 {summary['p50_ms']:>9.3f} ms  p99 {summary['p99_ms']:>9.3f} ms  {summary['ops_per_sec']:>10.1f} ops/s")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Check that every storage backend answers the same operations the same way.
+
+    python -m benchmarks.storage_conformance
+    DATABASE_URL=postgresql://... python -m benchmarks.storage_conformance
+
+Runs one script of repository calls (CA mappings, dataset inserts and
+filtered pages, access checks, access requests and their decisions, the
+certificate registry) on the memory, sqlite and, when DATABASE_URL is set,
+postgres backends, and compares each result with the memory backend's.
+Postgres runs in a scratch schema that is dropped afterwards. Values
+containing ``%``, ``%s`` and ``_`` go through every parameterized query.
+
+Against postgres it also checks placeholder rewriting for prepared
+statements (``%%`` and a literal ``%%s``) and that --threads threads sharing
+a pool of --pool-size connections all get one instead of an error.
+
+Exits 1 if a result differs or a check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from typing import Any, Dict, List
+
+from app.core.storage import AccessStatus, CARecord, IssuedCertificate
+from benchmarks.suite import synthetic_dataset
+
+# Fields that hold the time of the call, or an id from a sequence that conflicting
+# upserts may advance, rather than anything the backend decided
+UNCOMPARED_FIELDS = ("id", "created_at", "updated_at", "revoked_at")
+
+
+def awkward_dataset(i: int) -> Dict[str, Any]:
+    """A synthetic dataset whose text is full of characters special to SQL, LIKE and psycopg2."""
+    dataset = synthetic_dataset(i, organizations=3)
+    dataset["dataset_name"] = f"100%_s %s {i:04d}"
+    dataset["description"] = "50%% off; '%s' -- not a placeholder"
+    dataset["sample_queries"] = ["SELECT * FROM t WHERE name LIKE 'a%'", "SELECT '%s'"]
+    return dataset
+
+
+def comparable(value: Any) -> Any:
+    """``value`` without ``UNCOMPARED_FIELDS``, so results of different backends compare equal."""
+    if isinstance(value, IssuedCertificate):
+        return value._replace(revoked_at=None)
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items() if key not in UNCOMPARED_FIELDS}
+    if isinstance(value, (list, tuple)) and not hasattr(value, "_fields"):
+        return [comparable(item) for item in value]
+    return value
+
+
+def run_script(repository) -> Dict[str, Any]:
+    """Run the shared script of calls on a fresh repository; returns each call's result by name."""
+    repository.init_schema()
+    repository.init_schema()
+    results: Dict[str, Any] = {}
+
+    repository.upsert_ca_record("enclave-%s", CARecord("/keys/100%.pem", "/certs/a.pem", "rsa-2048"))
+    repository.upsert_ca_record("enclave-%s", CARecord("/keys/100%.pem", "/certs/b.pem", "ec-p256"))
+    results["ca_record"] = repository.get_ca_record("enclave-%s")
+    results["ca_record_missing"] = repository.get_ca_record("enclave-%%")
+
+    results["inserted"] = repository.insert_datasets([synthetic_dataset(i, organizations=3) for i in range(40)])
+    repository.insert_dataset(awkward_dataset(40))
+    results["inserted"] += repository.insert_datasets([awkward_dataset(i) for i in range(41, 50)])
+    results["first_page"] = repository.list_datasets(limit=7)
+    results["deep_page"] = repository.list_datasets(after_id=30, limit=100)
+    results["filtered_page"] = repository.list_datasets(organization="org-1", is_public=False)
+    results["prefix_page"] = repository.list_datasets(name_prefix="100%_s %s 004")
+    results["wildcard_prefix"] = repository.list_datasets(name_prefix="dataset-%")
+    results["columns"] = repository.list_datasets(limit=5, columns=["dataset_name", "whitelistEmails"])
+    results["batches"] = [len(batch) for batch in repository.iter_datasets(batch_size=8)]
+    results["limited_batches"] = [len(batch) for batch in repository.iter_datasets(limit=20, batch_size=8)]
+
+    results["can_access"] = [
+        repository.can_access(dataset_id, email)
+        for dataset_id in (1, 2, 42, 1000)
+        for email in ("user-1@example.com", "USER-2@example.com", "%@example.com")
+    ]
+    results["can_access_enclave"] = [
+        repository.can_access_enclave(enclave_id, email)
+        for enclave_id in ("enclave-0", "enclave-1", "enclave-%")
+        for email in ("user-1@example.com", "user-2@example.com", "%")
+    ]
+
+    first = repository.add_access_request("enclave-3", " Reader@Example.com ")
+    again = repository.add_access_request("enclave-3", "reader@example.com")
+    other = repository.add_access_request("enclave-3", "100%@example.com")
+    results["access_requests"] = [first, again, other]
+    decision = repository.decide_access_requests("enclave-3", [first["id"]], [other["id"], 999])
+    emails = {first["id"]: first["email"], other["id"]: other["email"], 999: "unknown"}
+    results["decision"] = [[emails[request_id] for request_id in ids] for ids in decision]
+    results["approved_access"] = repository.can_access_enclave("enclave-3", "reader@example.com")
+    results["pending"] = repository.list_access_requests(enclave_id="enclave-3", status=AccessStatus.PENDING)
+    results["listed"] = repository.list_access_requests(enclave_id="enclave-3")
+    repository.decide_access_requests("enclave-3", [], [first["id"]])
+    results["denied_access"] = repository.can_access_enclave("enclave-3", "reader@example.com")
+    results["asked_again"] = [
+        repository.add_access_request("enclave-3", "reader@example.com"),
+        repository.add_access_request("enclave-3", "100%@example.com"),
+    ]
+    results["asked_again_access"] = repository.can_access_enclave("enclave-3", "reader@example.com")
+    try:
+        repository.decide_access_requests("enclave-3", [first["id"]], [first["id"]])
+        results["conflicting_decision"] = "accepted"
+    except ValueError:
+        results["conflicting_decision"] = "ValueError"
+
+    certificates = [
+        IssuedCertificate(f"{i:040x}", f"enclave-{i % 2}", f"CN=user {i}%s", 1000.0 + i, 2000.0 + i)
+        for i in range(6)
+    ]
+    results["recorded"] = repository.record_certificates(certificates)
+    results["recorded_again"] = repository.record_certificates(certificates[:2])
+    results["certificate"] = repository.get_certificate(certificates[4].serial)
+    results["certificate_missing"] = repository.get_certificate("f" * 40)
+    results["revoked"] = repository.revoke_certificates([certificates[1].serial, certificates[2].serial, "0"], "key%Compromise")
+    results["revoked_again"] = repository.revoke_certificates([certificates[1].serial])
+    results["revoked_list"] = repository.list_revoked_certificates()
+    results["revoked_list_enclave"] = repository.list_revoked_certificates(enclave_id="enclave-0")
+    batches = list(repository.iter_certificate_serials(issued_after=1001.0, batch_size=2))
+    # Batches are at most batch_size long; their order is up to the backend
+    results["serials"] = (max(map(len, batches)), sorted(serial for batch in batches for serial in batch))
+    return {name: comparable(value) for name, value in results.items()}
+
+
+def check_placeholders(repository) -> List[str]:
+    """Prepared statements must return what psycopg2 itself returns for the same SQL, and bad SQL must be refused."""
+    problems = []
+    statements = [
+        ("SELECT %s || '%%s' || '%%'", ["a"]),
+        ("SELECT '100%%' LIKE %s, %s::text", ["100%", "%s"]),
+        ("SELECT %s::int + %s::int", [1, 2]),
+    ]
+    with repository.connection() as conn, conn.cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            expected = cursor.fetchall()
+            for attempt in ("prepare", "execute"):
+                repository._execute(cursor, sql, params)
+                got = cursor.fetchall()
+                if got != expected:
+                    problems.append(f"{sql!r} ({attempt}) returned {got}, psycopg2 returned {expected}")
+    for sql, params in (("SELECT %s", [1, 2]), ("SELECT %d", [1])):
+        try:
+            with repository.connection() as conn, conn.cursor() as cursor:
+                repository._execute(cursor, sql, params)
+            problems.append(f"{sql!r} with {params} was accepted")
+        except ValueError:
+            pass
+    return problems
+
+
+def check_threads(repository, threads: int, calls: int) -> List[str]:
+    """Many threads sharing the pool and its prepared statements must all succeed."""
+    errors: List[str] = []
+    expected = repository.list_datasets(limit=10)
+
+    def work(n: int):
+        try:
+            for i in range(calls):
+                if repository.list_datasets(limit=10) != expected:
+                    errors.append("list_datasets returned a different page under concurrency")
+                repository.can_access(1 + (n + i) % 50, "user-1@example.com")
+                repository.get_ca_record("enclave-%s")
+        except Exception as e:  # noqa: BLE001 - reported below
+            errors.append(f"{type(e).__name__}: {e}")
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(set(errors))
+
+
+def main():
+    """Run the script on every configured backend and report differences from the memory backend."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16, help="threads sharing the postgres pool")
+    parser.add_argument("--pool-size", type=int, default=4, help="postgres pool size for the thread check")
+    parser.add_argument("--calls", type=int, default=50, help="calls per thread")
+    args = parser.parse_args()
+
+    from app.core.sqlite_pool import SQLitePool
+    from app.core.storage import InMemoryRepository, SQLiteRepository
+
+    problems = []
+    reference = run_script(InMemoryRepository())
+    with tempfile.TemporaryDirectory(prefix="storage-conformance-") as workdir:
+        repositories = {"sqlite": SQLiteRepository(SQLitePool(os.path.join(workdir, "conformance.db")))}
+        dsn = os.getenv("DATABASE_URL")
+        schema = None
+        if dsn:
+            import psycopg2
+            from psycopg2.extensions import make_dsn
+            from app.core.storage import PostgresRepository
+
+            schema = f"conformance_{uuid.uuid4().hex[:12]}"
+            with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA {schema}")
+            repositories["postgres"] = PostgresRepository(
+                make_dsn(dsn, options=f"-c search_path={schema}"), max_connections=args.pool_size, acquire_timeout=60)
+        else:
+            print("postgres skipped: DATABASE_URL is not set")
+        try:
+            for name, repository in repositories.items():
+                results = run_script(repository)
+                differences = [key for key in reference if results.get(key) != reference[key]]
+                for key in differences:
+                    problems.append(f"{name} {key}: {results.get(key)!r} != memory {reference[key]!r}")
+                print(f"{name}: {len(reference) - len(differences)}/{len(reference)} results match memory")
+                if name == "postgres":
+                    problems += [f"postgres placeholders: {p}" for p in check_placeholders(repository)]
+                    problems += [f"postgres threads: {p}" for p in check_threads(repository, args.threads, args.calls)]
+                    print(f"postgres: {args.threads} threads x {args.calls} calls on {args.pool_size} connections, "
+                          f"stats {repository.stats()}")
+        finally:
+            for repository in repositories.values():
+                repository.close()
+            if schema:
+                with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+                    cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+
+    for problem in problems:
+        print(f"  {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Memory, backpressure and disconnect check of the streaming enclave proxy.
+
+    python -m benchmarks.streaming_proxy --size-mb 300 --compare-buffered
+
+Runs the stub enclave and the backend under uvicorn in this process and
+pulls a large /process-query result through the backend with stream=true.
+It checks that:
+
+- resident memory stays flat (grows by less than --max-growth-mb) however
+  large the result is;
+- a reader that stops reading holds the enclave back: the stub gets at most
+  socket-buffer sizes ahead of what the reader consumed, and the request
+  keeps its fair-queue slot while the body is still being relayed;
+- a reader that disconnects stops the enclave: the stub stops producing and
+  the slot is given back.
+
+--compare-buffered repeats the transfer through the default buffered mode,
+which holds the whole result (several times over) in memory. Exits 1 if a
+check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import peak_rss_kib
+from benchmarks.stub_enclave import CHUNK_BYTES, serve_in_thread, stream_stats, stub
+
+
+def current_rss_kib() -> int:
+    """Resident set size of this process right now, in KiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return peak_rss_kib()
+
+
+class RSSSampler:
+    """Tracks the highest RSS seen while active, sampling from a background thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_kib = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_kib = max(self.peak_kib, current_rss_kib())
+
+    def __enter__(self) -> "RSSSampler":
+        self.baseline_kib = current_rss_kib()
+        self.peak_kib = self.baseline_kib
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def growth_mb(self) -> float:
+        return (self.peak_kib - self.baseline_kib) / 1024
+
+
+def transfer(client, backend_url: str, size: int, stream: bool) -> Dict[str, Any]:
+    """Fetch one large result through the backend and report bytes, throughput and memory growth."""
+    params = {"encrypted_query": f"bytes:{size}", "signed_query": "s", "enclaveid": "stub", "stream": str(stream).lower()}
+    received = 0
+    head = b""
+    started = time.perf_counter()
+    with RSSSampler() as rss:
+        with client.stream("POST", f"{backend_url}/process-query/", params=params) as response:
+            response.raise_for_status()
+            first_byte = time.perf_counter() - started
+            for chunk in response.iter_raw():
+                if len(head) < 32:
+                    head += chunk[:32]
+                received += len(chunk)
+    seconds = time.perf_counter() - started
+    return {
+        "mode": "streamed" if stream else "buffered",
+        "bytes": received,
+        "valid": head.startswith(b'{"encrypted_response"'),
+        "first_byte_seconds": first_byte,
+        "seconds": seconds,
+        "mb_per_sec": received / seconds / 2 ** 20,
+        "rss_growth_mb": rss.growth_mb,
+    }
+
+
+def stall_and_disconnect(client, backend_url: str, size: int, pause: float, queue) -> Dict[str, Any]:
+    """Read a little, stop reading for ``pause`` seconds, then disconnect; report how far the stub got and the slots held."""
+    params = {"encrypted_query": f"bytes:{size}", "signed_query": "s", "enclaveid": "stub", "stream": "true"}
+    start_sent = stream_stats["bytes_sent"]
+    consumed = 0
+    with client.stream("POST", f"{backend_url}/process-query/", params=params) as response:
+        # Keep the iterator referenced: dropping it would close the connection early
+        chunks = response.iter_raw()
+        for chunk in chunks:
+            consumed += len(chunk)
+            if consumed >= 4 * 2 ** 20:
+                break
+        time.sleep(pause)
+        ahead = stream_stats["bytes_sent"] - start_sent - consumed
+        slots_while_stalled = queue.in_use
+    # Leaving the block closed the connection; the stub must stop soon after
+    time.sleep(pause)
+    sent_after_close = stream_stats["bytes_sent"]
+    time.sleep(pause)
+    return {
+        "consumed_bytes": consumed,
+        "stub_ahead_while_stalled_mb": ahead / 2 ** 20,
+        "stub_sent_mb": (stream_stats["bytes_sent"] - start_sent) / 2 ** 20,
+        "stub_stopped": stream_stats["bytes_sent"] == sent_after_close,
+        "slots_in_use_while_stalled": slots_while_stalled,
+        "slots_in_use_after_close": queue.in_use,
+    }
+
+
+def main():
+    """Run the streaming checks and print a summary."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=300, help="size of the large result")
+    parser.add_argument("--max-growth-mb", type=float, default=64, help="allowed RSS growth while streaming")
+    parser.add_argument("--pause", type=float, default=1.0, help="seconds the stalled reader waits")
+    parser.add_argument("--compare-buffered", action="store_true", help="also transfer the result in buffered mode")
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    size = args.size_mb * 2 ** 20
+    stub_server, stub_url = serve_in_thread(stub)
+    os.environ.update(ENCLAVE_URL_TEMPLATE=stub_url, DB_PATH=os.path.join(tempfile.mkdtemp(), "enclave_mapping.db"))
+
+    import httpx
+    from app import signing
+
+    backend_server, backend_url = serve_in_thread(signing.app, lifespan="off")
+    problems: List[str] = []
+    results: Dict[str, Any] = {}
+    try:
+        with httpx.Client(timeout=120) as client:
+            results["streamed"] = transfer(client, backend_url, size, stream=True)
+            results["stall"] = stall_and_disconnect(client, backend_url, size, args.pause, signing.admission.queue)
+            if args.compare_buffered:
+                results["buffered"] = transfer(client, backend_url, size, stream=False)
+    finally:
+        backend_server.should_exit = stub_server.should_exit = True
+
+    streamed, stall = results["streamed"], results["stall"]
+    expected_bytes = size // CHUNK_BYTES * CHUNK_BYTES + len(b'{"encrypted_response": ""}')
+    if streamed["bytes"] != expected_bytes or not streamed["valid"]:
+        problems.append(f"streamed {streamed['bytes']} bytes, expected {expected_bytes}")
+    if streamed["rss_growth_mb"] > args.max_growth_mb:
+        problems.append(f"RSS grew {streamed['rss_growth_mb']:.0f} MB while streaming, limit {args.max_growth_mb:.0f} MB")
+    if stall["stub_ahead_while_stalled_mb"] > args.max_growth_mb:
+        problems.append(f"stub ran {stall['stub_ahead_while_stalled_mb']:.0f} MB ahead of a stalled reader")
+    if not stall["stub_stopped"] or stall["stub_sent_mb"] >= args.size_mb:
+        problems.append("stub kept producing after the reader disconnected")
+    if stall["slots_in_use_while_stalled"] != 1 or stall["slots_in_use_after_close"] != 0:
+        problems.append(
+            f"fair-queue slots in use: {stall['slots_in_use_while_stalled']} while relaying, "
+            f"{stall['slots_in_use_after_close']} after disconnect (expected 1, then 0)")
+
+    for name in ("streamed", "buffered"):
+        if name in results:
+            r = results[name]
+            print(
+                f"{name:<9} {r['bytes'] / 2 ** 20:>7.0f} MB in {r['seconds']:.2f}s ({r['mb_per_sec']:.0f} MB/s), "
+                f"first byte {r['first_byte_seconds'] * 1000:.0f} ms, RSS +{r['rss_growth_mb']:.0f} MB"
+            )
+    print(
+        f"stalled reader: stub {stall['stub_ahead_while_stalled_mb']:.1f} MB ahead; "
+        f"after disconnect stub sent {stall['stub_sent_mb']:.1f} of {args.size_mb} MB, stopped={stall['stub_stopped']}; "
+        f"slots held {stall['slots_in_use_while_stalled']} -> {stall['slots_in_use_after_close']}"
+    )
+    for problem in problems:
+        print(f"  {problem}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"results": results, "problems": problems}, output, indent=2)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Local stand-in for a deployed enclave, for benchmarks and manual testing.
+
+It answers the enclave routes the backend proxies to (/register-user,
+/process-query, /health) with canned bodies and no cryptography, so proxy
+overhead can be measured offline. Point the backend at it with
+``ENCLAVE_URL_TEMPLATE=http://127.0.0.1:<port>``. /process-query waits
+``STUB_ENCLAVE_LATENCY`` seconds (default 0) before answering, with at most
+``STUB_ENCLAVE_CAPACITY`` queries (default unlimited) served at once; the query
+"bytes:<n>" streams back a JSON result of about n bytes, generated chunk by
+chunk, with progress kept in ``stream_stats``.
+
+One stub can stand in for many enclaves: with
+``ENCLAVE_URL_TEMPLATE=http://127.0.0.1:<port>/enclaves/{enclaveid}`` each
+request is attributed to its enclave id, counted in ``calls`` and subject to
+that enclave's entry in ``faults`` (set in-process, or with
+``PUT /faults/<enclaveid>``): added latency, a share of slow or failing
+responses, or the whole enclave down, /health included.
+"""
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class Fault:
+    """Misbehaviour injected into one stub enclave's responses."""
+    latency: float = 0.0       # added to every call, /health included
+    slow_rate: float = 0.0     # share of calls that take slow_latency extra
+    slow_latency: float = 0.0
+    error_rate: float = 0.0    # share of calls answered with error_status
+    error_status: int = 503
+    down: bool = False         # every call, /health included, gets error_status
+
+
+# Enclave id -> injected fault; calls per enclave id and route
+faults: Dict[str, Fault] = {}
+calls: Counter = Counter()
+
+
+class EnclavePrefix:
+    """Routes /enclaves/<id>/<route> to /<route>, recording <id> in the scope."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/enclaves/"):
+            _, _, enclaveid, rest = scope["path"].split("/", 3)
+            scope = {**scope, "path": "/" + rest, "enclaveid": enclaveid}
+        await self.app(scope, receive, send)
+
+
+stub = FastAPI()
+stub.add_middleware(EnclavePrefix)
+
+LATENCY = float(os.getenv("STUB_ENCLAVE_LATENCY", "0"))
+
+# Queries served at once, like an enclave with a fixed number of workers; the rest wait in arrival order
+CAPACITY = int(os.getenv("STUB_ENCLAVE_CAPACITY", "0"))
+capacity: Optional[asyncio.Semaphore] = asyncio.Semaphore(CAPACITY) if CAPACITY else None
+
+# Size of each chunk of a generated large result
+CHUNK_BYTES = 64 * 1024
+
+# Bytes of large results handed to the server so far, and results abandoned by the reader
+stream_stats = {"bytes_sent": 0, "completed": 0, "aborted": 0}
+
+
+async def large_result(size: int):
+    """JSON body of about ``size`` bytes, produced only as fast as it is consumed."""
+    chunk = b"A" * CHUNK_BYTES
+    completed = False
+    try:
+        yield b'{"encrypted_response": "'
+        for _ in range(size // CHUNK_BYTES):
+            # Yield to the loop like a real producer would, so a disconnect can cancel the stream
+            await asyncio.sleep(0)
+            stream_stats["bytes_sent"] += CHUNK_BYTES
+            yield chunk
+        yield b'"}'
+        completed = True
+    finally:
+        stream_stats["completed" if completed else "aborted"] += 1
+
+
+async def inject_fault(request: Request, route: str) -> Optional[JSONResponse]:
+    """Count the call, apply the enclave's fault and return the error response it calls for, if any."""
+    enclaveid = request.scope.get("enclaveid", "")
+    calls[enclaveid, route] += 1
+    fault = faults.get(enclaveid)
+    if fault is None:
+        return None
+    delay = fault.latency + (fault.slow_latency if random.random() < fault.slow_rate else 0.0)
+    if delay:
+        await asyncio.sleep(delay)
+    if fault.down or random.random() < fault.error_rate:
+        return JSONResponse({"error": "injected fault"}, status_code=fault.error_status)
+    return None
+
+
+@stub.put("/faults/{enclaveid}")
+async def set_fault(enclaveid: str, fault: Fault):
+    """Inject a fault into one enclave."""
+    faults[enclaveid] = fault
+    return asdict(fault)
+
+
+@stub.delete("/faults/{enclaveid}")
+async def clear_fault(enclaveid: str):
+    """Make one enclave healthy again."""
+    faults.pop(enclaveid, None)
+    return {"cleared": enclaveid}
+
+
+@stub.post("/register-user")
+async def register_user(request: Request):
+    """Echo a fake encrypted enclave key."""
+    await request.body()
+    return await inject_fault(request, "register-user") or {"encrypted_E_pub": "stub-encrypted-key"}
+
+
+@stub.post("/process-query")
+async def process_query(request: Request):
+    """Echo a fake encrypted result; the query "fail" gets a 500, for exercising per-item errors."""
+    body = await request.json()
+    if capacity is not None:
+        async with capacity:
+            await asyncio.sleep(LATENCY)
+    else:
+        await asyncio.sleep(LATENCY)
+    failure = await inject_fault(request, "process-query")
+    if failure is not None:
+        return failure
+    query = body.get("encrypted_query") or ""
+    if query.startswith("bytes:"):
+        return StreamingResponse(large_result(int(query[len("bytes:"):])), media_type="application/json")
+    if query == "fail":
+        return JSONResponse({"error": "stub failure"}, status_code=500)
+    return {"encrypted_response": f"stub-encrypted-response:{body.get('encrypted_query')}"}
+
+
+@stub.get("/health")
+async def health(request: Request):
+    """Report the stub as healthy unless a fault says otherwise."""
+    return await inject_fault(request, "health") or "OK"
+
+
+def free_port() -> int:
+    """Ask the OS for an unused local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app: FastAPI = stub, port: int = 0, **config: Any) -> Tuple[uvicorn.Server, str]:
+    """Start ``app`` with uvicorn in a daemon thread and return the server and its base URL."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error", **config))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
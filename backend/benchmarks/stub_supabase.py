@@ -0,0 +1,55 @@
+"""
+Local stand-in for the Supabase GoTrue endpoints the backend uses.
+
+Every response is delayed by ``STUB_SUPABASE_LATENCY`` seconds (default 0.02)
+to model a network round trip, so a load test shows whether requests overlap
+that wait or serialize on it. Point the backend at it with
+``SUPABASE_URL=http://127.0.0.1:<port>``.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+
+LATENCY = float(os.getenv("STUB_SUPABASE_LATENCY", "0.02"))
+
+stub = FastAPI()
+
+
+def fake_user(email: str) -> dict:
+    """GoTrue user object with the fields the client requires."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return {
+        "id": str(uuid.uuid5(uuid.NAMESPACE_DNS, email)),
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": email,
+        "app_metadata": {},
+        "user_metadata": {},
+        "created_at": now,
+    }
+
+
+@stub.post("/auth/v1/token")
+async def token(request: Request):
+    """Password grant: always succeeds with a fake session."""
+    body = await request.json()
+    await asyncio.sleep(LATENCY)
+    return {
+        "access_token": "stub-access-token",
+        "token_type": "bearer",
+        "expires_in": 3600,
+        "expires_at": int(time.time()) + 3600,
+        "refresh_token": "stub-refresh-token",
+        "user": fake_user(body.get("email", "user@example.com")),
+    }
+
+
+@stub.post("/auth/v1/signup")
+async def signup(request: Request):
+    """Sign-up: returns the new user without a session (email confirmation pending)."""
+    body = await request.json()
+    await asyncio.sleep(LATENCY)
+    return fake_user(body.get("email", "user@example.com"))
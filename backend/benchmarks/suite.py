@@ -0,0 +1,206 @@
+"""
+Benchmark cases for the signing backend's hot paths.
+
+Every case runs in its own process (see ``benchmarks.run``) inside a scratch
+working directory with ``DB_PATH`` pointing at a scratch database, so cases
+never touch the real ``Backend/`` data and peak RSS is measured per case.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Any, Dict
+
+from benchmarks.common import measure, measure_async
+from benchmarks.storage import bench_storage
+
+
+def bench_csr_issue(iterations: int) -> Dict[str, Any]:
+    """CSR parse + sign throughput for each CA key algorithm."""
+    from benchmarks.issuance import run
+    return run(iterations)
+
+
+def bench_envelope(iterations: int) -> Dict[str, Any]:
+    """Version 2 envelope vs RSA-only round trips per payload size."""
+    from benchmarks.envelope import run
+    return run(iterations)
+
+
+def bench_sign_csr_job(iterations: int) -> Dict[str, Any]:
+    """Full sign_csr_job path (CA cache hit) and the same path with a cold cache."""
+    from app import signing
+    from app.core.ca_cache import ca_cache
+    from app.core.certificates import KeyAlgorithm
+    from benchmarks.issuance import make_csr_b64
+
+    signing.init_db()
+    signing.create_ca_files("bench-enclave", KeyAlgorithm.RSA_2048)
+    signing.insert_enclave_mapping("bench-enclave", KeyAlgorithm.RSA_2048.value)
+    csr_b64 = make_csr_b64()
+
+    def cold():
+        ca_cache.invalidate("bench-enclave")
+        signing.sign_csr_job("bench-enclave", csr_b64)
+
+    return {
+        "cached_ca": measure(lambda: signing.sign_csr_job("bench-enclave", csr_b64), iterations),
+        "cold_ca": measure(cold, max(10, iterations // 4)),
+    }
+
+
+def bench_generate_ca(iterations: int) -> Dict[str, Any]:
+    """In-process CA key + certificate creation per algorithm, with and without the RSA key pool."""
+    from app import signing
+    from app.core.certificates import KeyAlgorithm
+    from app.core.key_pool import RSAKeyPool
+
+    os.makedirs("Backend", exist_ok=True)
+    count = max(5, iterations // 10)
+    counter = iter(range(10 ** 9))
+
+    def create(algorithm):
+        return lambda: signing.create_ca_files(f"bench-{next(counter)}", algorithm)
+
+    results = {}
+    # Inline RSA generation: what every request paid before the pool existed
+    signing.rsa_key_pool = RSAKeyPool(size=0)
+    results["rsa-2048-inline"] = measure(create(KeyAlgorithm.RSA_2048), count, warmup=1)
+
+    # Pool filled ahead of time, as after startup
+    signing.rsa_key_pool = RSAKeyPool(size=count + 1, refill_threshold=0)
+    signing.rsa_key_pool.start()
+    while signing.rsa_key_pool.stats()["depth"] < count + 1:
+        time.sleep(0.05)
+    results["rsa-2048-pooled"] = measure(create(KeyAlgorithm.RSA_2048), count, warmup=1)
+    signing.rsa_key_pool.stop()
+
+    for algorithm in (KeyAlgorithm.ECDSA_P256, KeyAlgorithm.ED25519):
+        results[algorithm.value] = measure(create(algorithm), count * 10)
+    return results
+
+
+def synthetic_dataset(i: int, organizations: int = 100) -> Dict[str, Any]:
+    """The i-th synthetic marketplace dataset."""
+    return {
+        "enclave_id": f"enclave-{i}",
+        "dataset_name": f"dataset-{i:08d}",
+        "description": "Synthetic benchmark dataset",
+        "organization_name": f"org-{i % organizations}",
+        "sample_queries": ["SELECT count(*) FROM data", "SELECT avg(value) FROM data"],
+        "rules": "No raw rows leave the enclave",
+        "isPublic": i % 2 == 0,
+        "whitelistEmails": [] if i % 2 == 0 else [f"user-{i % 1000}@example.com", f"user-{(i + 1) % 1000}@example.com"],
+    }
+
+
+def seed_datasets(repository, rows: int, batch: int = 10000) -> None:
+    """Fill dataset_details with ``rows`` synthetic marketplace entries using batched inserts."""
+    for start in range(0, rows, batch):
+        repository.insert_datasets([synthetic_dataset(i) for i in range(start, min(rows, start + batch))])
+
+
+def bench_marketplace(iterations: int, rows: int) -> Dict[str, Any]:
+    """Marketplace listing: first page, filtered page, deep keyset page and full NDJSON stream."""
+    from app import signing
+
+    signing.init_db()
+    started = time.perf_counter()
+    seed_datasets(signing.repository, rows)
+    seed_seconds = time.perf_counter() - started
+
+    def page(**filters):
+        base = {"after_id": None, "organization": None, "is_public": None, "name_prefix": None}
+        base.update(filters)
+        signing.fetch_marketplace_page(signing.MARKETPLACE_DEFAULT_LIMIT, None, **base)
+
+    def stream_all():
+        for _ in signing.stream_marketplace_items(None, None, after_id=None, organization=None, is_public=None, name_prefix=None):
+            pass
+
+    return {
+        "rows": rows,
+        "seed_seconds": seed_seconds,
+        "first_page": measure(page, iterations),
+        "filtered_page": measure(lambda: page(organization="org-7", is_public=False), iterations),
+        "deep_page": measure(lambda: page(after_id=rows // 2), iterations),
+        "full_stream": measure(stream_all, max(1, min(iterations, 100_000 // rows)), warmup=0),
+    }
+
+
+def bench_get_db(iterations: int) -> Dict[str, Any]:
+    """Cost of obtaining a connection: pooled get_db versus a fresh sqlite3.connect per request."""
+    from app import signing
+
+    signing.init_db()
+
+    def pooled():
+        with signing.repository.pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+
+    def fresh():
+        conn = sqlite3.connect(signing.repository.pool.path)
+        try:
+            conn.execute("SELECT 1").fetchone()
+        finally:
+            conn.close()
+
+    return {"pooled": measure(pooled, iterations * 10), "fresh_connect": measure(fresh, iterations * 10)}
+
+
+def bench_proxy(iterations: int) -> Dict[str, Any]:
+    """register_user / process_query latency through the backend against a local stub enclave."""
+    import httpx
+    from benchmarks.stub_enclave import serve_in_thread
+
+    server, base_url = serve_in_thread()
+    os.environ["ENCLAVE_URL_TEMPLATE"] = base_url
+    from app import signing
+
+    async def run():
+        transport = httpx.ASGITransport(app=signing.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+            async def register():
+                response = await client.post("/register-user/", json={"signed_cert": "Y2VydA==", "public_key": "a2V5", "enclaveid": "stub"})
+                response.raise_for_status()
+
+            async def query():
+                response = await client.post("/process-query/", params={"encrypted_query": "q", "signed_query": "s", "enclaveid": "stub"})
+                response.raise_for_status()
+
+            async def query_batch():
+                queries = [{"encrypted_query": f"q{i}", "signed_query": "s"} for i in range(32)]
+                response = await client.post("/process-query/batch", json={"enclaveid": "stub", "queries": queries})
+                response.raise_for_status()
+
+            results = {
+                "register_user": await measure_async(register, iterations),
+                "process_query": await measure_async(query, iterations),
+                "process_query_c16": await measure_async(query, iterations * 4, concurrency=16),
+                "process_query_batch_32": await measure_async(query_batch, max(10, iterations // 8)),
+                "client": signing.enclave_client.stats(),
+            }
+            await signing.enclave_client.close()
+            return results
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.should_exit = True
+
+
+# name -> (function, extra keyword arguments)
+CASES = {
+    "csr_issue": (bench_csr_issue, {}),
+    "sign_csr_job": (bench_sign_csr_job, {}),
+    "generate_ca": (bench_generate_ca, {}),
+    "get_db": (bench_get_db, {}),
+    "proxy": (bench_proxy, {}),
+    "storage": (bench_storage, {}),
+    "envelope": (bench_envelope, {}),
+}
+
+
+def marketplace_cases(row_counts) -> Dict[str, Any]:
+    """One marketplace case per requested table size."""
+    return {f"marketplace_{rows}": (bench_marketplace, {"rows": rows}) for rows in row_counts}
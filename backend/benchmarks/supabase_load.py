@@ -0,0 +1,74 @@
+"""
+Load test of the Supabase-backed endpoints against a local GoTrue/PostgREST stand-in.
+
+    python -m benchmarks.supabase_load --concurrency 1,4,16,64 --requests 200
+
+Drives /api/v1/auth/login and /api/v1/auth/signup in-process and reports
+throughput per concurrency level. With a non-blocking data layer
+throughput grows with concurrency until the event loop saturates; a blocking
+one stays flat at roughly 1 / STUB_SUPABASE_LATENCY requests per second.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from benchmarks.common import measure_async
+from benchmarks.stub_enclave import serve_in_thread
+from benchmarks.stub_supabase import LATENCY, stub
+
+
+def main():
+    """Run the load test and print a throughput table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--output", help="optional JSON output path")
+    args = parser.parse_args()
+
+    server, base_url = serve_in_thread(stub)
+    os.environ.update(SUPABASE_URL=base_url, SUPABASE_KEY="stub-anon-key")
+
+    import httpx
+    from fastapi import FastAPI
+    from app.api.endpoints.auth import router as auth_router
+    from app.core.metrics import MetricsMiddleware
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(auth_router, prefix="/api/v1/auth")
+
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+            async def login():
+                response = await client.post("/api/v1/auth/login", json={"email": "load@example.com", "password": "secret"})
+                response.raise_for_status()
+
+            async def signup():
+                response = await client.post("/api/v1/auth/signup", json={"email": "load@example.com", "password": "secret"})
+                response.raise_for_status()
+
+            for name, fn in (("login", login), ("signup", signup)):
+                results[name] = {}
+                for concurrency in (int(c) for c in args.concurrency.split(",")):
+                    summary = await measure_async(fn, args.requests, concurrency=concurrency)
+                    results[name][concurrency] = summary
+                    print(f"{name:<12} c={concurrency:<4} {summary['ops_per_sec']:>8.1f} req/s  p50 {summary['p50_ms']:>7.1f} ms  p99 {summary['p99_ms']:>7.1f} ms")
+        return results
+
+    try:
+        print(f"stub latency {LATENCY * 1000:.0f} ms, serialized ceiling ~{1 / LATENCY:.0f} req/s", file=sys.stderr)
+        results = asyncio.run(run())
+    finally:
+        server.should_exit = True
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"stub_latency_seconds": LATENCY, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
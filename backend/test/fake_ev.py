@@ -0,0 +1,40 @@
+"""
+Stand-in for the Evervault ``ev`` CLI used when provisioning enclaves locally.
+
+Point the backend at it with ``EV_CLI="python /abs/path/to/test/fake_ev.py"``
+(commands run inside each job workspace, so use an absolute path). It appends
+each invocation to ``ev_calls.log`` in the working directory, writes a fake
+``enclave.eif`` on ``enclave build`` and can be told to fail or slow down:
+
+    FAKE_EV_FAIL=build     exit 1 on "ev enclave build"
+    FAKE_EV_DELAY=0.5      sleep this many seconds per invocation
+"""
+import os
+import sys
+import time
+
+
+def main() -> int:
+    """Emulate one ev CLI invocation."""
+    args = sys.argv[1:]
+    subcommand = args[1] if len(args) > 1 else ""
+
+    with open("ev_calls.log", "a") as log:
+        log.write(" ".join(args) + "\n")
+
+    time.sleep(float(os.getenv("FAKE_EV_DELAY", "0")))
+
+    if os.getenv("FAKE_EV_FAIL") == subcommand:
+        print(f"fake ev: {subcommand} failed", file=sys.stderr)
+        return 1
+
+    if subcommand == "build":
+        with open("enclave.eif", "wb") as eif:
+            eif.write(b"fake eif for " + os.getcwd().encode())
+
+    print(f"fake ev: {subcommand} ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())